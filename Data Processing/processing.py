@@ -1,36 +1,63 @@
+import numpy as np
 import pandas as pd
 import os
+import sys
+import json
 import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import re
 from difflib import SequenceMatcher as SM
+from rapidfuzz import fuzz, process
+
+# name_normalization.py is shared with Final_Merger and sits at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from name_normalization import normalize_column, normalize_name
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def normalize_name(name):
-    """Normalize name for matching: lower case, remove extra spaces, remove special chars."""
-    if pd.isna(name):
-        return ''
-    name = str(name).lower().strip()
-    name = re.sub(r'\s+', ' ', name)  # Replace multiple spaces with single
-    name = re.sub(r'[^a-z\s]', '', name)  # Remove non-letter chars except space
-    return name
+# Parsed and normalised copy of every export, as Parquet, under DATA/<CACHE_DIR>/<folder>
+CACHE_DIR = '.cache'
+# Processes parsing new or changed exports, defaults to one per file up to the number of CPUs
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "0"))
 
 def get_similarity_ratio(a, b):
     """Get similarity ratio between two strings."""
     return SM(None, a, b).ratio() * 100
 
-def get_best_match(name, candidates, threshold=80):
-    """Find the best matching candidate above threshold."""
-    best_ratio = 0
-    best_cand = None
-    for cand in candidates:
-        ratio = get_similarity_ratio(name, cand)
-        if ratio > best_ratio and ratio >= threshold:
-            best_ratio = ratio
-            best_cand = cand
-    return best_cand, best_ratio
+def batch_best_match(names, candidates, threshold=80, batch_size=1024):
+    """Find the best matching candidate of every name at once: the first one with the highest ratio at or above threshold.
+
+        Returns the position in candidates of each name's best match (-1 when none) and its ratio.
+        rapidfuzz's ratio counts the longest common subsequence, which is never shorter than the
+        blocks SequenceMatcher matches, so it bounds get_similarity_ratio from above. All pairs
+        are scored with it in parallel (cdist, batch_size names at a time) and only the pairs
+        that can reach threshold are scored with SequenceMatcher. Repeated names are scored once.
+    """
+    codes, unique_names = pd.factorize(pd.Series(names, dtype=object))
+    candidates = list(candidates)
+    best_idx = np.full(len(unique_names), -1, dtype=np.int64)
+    best_ratio = np.zeros(len(unique_names))
+    for start in range(0, len(unique_names), batch_size):
+        batch = list(unique_names[start:start + batch_size])
+        # small margin so float32 rounding never drops a pair SequenceMatcher would keep
+        bounds = process.cdist(batch, candidates, scorer=fuzz.ratio, score_cutoff=max(threshold - 0.01, 0), workers=-1)
+        for row, col in zip(*np.nonzero(bounds)):
+            ratio = get_similarity_ratio(batch[row], candidates[col])
+            i = start + row
+            if ratio > best_ratio[i] and ratio >= threshold:
+                best_ratio[i] = ratio
+                best_idx[i] = col
+    return best_idx[codes], best_ratio[codes]
+
+def matched_column(match_idx, values):
+    """Column of the matched candidates' values, pd.NA where there is no match or no value."""
+    column = np.full(len(match_idx), pd.NA, dtype=object)
+    matched = match_idx >= 0
+    taken = pd.Series(np.asarray(values, dtype=object)[match_idx[matched]])
+    column[matched] = taken.where(taken.notna(), pd.NA).to_numpy()
+    return column
 
 def assign_department(emp_id):
     """Assign department based on employee id pattern."""
@@ -47,91 +74,164 @@ def assign_department(emp_id):
         return ""
  
 
-def combine_remote_days(data_dir, save=True):
-    """Combine all remote days CSVs into one DF, standardize to 'floor'."""
-    remote_dir = os.path.join(data_dir, 'remote_days')
-    remote_files = [f for f in os.listdir(remote_dir) if f.endswith('.csv')]
-    
-    if not remote_files:
-        logging.warning("No remote days files found.")
-        return pd.DataFrame()
-    
-    dfs = []
-    for file in remote_files:
-        path = os.path.join(remote_dir, file)
+def read_remote_file(path):
+    """Read a remote days CSV, standardize to 'floor' and add normalized_name."""
+    file = os.path.basename(path)
+    df = pd.read_csv(path)
+
+    # Standardize to 'floor'
+    if 'floor' in df.columns:
+        df['office'] = df['floor']
+    elif 'office' in df.columns:
+        df['office'] = df['office']
+    else:
+        df['office'] = pd.NA
+        logging.warning(f"No 'floor' or 'office' column in {file}")
+
+    # Ensure remote_day columns up to 3, fill missing with NaN
+    for i in range(1, 4):
+        col = f'remote_day_{i}'
+        if col not in df.columns:
+            df[col] = pd.NA
+
+    # Normalize name for matching
+    df['normalized_name'] = normalize_column(df['name'], normalize_name)
+    return df
+
+def read_zkaccess_file(path):
+    """Read a zkaccess CSV and add attendance_name and normalized_name."""
+    df = pd.read_csv(path)
+
+    # Create full name and normalized
+    df['attendance_name'] = df['first name'].astype(str) + ' ' + df['last name'].astype(str)
+    df['normalized_name'] = normalize_column(df['attendance_name'], normalize_name)
+    return df
+
+def load_and_cache(read_file, label, path, cache_path):
+    """Parse one export with read_file and keep a Parquet copy at cache_path, None when it cannot be read."""
+    file = os.path.basename(path)
+    try:
+        df = read_file(path)
+        logging.info(f"Loaded {label} file: {file}")
+    except Exception as e:
+        logging.error(f"Error loading {file}: {e}")
+        return None
+    try:
+        df.to_parquet(cache_path, index=False)
+    except Exception as e:
+        # e.g. a column mixing numbers and text, the file is parsed again next run
+        logging.warning(f"Could not cache {file}: {e}")
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+    return df
+
+def load_manifest(cache_dir):
+    """Size and mtime of every cached export, and the exports and columns already in the combined CSV."""
+    path = os.path.join(cache_dir, 'manifest.json')
+    if os.path.exists(path):
         try:
-            df = pd.read_csv(path)
-            logging.info(f"Loaded remote days file: {file}")
-            
-            # Standardize to 'floor'
-            if 'floor' in df.columns:
-                df['office'] = df['floor']
-            elif 'office' in df.columns:
-                df['office'] = df['office']
-            else:
-                df['office'] = pd.NA
-                logging.warning(f"No 'floor' or 'office' column in {file}")
-            
-            # Ensure remote_day columns up to 3, fill missing with NaN
-            for i in range(1, 4):
-                col = f'remote_day_{i}'
-                if col not in df.columns:
-                    df[col] = pd.NA
-            
-            # Normalize name for matching
-            df['normalized_name'] = df['name'].apply(normalize_name)
-            
-            dfs.append(df)
+            with open(path, 'r') as f:
+                return json.load(f)
         except Exception as e:
-            logging.error(f"Error loading {file}: {e}")
-    
-    if dfs:
-        combined = pd.concat(dfs, ignore_index=True)
-        if save:
-            output_file = os.path.join(data_dir, "remote_combined.csv")
-            combined.to_csv(output_file, index=False)
-            logging.info(f"Combined remote data saved to {output_file}")
-        return combined
-    return pd.DataFrame()
+            logging.warning(f"Ignoring unreadable cache manifest {path}: {e}")
+    return {'files': {}, 'written': [], 'dtypes': {}}
 
-def combine_zkaccess(data_dir, save=True):
-    """Combine all zkaccess CSVs into one DF."""
-    zk_dir = os.path.join(data_dir, 'zkaccess_export')
-    zk_files = [f for f in os.listdir(zk_dir) if f.endswith('.csv')]
-    
-    if not zk_files:
-        logging.warning("No zkaccess files found.")
+def save_manifest(cache_dir, manifest):
+    """Write the manifest to a temporary file and rename it over the old one."""
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, 'manifest.json'))
+
+def combine_folder(data_dir, folder, label, read_file, output_name, save=True):
+    """Combine all CSVs of a DATA folder into one DF, parsing only the new or changed ones.
+
+        Every parsed file is cached as Parquet, keyed on its size and mtime, and the cached
+        ones are read back instead of parsed. New or changed files are parsed in parallel.
+        Files keep their order from earlier runs, new ones come after, so when nothing but
+        new files turned up their rows are appended to the combined CSV instead of rewriting it.
+    """
+    src_dir = os.path.join(data_dir, folder)
+    files = sorted(f for f in os.listdir(src_dir) if f.endswith('.csv'))
+
+    if not files:
+        logging.warning(f"No {label} files found.")
         return pd.DataFrame()
-    
-    dfs = []
-    for file in zk_files:
-        path = os.path.join(zk_dir, file)
-        try:
-            df = pd.read_csv(path)
-            logging.info(f"Loaded zkaccess file: {file}")
-            
-            # Create full name and normalized
-            df['attendance_name'] = df['first name'].astype(str) + ' ' + df['last name'].astype(str)
-            df['normalized_name'] = df['attendance_name'].apply(normalize_name)
-            
-            dfs.append(df)
-        except Exception as e:
-            logging.error(f"Error loading {file}: {e}")
-    
-    if dfs:
-        combined = pd.concat(dfs, ignore_index=True)
 
-        if save:
-            output_file = os.path.join(data_dir, "combined_zkaccess.csv")
+    cache_dir = os.path.join(data_dir, CACHE_DIR, folder)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = load_manifest(cache_dir)
+    stats = {f: os.stat(os.path.join(src_dir, f)) for f in files}
+    keys = {f: {'size': stats[f].st_size, 'mtime_ns': stats[f].st_mtime_ns} for f in files}
+    cache_paths = {f: os.path.join(cache_dir, f[:-len('.csv')] + '.parquet') for f in files}
+    order = [f for f in manifest['written'] if f in keys] + [f for f in files if f not in manifest['written']]
+
+    loaded = {}
+    for file in files:
+        if manifest['files'].get(file) == keys[file] and os.path.exists(cache_paths[file]):
+            try:
+                loaded[file] = pd.read_parquet(cache_paths[file])
+            except Exception as e:
+                logging.warning(f"Could not read the cache of {file}, parsing it again: {e}")
+    stale = [f for f in files if f not in loaded]
+    logging.info(f"{len(loaded)} {label} files from cache, {len(stale)} to parse")
+
+    workers = min(LOAD_WORKERS or os.cpu_count() or 1, len(stale))
+    args = ([read_file] * len(stale), [label] * len(stale),
+            [os.path.join(src_dir, f) for f in stale], [cache_paths[f] for f in stale])
+    if workers <= 1:
+        parsed = list(map(load_and_cache, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(load_and_cache, *args))
+    for file, df in zip(stale, parsed):
+        if df is not None:
+            loaded[file] = df
+
+    manifest['files'] = {f: keys[f] for f in loaded if os.path.exists(cache_paths[f])}
+    for cached in os.listdir(cache_dir):
+        if cached.endswith('.parquet') and cached not in {os.path.basename(cache_paths[f]) for f in manifest['files']}:
+            os.remove(os.path.join(cache_dir, cached))
+
+    order = [f for f in order if f in loaded]
+    if not order:
+        save_manifest(cache_dir, manifest)
+        return pd.DataFrame()
+    combined = pd.concat([loaded[f] for f in order], ignore_index=True)
+
+    if save:
+        output_file = os.path.join(data_dir, output_name)
+        written = manifest['written']
+        dtypes = {col: str(dtype) for col, dtype in combined.dtypes.items()}
+        # Appending is only safe when the rows already written are unchanged and the columns are the same
+        if (os.path.exists(output_file) and order[:len(written)] == written and dtypes == manifest['dtypes']
+                and all(f not in stale for f in written)):
+            written_rows = sum(len(loaded[f]) for f in written)
+            if written_rows < len(combined):
+                combined.iloc[written_rows:].to_csv(output_file, mode='a', header=False, index=False)
+                logging.info(f"Appended {len(combined) - written_rows} rows from {len(order) - len(written)} new files to {output_file}")
+            else:
+                logging.info(f"{output_file} is up to date")
+        else:
             combined.to_csv(output_file, index=False)
-            logging.info(f"Combined zkaccess data saved to {output_file}")
-        return combined
-    return pd.DataFrame()
+            logging.info(f"Combined {label} data saved to {output_file}")
+        manifest['written'] = order
+        manifest['dtypes'] = dtypes
+    save_manifest(cache_dir, manifest)
+    return combined
+
+def combine_remote_days(data_dir, save=True):
+    """Combine all remote days CSVs into one DF, standardize to 'floor'."""
+    return combine_folder(data_dir, 'remote_days', 'remote days', read_remote_file, "remote_combined.csv", save)
+
+def combine_zkaccess(data_dir, save=True):
+    """Combine all zkaccess CSVs into one DF."""
+    return combine_folder(data_dir, 'zkaccess_export', 'zkaccess', read_zkaccess_file, "combined_zkaccess.csv", save)
 
 def enhance_employee_data(employee_df, zk_df, remote_df):
     """Enhance employee DF with data from zk and remote using fuzzy matching."""
     # Normalize name in employee
-    employee_df['normalized_name'] = employee_df['name'].apply(normalize_name)
+    employee_df['normalized_name'] = normalize_column(employee_df['name'], normalize_name)
     
     # Prepare new columns
     employee_df['personnel_id'] = pd.NA
@@ -142,48 +242,44 @@ def enhance_employee_data(employee_df, zk_df, remote_df):
     for i in range(1, 4):
         employee_df[f'remote_day_{i}'] = pd.NA
     
+    # Employees without a name are never matched
+    names = employee_df['normalized_name'].tolist()
+    has_name = np.array([bool(name) for name in names], dtype=bool)
+
     # Fuzzy match with zkaccess for personnel_id and attendance_name
     if not zk_df.empty:
         unique_zk = zk_df.drop_duplicates(subset=['normalized_name'])[['normalized_name', 'personnel id', 'attendance_name']]
         candidates = unique_zk['normalized_name'].tolist()
-        
-        for idx, row in employee_df.iterrows():
-            emp_norm = row['normalized_name']
-            if not emp_norm:  # Skip empty names
-                continue
-            best_cand, ratio = get_best_match(emp_norm, candidates, threshold=85)
-            if best_cand:
-                match_row = unique_zk[unique_zk['normalized_name'] == best_cand].iloc[0]
-                employee_df.at[idx, 'personnel_id'] = match_row['personnel id']
-                employee_df.at[idx, 'attendance_name'] = match_row['attendance_name']
-                logging.info(f"Fuzzy matched zk for '{row['name']}' to '{match_row['attendance_name']}' (ratio: {ratio:.2f}%)")
-            else:
-                logging.info(f"No zk match found for '{row['name']}'")
-    
+
+        match_idx, ratios = batch_best_match(names, candidates, threshold=85)
+        match_idx[~has_name] = -1
+        employee_df['personnel_id'] = matched_column(match_idx, unique_zk['personnel id'])
+        employee_df['attendance_name'] = matched_column(match_idx, unique_zk['attendance_name'])
+        for name, attendance_name, idx, ratio, named in zip(employee_df['name'], employee_df['attendance_name'], match_idx, ratios, has_name):
+            if idx >= 0:
+                logging.info(f"Fuzzy matched zk for '{name}' to '{attendance_name}' (ratio: {ratio:.2f}%)")
+            elif named:
+                logging.info(f"No zk match found for '{name}'")
+
     # Fuzzy match with remote for floor and remote_days
     if not remote_df.empty:
         unique_remote = remote_df.drop_duplicates(subset=['normalized_name'])
         candidates = unique_remote['normalized_name'].tolist()
-        
-        for idx, row in employee_df.iterrows():
-            emp_norm = row['normalized_name']
-            if not emp_norm:  # Skip empty names
-                continue
-            best_cand, ratio = get_best_match(emp_norm, candidates, threshold=80)
-            if best_cand:
-                match_row = unique_remote[unique_remote['normalized_name'] == best_cand].iloc[0]
-                employee_df.at[idx, 'remote_name'] = match_row.get('name', pd.NA)
-                employee_df.at[idx, 'remote_location'] = match_row.get('location', pd.NA)
-                employee_df.at[idx, 'office'] = match_row.get('office', pd.NA)
-                for i in range(1, 4):
-                    col = f'remote_day_{i}'
-                    val = match_row.get(col, pd.NA)
-                    if pd.notna(val):
-                        employee_df.at[idx, col] = val
-                logging.info(f"Fuzzy matched remote for '{row['name']}' to office '{employee_df.at[idx, 'office']}' (ratio: {ratio:.2f}%)")  
 
-            else:
-                logging.info(f"No remote match found for '{row['name']}'")
+        match_idx, ratios = batch_best_match(names, candidates, threshold=80)
+        match_idx[~has_name] = -1
+        no_values = [pd.NA] * len(unique_remote)
+        employee_df['remote_name'] = matched_column(match_idx, unique_remote.get('name', no_values))
+        employee_df['remote_location'] = matched_column(match_idx, unique_remote.get('location', no_values))
+        employee_df['office'] = matched_column(match_idx, unique_remote.get('office', no_values))
+        for i in range(1, 4):
+            col = f'remote_day_{i}'
+            employee_df[col] = matched_column(match_idx, unique_remote.get(col, no_values))
+        for name, office, idx, ratio, named in zip(employee_df['name'], employee_df['office'], match_idx, ratios, has_name):
+            if idx >= 0:
+                logging.info(f"Fuzzy matched remote for '{name}' to office '{office}' (ratio: {ratio:.2f}%)")
+            elif named:
+                logging.info(f"No remote match found for '{name}'")
     
     # Drop normalized_name
     employee_df = employee_df.drop(columns=['normalized_name'])
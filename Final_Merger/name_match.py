@@ -1,8 +1,15 @@
+import os
+import sys
+import numpy as np
 import pandas as pd
-from thefuzz import fuzz, process
-import re
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
 import logging
-from typing import Optional, List
+from typing import Optional, List, Tuple
+
+# name_normalization.py is shared with Data Processing and sits at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from name_normalization import clean_name, normalize_column
 
 MATCH_THRESHOLD = 70
 
@@ -32,21 +39,60 @@ def load_data(file_path: str, file_type: str) -> pd.DataFrame:
         logging.error(f"Error loading file: {e}")
         raise
 
-def clean_name(name: str) -> str:
-    """Lowercase and remove extra spaces and non-letters."""
-    name = str(name).strip().lower()
-    name = re.sub(r'[^a-z\s]', '', name)
-    name = re.sub(r'\s+', ' ', name)
-    return name
-
 def safe_str(value):
     return "None" if pd.isna(value) else str(value).strip()
 
 
+class NameIndex:
+    """Candidate names indexed once, scored with fuzz.ratio the way thefuzz's process.extract scores them.
+
+        Names are processed like thefuzz does (default_process), scores are compared rounded,
+        and ties go to the earliest candidate. Candidates are blocked by length: fuzz.ratio is at
+        most 200 * min(len1, len2) / (len1 + len2), so a query is only scored against the
+        lengths that can reach the threshold, all queries of a length at once with cdist.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = list(names)
+        self.processed = [default_process(name) for name in self.names]
+        self.lengths = np.array([len(name) for name in self.processed], dtype=np.int64)
+
+    def block(self, length: int, threshold: float) -> np.ndarray:
+        """Positions of the candidates whose length can score threshold against a query of this length."""
+        c = min(max(threshold - 0.5, 0), 100) / 100
+        if c == 0:
+            return np.arange(len(self.names))
+        low = length * c / (2 - c) - 1e-9
+        high = length * (2 - c) / c + 1e-9
+        return np.flatnonzero((self.lengths >= low) & (self.lengths <= high))
+
+    def best_matches(self, queries: List[str], threshold: float = MATCH_THRESHOLD) -> List[Tuple[Optional[str], int]]:
+        """Best candidate of every query with a rounded score >= threshold, (None, 0) when there is none."""
+        processed = [default_process(query) for query in queries]
+        lengths = np.array([len(query) for query in processed], dtype=np.int64)
+        results: List[Tuple[Optional[str], int]] = [(None, 0)] * len(queries)
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            cols = self.block(int(length), threshold)
+            if len(cols) == 0:
+                continue
+            scores = process.cdist([processed[i] for i in rows], [self.processed[j] for j in cols],
+                                   scorer=fuzz.ratio, score_cutoff=max(threshold - 0.5, 0), workers=-1)
+            best = scores.argmax(axis=1)
+            for row, col, score in zip(rows, best, scores[np.arange(len(rows)), best]):
+                if round(score) >= threshold:
+                    results[row] = (self.names[cols[col]], int(round(score)))
+        return results
+
+    def extract(self, query: str, limit: int = 3) -> List[Tuple[str, int]]:
+        """The limit best candidates of query with their rounded scores, as process.extract returns them."""
+        matches = process.extract(default_process(query), self.processed, scorer=fuzz.ratio, processor=None, limit=limit)
+        return [(self.names[index], int(round(score))) for _, score, index in matches]
+
+
 def match_name(target_name: str, candidates: List[str]) -> Optional[str]:
     """Find the best fuzzy match with score >= threshold."""
-    match, score = process.extractOne(target_name, candidates, scorer=fuzz.ratio)
-    return match if score >= MATCH_THRESHOLD else None
+    return NameIndex(candidates).best_matches([target_name], MATCH_THRESHOLD)[0][0]
 
 
 def process_and_merge(remote_df: pd.DataFrame, zk_df: pd.DataFrame, emp_df: pd.DataFrame) -> pd.DataFrame:
@@ -61,25 +107,29 @@ def process_and_merge(remote_df: pd.DataFrame, zk_df: pd.DataFrame, emp_df: pd.D
             if col not in emp_df.columns:
                 raise KeyError(f"Missing column in employee_data: {col}")
 
-        remote_df['clean_name'] = remote_df['name'].apply(clean_name)
-        zk_df['clean_name'] = (zk_df['first name'].fillna('') + ' ' + zk_df['last name'].fillna('')).apply(clean_name)
+        remote_df['clean_name'] = normalize_column(remote_df['name'], clean_name)
+        zk_df['clean_name'] = normalize_column(zk_df['first name'].fillna('') + ' ' + zk_df['last name'].fillna(''), clean_name)
         emp_df = emp_df[emp_df['office'].str.lower() == 'accra'].copy()
-        emp_df['clean_name'] = emp_df['name'].apply(clean_name)
+        emp_df['clean_name'] = normalize_column(emp_df['name'], clean_name)
 
         remote_lookup = dict(zip(remote_df['clean_name'], remote_df.to_dict('records')))
         zk_lookup = dict(zip(zk_df['clean_name'], zk_df.to_dict('records')))
 
+        # Index the candidates once and match every employee at once
+        remote_index = NameIndex(list(remote_lookup.keys()))
+        zk_index = NameIndex(list(zk_lookup.keys()))
+        remote_matches = remote_index.best_matches(emp_df['clean_name'].tolist(), MATCH_THRESHOLD)
+        zk_matches = zk_index.best_matches(emp_df['clean_name'].tolist(), MATCH_THRESHOLD)
+
         combined_records = []
         unmatched_remote = []
 
-        for _, emp_row in emp_df.iterrows():
+        for (_, emp_row), (matched_remote_name, score), (matched_zk_name, _) in zip(emp_df.iterrows(), remote_matches, zk_matches):
             emp_name = emp_row['clean_name']
 
-            top_matches = process.extract(emp_name, list(remote_lookup.keys()), scorer=fuzz.ratio, limit=3)
-
-            matched_remote_name, score = top_matches[0] if top_matches else (None, 0)
-
             if score < MATCH_THRESHOLD:
+                # Only the unmatched employees are scored against every remote name, for the suggestions
+                top_matches = remote_index.extract(emp_name, limit=3)
                 unmatched_remote.append({
                     "employee_id": emp_row.get("user_id"),
                     "employee_name": emp_row.get("name"),
@@ -91,7 +141,6 @@ def process_and_merge(remote_df: pd.DataFrame, zk_df: pd.DataFrame, emp_df: pd.D
             matched_remote_name = matched_remote_name if score >= MATCH_THRESHOLD else None
             matched_remote = remote_lookup.get(matched_remote_name) if matched_remote_name else {}
 
-            matched_zk_name = match_name(emp_name, list(zk_lookup.keys()))
             zk_row = zk_lookup.get(matched_zk_name) if matched_zk_name else {}
 
             try:
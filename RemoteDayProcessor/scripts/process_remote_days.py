@@ -1,8 +1,18 @@
 import os
+import re
+import sys
+import hashlib
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 import logging
 import json
-from typing import List, Tuple, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple, Dict
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
 
 # === Setup Logging === #
 logging.basicConfig(
@@ -13,6 +23,11 @@ logging.basicConfig(
 )
 
 WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+# Days of a seating block, in row order under its "Day" marker, e.g. "Monday,Tuesday,Wednesday,Thursday,Friday,Saturday"
+WORKING_DAYS = [day.strip() for day in os.getenv("WORKING_DAYS", ",".join(WEEKDAYS)).split(",")]
+# Remote days reported per person, one column each
+REMOTE_DAYS = int(os.getenv("REMOTE_DAYS", "2"))
+NUMBER_WORDS = ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
 EXCLUDED_NAMES = [
     "book before use", 
     "open to all & trainees / patrick amenuku", 
@@ -20,59 +35,206 @@ EXCLUDED_NAMES = [
     "n/a"
 ]
 
+# Sheets parsed at once, defaults to one process per sheet up to the number of CPUs
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))
+# Cell texts pandas reads as missing (its default na_values) and Excel error values, never names
+MISSING_TEXTS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]) | frozenset(ERROR_CODES)
+
 SNAPSHOT_FILE = "last_input_snapshot.json"
+# Integer cell values of a sheet's XML, a superset of the shared string indices it uses
+CELL_INTEGER = re.compile(rb"<(?:\w+:)?v>(\d+)</(?:\w+:)?v>")
 
-def load_excel_file(file_path: str) -> pd.ExcelFile:
+def load_excel_file(file_path: str) -> List[str]:
+    """Open the workbook read-only and return its sheet names."""
     try:
         logging.info(f"Loading Excel file from: {file_path}")
-        return pd.ExcelFile(file_path)
+        workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            return workbook.sheetnames
+        finally:
+            workbook.close()
     except Exception as e:
         logging.error(f"Error loading Excel file: {e}")
         raise
 
-def extract_day_name_pairs(xlsx: pd.ExcelFile) -> List[Tuple[str, str]]:
-    results = []
+def iter_day_name_pairs(rows: Iterable[tuple]) -> Iterable[Tuple[str, str]]:
+    """Yield the (day, name) pairs of a sheet from its rows of cell values, streamed.
+
+        A row starting with "Day" opens a block whose next len(WORKING_DAYS) rows are the
+        working days, with a name in every other cell. Rows are only looked at while a block
+        is open, and every block yields its pairs once complete, so blocks come out in order
+        even when a marker sits inside another block.
+    """
+    open_blocks: List[list] = []
+    for row in rows:
+        if open_blocks:
+            for block in open_blocks:
+                day_name = WORKING_DAYS[block[0]]
+                for name in row[1:]:
+                    if (
+                        isinstance(name, str)
+                        and name not in MISSING_TEXTS
+                        and name.strip()
+                        and name.strip().lower() not in EXCLUDED_NAMES
+                    ):
+                        # a name sits on several days, keep one copy of it
+                        block[1].append((day_name, sys.intern(name.strip())))
+                block[0] += 1
+            while open_blocks and open_blocks[0][0] == len(WORKING_DAYS):
+                yield from open_blocks.pop(0)[1]
+        if row and isinstance(row[0], str) and row[0].strip().lower() == "day":
+            open_blocks.append([0, []])
+    for block in open_blocks:
+        yield from block[1]
+
+def extract_sheet_pairs(file_path: str, sheet_names: List[str]) -> List[List[Tuple[str, str]]]:
+    """The (day, name) pairs of each of the sheets, read cell by cell in read-only mode."""
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
     try:
-        for sheet_name in xlsx.sheet_names:
-            df = pd.read_excel(xlsx, sheet_name=sheet_name, header=None)
-            data = df.values.tolist()
-
-            for i, row in enumerate(data):
-                if isinstance(row[0], str) and row[0].strip().lower() == "day":
-                    for day_idx, day_row in enumerate(data[i + 1:i + 6]):
-                        if day_idx >= len(WEEKDAYS):
-                            break
-                        day_name = WEEKDAYS[day_idx]
-                        for col_idx in range(1, len(day_row)):
-                            name = day_row[col_idx]
-                            if (
-                                pd.notna(name)
-                                and isinstance(name, str)
-                                and name.strip()
-                                and name.strip().lower() not in EXCLUDED_NAMES
-                            ):
-                                results.append((day_name, name.strip()))
-        logging.info("Successfully extracted (day, name) pairs.")
-        return results
+        sheet_pairs = []
+        for sheet_name in sheet_names:
+            sheet = workbook[sheet_name]
+            # the stored dimensions can be wrong, read every row there is
+            sheet.reset_dimensions()
+            sheet_pairs.append(list(iter_day_name_pairs(sheet.iter_rows(values_only=True))))
+        return sheet_pairs
+    finally:
+        workbook.close()
+
+def extract_sheets(file_path: str, sheet_names: List[str] = None, workers: int = EXTRACT_WORKERS) -> Dict[str, List[Tuple[str, str]]]:
+    """The (day, name) pairs of every sheet by sheet name, in sheet order, the sheets parsed in parallel.
+
+        Each worker opens the workbook once and parses every workers-th sheet.
+    """
+    try:
+        sheet_names = load_excel_file(file_path) if sheet_names is None else sheet_names
+        workers = min(workers or os.cpu_count() or 1, len(sheet_names))
+        if workers <= 1:
+            sheet_pairs = extract_sheet_pairs(file_path, sheet_names) if sheet_names else []
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                shares = list(executor.map(extract_sheet_pairs, [file_path] * workers,
+                                           [sheet_names[i::workers] for i in range(workers)]))
+            sheet_pairs = [shares[i % workers][i // workers] for i in range(len(sheet_names))]
+        skipped = sum(not pairs for pairs in sheet_pairs)
+        logging.info(f"Successfully extracted {sum(map(len, sheet_pairs))} (day, name) pairs from {len(sheet_names)} sheets, {skipped} without any.")
+        return dict(zip(sheet_names, sheet_pairs))
     except Exception as e:
         logging.error(f"Error during extraction: {e}")
         raise
 
-def compute_remote_days(data: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+def extract_day_name_pairs(file_path: str, sheet_names: List[str] = None, workers: int = EXTRACT_WORKERS) -> List[Tuple[str, str]]:
+    """The (day, name) pairs of every sheet, in sheet order."""
+    return [pair for pairs in extract_sheets(file_path, sheet_names, workers).values() for pair in pairs]
+
+def file_fingerprint(file_path: str, previous: Optional[dict] = None) -> dict:
+    """Size, modification time and SHA-256 of the file, the hash reused from previous when size and time match."""
+    stat = os.stat(file_path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and all(previous.get(key) == value for key, value in fingerprint.items()) and previous.get("sha256"):
+        return {**fingerprint, "sha256": previous["sha256"]}
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {**fingerprint, "sha256": digest.hexdigest()}
+
+def local_name(tag: str) -> str:
+    """Tag without its namespace, so transitional and strict workbooks read alike."""
+    return tag.rsplit("}", 1)[-1]
+
+def read_relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """Relationships of a workbook part by Id: (type, target path inside the archive)."""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+    if rels_path not in archive.namelist():
+        return {}
+    relationships = {}
+    for rel in ET.fromstring(archive.read(rels_path)):
+        target = rel.get("Target", "")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+        relationships[rel.get("Id")] = (rel.get("Type", ""), path)
+    return relationships
+
+def shared_string_text(item: ET.Element) -> str:
+    """Text of a shared string item: its <t>, or its rich-text runs, leaving out the phonetic hints."""
+    text = []
+    for child in item:
+        if local_name(child.tag) == "t":
+            text.append(child.text or "")
+        elif local_name(child.tag) == "r":
+            text.extend(node.text or "" for node in child if local_name(node.tag) == "t")
+    return "".join(text)
+
+def sheet_fingerprints(file_path: str) -> Optional[Dict[str, str]]:
+    """SHA-256 of every sheet by sheet name, in sheet order, None when the workbook layout cannot be read.
+
+        A sheet's hash covers its XML and the shared strings it may point to, so it changes
+        with the sheet's cell values and not with edits to other sheets. The parts are read
+        straight from the zip through the package and workbook relationships.
+    """
     try:
-        df_presence = pd.DataFrame(data, columns=["day", "name"])
-        unique_names = df_presence["name"].unique()
-        final_data = []
+        with zipfile.ZipFile(file_path) as archive:
+            workbook = next(path for kind, path in read_relationships(archive, "").values()
+                            if kind.endswith("/officeDocument"))
+            relationships = read_relationships(archive, workbook)
+            shared_strings = []
+            for kind, path in relationships.values():
+                if kind.endswith("/sharedStrings"):
+                    shared_strings = [shared_string_text(item) for item in ET.fromstring(archive.read(path))]
+            hashes = {}
+            for element in ET.fromstring(archive.read(workbook)).iter():
+                if local_name(element.tag) != "sheet":
+                    continue
+                rel_id = next(value for key, value in element.attrib.items() if local_name(key) == "id")
+                xml = archive.read(relationships[rel_id][1])
+                digest = hashlib.sha256(xml)
+                for index in sorted({int(value) for value in CELL_INTEGER.findall(xml)}):
+                    if index < len(shared_strings):
+                        digest.update(f"{index}:{shared_strings[index]}\0".encode())
+                hashes[element.get("name")] = digest.hexdigest()
+            return hashes
+    except Exception as e:
+        logging.warning(f"Could not fingerprint the sheets, extracting all of them: {e}")
+        return None
+
+def remote_day_columns(remote_days: int) -> List[str]:
+    """Output columns of the remote days: remote_day_one, remote_day_two, ... (remote_day_11 and on past ten)."""
+    if remote_days < 1:
+        raise ValueError(f"REMOTE_DAYS must be at least 1, got {remote_days}")
+    return [f"remote_day_{NUMBER_WORDS[i] if i < len(NUMBER_WORDS) else i + 1}" for i in range(remote_days)]
 
-        for name in unique_names:
-            present_days = df_presence[df_presence["name"] == name]["day"].unique().tolist()
-            remote_days = [day for day in WEEKDAYS if day not in present_days]
+def remote_day_table(working_days: List[str], remote_days: int) -> np.ndarray:
+    """Remote days of every in-office bitmask: row mask holds the first remote_days working days whose bit is not set, "" after the last."""
+    table = np.full((1 << len(working_days), remote_days), "", dtype=object)
+    for mask in range(1 << len(working_days)):
+        absent = [day for bit, day in enumerate(working_days) if not mask & (1 << bit)]
+        table[mask, :len(absent[:remote_days])] = absent[:remote_days]
+    return table
 
-            final_data.append({
-                "name": name,
-                "remote_day_one": remote_days[0] if len(remote_days) > 0 else "",
-                "remote_day_two": remote_days[1] if len(remote_days) > 1 else ""
-            })
+def compute_remote_days(data: List[Tuple[str, str]], working_days: List[str] = WORKING_DAYS, remote_days: int = REMOTE_DAYS) -> List[Dict[str, str]]:
+    """Remote days of every name, the working days it is not seated on, in order of first appearance.
+
+        Each name's in-office days are encoded as a bitmask over working_days (bit 0 is the
+        first day) in one groupby pass, and the remote days are looked up from the mask.
+    """
+    try:
+        df_presence = pd.DataFrame(data, columns=["day", "name"])
+        name_codes, unique_names = pd.factorize(df_presence["name"])
+        day_codes = pd.Categorical(df_presence["day"], categories=working_days).codes.astype(np.int64)
+        # Days outside the working week never make a remote day
+        working = day_codes >= 0
+        seated = pd.DataFrame({"name": name_codes[working], "bit": np.left_shift(1, day_codes[working])})
+        masks = np.zeros(len(unique_names), dtype=np.int64)
+        in_office = seated.drop_duplicates().groupby("name")["bit"].sum()
+        masks[in_office.index.to_numpy()] = in_office.to_numpy()
+
+        remote = remote_day_table(working_days, remote_days)[masks]
+        columns = remote_day_columns(remote_days)
+        final_data = pd.DataFrame(remote, columns=columns).assign(name=unique_names.to_numpy())[["name"] + columns].to_dict("records")
 
         logging.info("Successfully computed remote days.")
         return final_data
@@ -82,47 +244,88 @@ def compute_remote_days(data: List[Tuple[str, str]]) -> List[Dict[str, str]]:
 
 def save_to_csv(final_data: List[Dict[str, str]], output_path: str):
     try:
-        output_df = pd.DataFrame(final_data, columns=["name", "remote_day_one", "remote_day_two"])
-        output_df.sort_values(by=["name", "remote_day_one", "remote_day_two"]).to_csv(output_path, index=False)
+        columns = list(final_data[0]) if final_data else ["name"] + remote_day_columns(REMOTE_DAYS)
+        output_df = pd.DataFrame(final_data, columns=columns)
+        output_df.sort_values(by=columns).to_csv(output_path, index=False)
         logging.info(f"Data written to CSV: {output_path}")
         print(f"Output written to '{output_path}'")
     except Exception as e:
         logging.error(f"Error writing CSV: {e}")
         raise
 
-def load_last_snapshot() -> List[Tuple[str, str]]:
+def load_last_snapshot() -> dict:
+    """The last snapshot: the file fingerprint, and the hash and (day, name) pairs of every sheet in order.
+
+        A snapshot from before sheets were tracked is a plain list of pairs, it is read as
+        one sheet that never matches so every sheet gets extracted.
+    """
+    empty = {"file": {}, "sheets": []}
     if not os.path.exists(SNAPSHOT_FILE):
-        return []
+        return empty
     try:
         with open(SNAPSHOT_FILE, "r") as f:
             data = json.load(f)
+        if isinstance(data, list):
+            data = {"file": {}, "sheets": [{"name": None, "hash": None, "pairs": data}]}
+        for sheet in data["sheets"]:
             # Convert loaded lists back to tuples
-            return [tuple(item) for item in data]
+            sheet["pairs"] = [tuple(item) for item in sheet["pairs"]]
+        return data
     except Exception as e:
         logging.warning(f"Failed to load snapshot: {e}")
-        return []
+        return empty
 
-def save_snapshot(data: List[Tuple[str, str]]):
+def save_snapshot(fingerprint: dict, sheets: List[dict]):
     try:
         with open(SNAPSHOT_FILE, "w") as f:
             # Convert tuples to lists for JSON serialization
-            json.dump([list(item) for item in sorted(data)], f, indent=2)
+            json.dump({
+                "file": fingerprint,
+                "sheets": [{**sheet, "pairs": [list(item) for item in sheet["pairs"]]} for sheet in sheets]
+            }, f, indent=2)
         logging.info("Snapshot of source data saved.")
     except Exception as e:
         logging.error(f"Failed to save snapshot: {e}")
 
+def snapshot_pairs(sheets: List[dict]) -> List[Tuple[str, str]]:
+    return [pair for sheet in sheets for pair in sheet["pairs"]]
+
 def main():
     try:
         downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
         file_path = os.path.join("data", "leave_data.xlsx")
         output_file = "remote_days_output2.csv"
 
-        xlsx = load_excel_file(file_path)
-        day_name_pairs = extract_day_name_pairs(xlsx)
+        # Same file as last time: size and modification time, then the content hash
+        last_snapshot = load_last_snapshot()
+        fingerprint = file_fingerprint(file_path, last_snapshot["file"])
+        if fingerprint["sha256"] == last_snapshot["file"].get("sha256"):
+            if fingerprint != last_snapshot["file"]:
+                save_snapshot(fingerprint, last_snapshot["sheets"])
+            logging.info("No change in Excel source file. Skipping processing.")
+            print("No changes detected in Excel source. Skipping.")
+            return
+
+        # Only the sheets whose hash changed are extracted again, the others keep their pairs
+        sheet_hashes = sheet_fingerprints(file_path)
+        sheet_names = list(sheet_hashes) if sheet_hashes is not None else load_excel_file(file_path)
+        last_sheets = {sheet["name"]: sheet for sheet in last_snapshot["sheets"]}
+        changed = [
+            name for name in sheet_names
+            if sheet_hashes is None or name not in last_sheets or last_sheets[name]["hash"] != sheet_hashes[name]
+        ]
+        extracted = extract_sheets(file_path, changed)
+        sheets = [
+            {"name": name, "hash": sheet_hashes[name] if sheet_hashes is not None else None,
+             "pairs": extracted[name] if name in extracted else last_sheets[name]["pairs"]}
+            for name in sheet_names
+        ]
+        logging.info(f"{len(changed)} of {len(sheet_names)} sheets changed and were extracted.")
+        day_name_pairs = snapshot_pairs(sheets)
 
         # Check if the source data has changed compared to the last snapshot
-        last_snapshot = load_last_snapshot()
-        if sorted(last_snapshot) == sorted(day_name_pairs):
+        if sorted(snapshot_pairs(last_snapshot["sheets"])) == sorted(day_name_pairs):
+            save_snapshot(fingerprint, sheets)
             logging.info("No change in Excel source data. Skipping processing.")
             print("No changes detected in Excel source. Skipping.")
             return
@@ -131,7 +334,7 @@ def main():
         final_data = compute_remote_days(day_name_pairs)
 
         # Save the snapshot for future comparisons
-        save_snapshot(day_name_pairs)
+        save_snapshot(fingerprint, sheets)
 
         save_to_csv(final_data, output_file)
 
@@ -0,0 +1 @@
+"""Benchmarks for the door access pipelines, run with `python -m benchmarks.<name>`."""
@@ -0,0 +1,48 @@
+"""Time the as-of event log / check-in join against the exact-timestamp merge it replaced.
+
+Synthetic logs have a share of same-second punches and of check-ins written a second
+after their event, the two cases the exact merge fans out on or drops.
+
+    python -m benchmarks.bench_asof_join --rows 10000000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_tables
+from door_access.join import asof_join
+from door_access.transform import clean_checkin_data, clean_eventlog_data
+
+
+def synthetic_logs(rows: int, seed: int = 0):
+    """Return cleaned (eventlog_df, checkin_df) with one check-in per event, 10% same-second repeats and 5% skewed by up to 1s."""
+    tables = generate_tables(rows, unmatched_rate=0, seed=seed)
+    return clean_eventlog_data(tables['acc_monitor_log']), clean_checkin_data(tables['CHECKINOUT'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--tolerance", type=int, default=1, help="seconds")
+    parser.add_argument("--skip-exact", action="store_true", help="do not run the old exact merge")
+    args = parser.parse_args()
+
+    eventlog_df, checkin_df = synthetic_logs(args.rows)
+    print(f"{args.rows} events, {args.rows} check-ins")
+
+    start = time.perf_counter()
+    joined, stats = asof_join(eventlog_df, checkin_df, tolerance=pd.Timedelta(seconds=args.tolerance),
+                              suffixes=('_eventlog', '_checkin'))
+    elapsed = time.perf_counter() - start
+    print(f"asof_join: {elapsed:.2f}s, {len(joined)} rows, {stats}, {args.rows / elapsed:,.0f} rows/s")
+
+    if not args.skip_exact:
+        start = time.perf_counter()
+        merged = eventlog_df.merge(checkin_df, on='logtime', how='left', suffixes=('_eventlog', '_checkin'))
+        elapsed = time.perf_counter() - start
+        print(f"exact merge: {elapsed:.2f}s, {len(merged)} rows, {int(merged['userid'].isna().sum())} unmatched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Show that incremental extraction cost follows the delta, not the history.
+
+Builds a SQLite stand-in for Access.mdb with a growing history of punches, appends a
+fixed-size delta, and times a full load against a watermark load of the log tables.
+
+    python -m benchmarks.bench_incremental_extract
+"""
+import datetime as dt
+import sqlite3
+import time
+
+from door_access.extract import load_tables
+
+LOG_TABLES = {'checkin': 'CHECKINOUT', 'eventlog': 'acc_monitor_log'}
+HISTORY_SIZES = [10_000, 100_000, 1_000_000]
+DELTA_SIZE = 1_000
+START = dt.datetime(2024, 1, 1, 7, 0, 0)
+
+
+def create_standin(conn: sqlite3.Connection) -> None:
+    """Create the two append-only log tables with the Access primary keys."""
+    conn.execute("CREATE TABLE [CHECKINOUT] (LOGID INTEGER PRIMARY KEY, USERID INTEGER, CHECKTIME TEXT, CHECKTYPE TEXT, SENSORID TEXT)")
+    conn.execute("CREATE TABLE [acc_monitor_log] (id INTEGER PRIMARY KEY, time TEXT, pin TEXT, card_no TEXT, device_name TEXT, "
+                 "state INTEGER, event_type INTEGER, event_point_name TEXT, description TEXT)")
+
+
+def insert_punches(conn: sqlite3.Connection, first_id: int, count: int) -> None:
+    """Append count punches to both log tables, one every 30 seconds."""
+    times = [(START + dt.timedelta(seconds=30 * i)).strftime("%Y-%m-%d %H:%M:%S") for i in range(first_id, first_id + count)]
+    conn.executemany(
+        "INSERT INTO [CHECKINOUT] VALUES (?, ?, ?, 'I', '1')",
+        [(first_id + i, (first_id + i) % 500, t) for i, t in enumerate(times)]
+    )
+    conn.executemany(
+        "INSERT INTO [acc_monitor_log] VALUES (?, ?, '', '', 'Main Door', 0, 0, 'Main Door-1', '')",
+        [(first_id + i, t) for i, t in enumerate(times)]
+    )
+    conn.commit()
+
+
+def timed_load(conn, watermarks=None):
+    start = time.perf_counter()
+    dfs, new_watermarks = load_tables(conn, LOG_TABLES, watermarks)
+    return time.perf_counter() - start, sum(len(df) for df in dfs.values()), new_watermarks
+
+
+def main() -> None:
+    print(f"{'history':>10} {'full_s':>8} {'full_rows':>10} {'delta_s':>8} {'delta_rows':>10}")
+    for history in HISTORY_SIZES:
+        conn = sqlite3.connect(":memory:")
+        create_standin(conn)
+        insert_punches(conn, 1, history)
+        _, _, watermarks = timed_load(conn)
+        insert_punches(conn, history + 1, DELTA_SIZE)
+
+        full_s, full_rows, _ = timed_load(conn)
+        delta_s, delta_rows, _ = timed_load(conn, watermarks)
+        print(f"{history:>10} {full_s:>8.3f} {full_rows:>10} {delta_s:>8.3f} {delta_rows:>10}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Time the employee name matching of Final_Merger/name_match.py against the per-employee scans it replaced.
+
+"before" calls thefuzz's process.extract and extractOne for every employee over freshly
+built candidate lists, "after" indexes the candidates once with NameIndex and matches every
+employee at once. Both give the same remote and ZKAccess matches, which is checked.
+
+    python -m benchmarks.bench_name_match --names 10000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import FIRST_NAMES, LAST_NAMES
+from Final_Merger.name_match import MATCH_THRESHOLD, NameIndex, clean_name
+
+
+def synthetic_names(count: int, seed: int = 0):
+    """Return (employee, remote, zkaccess) cleaned names, the last two with a share of typos."""
+    rnd = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    def typo(name: str) -> str:
+        chars = list(name)
+        for _ in range(rnd.choice([0, 0, 1, 2])):
+            i = rnd.randrange(len(chars))
+            chars[i:i + 1] = rnd.choice([[], [rnd.choice(letters)], [chars[i], rnd.choice(letters)]])
+        return "".join(chars) or name
+
+    people = [f"{rnd.choice(FIRST_NAMES)} {rnd.choice(FIRST_NAMES) + ' ' if rnd.random() < 0.3 else ''}{rnd.choice(LAST_NAMES)}{rnd.randint(1, 999)}"
+              for _ in range(count)]
+    employees = [clean_name(name) for name in people]
+    remote = list(dict.fromkeys(clean_name(typo(name)) for name in rnd.sample(people, count)))
+    zkaccess = list(dict.fromkeys(clean_name(typo(name)) for name in rnd.sample(people, count)))
+    return employees, remote, zkaccess
+
+
+def before(employees, remote, zkaccess):
+    from thefuzz import fuzz, process
+    remote_lookup = dict.fromkeys(remote)
+    zk_lookup = dict.fromkeys(zkaccess)
+    results = []
+    for name in employees:
+        top_matches = process.extract(name, list(remote_lookup.keys()), scorer=fuzz.ratio, limit=3)
+        remote_name, score = top_matches[0] if top_matches else (None, 0)
+        zk_name, zk_score = process.extractOne(name, list(zk_lookup.keys()), scorer=fuzz.ratio)
+        results.append((remote_name if score >= MATCH_THRESHOLD else None, zk_name if zk_score >= MATCH_THRESHOLD else None))
+    return results
+
+
+def after(employees, remote, zkaccess):
+    remote_index = NameIndex(remote)
+    zk_index = NameIndex(zkaccess)
+    remote_matches = remote_index.best_matches(employees, MATCH_THRESHOLD)
+    zk_matches = zk_index.best_matches(employees, MATCH_THRESHOLD)
+    for name, (remote_name, _) in zip(employees, remote_matches):
+        if remote_name is None:
+            remote_index.extract(name, limit=3)
+    return [(remote_name, zk_name) for (remote_name, _), (zk_name, _) in zip(remote_matches, zk_matches)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=10_000, help="employees, remote and ZKAccess names each")
+    parser.add_argument("--skip-before", action="store_true", help="do not run the per-employee scans")
+    args = parser.parse_args()
+
+    names = synthetic_names(args.names)
+    print(f"{len(names[0])} employees, {len(names[1])} remote names, {len(names[2])} ZKAccess names")
+
+    start = time.perf_counter()
+    new = after(*names)
+    elapsed = time.perf_counter() - start
+    matched = sum(remote is not None for remote, _ in new), sum(zk is not None for _, zk in new)
+    print(f" after: {elapsed:7.2f}s, {matched[0]} remote and {matched[1]} ZKAccess matches")
+
+    if not args.skip_before:
+        start = time.perf_counter()
+        old = before(*names)
+        elapsed = time.perf_counter() - start
+        print(f"before: {elapsed:7.2f}s, same matches: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
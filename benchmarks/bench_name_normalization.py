@@ -0,0 +1,75 @@
+"""Time name_normalization.normalize_column against the per-row Series.apply it replaced.
+
+A punch-sized column repeats a few thousand distinct names (first and last names of the
+ZKAccess users, with stray spaces, case and punctuation) over every row. "before" applies
+the original regex functions to every row, "after" normalises the distinct values only.
+Both normalisers are timed, processing's normalize_name and name_match's clean_name, and
+the results are compared. The LRU cache is cleared before each run, a second run shows the
+time once the names are cached.
+
+    python -m benchmarks.bench_name_normalization --rows 5000000 --names 2000
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import FIRST_NAMES, LAST_NAMES
+from name_normalization import clean_name, normalize_column, normalize_name
+
+
+def before_normalize_name(name):
+    """The original normalize_name of Data Processing/processing.py."""
+    if pd.isna(name):
+        return ''
+    name = str(name).lower().strip()
+    name = re.sub(r'\s+', ' ', name)
+    name = re.sub(r'[^a-z\s]', '', name)
+    return name
+
+
+def before_clean_name(name: str) -> str:
+    """The original clean_name of Final_Merger/name_match.py."""
+    name = str(name).strip().lower()
+    name = re.sub(r'[^a-z\s]', '', name)
+    name = re.sub(r'\s+', ' ', name)
+    return name
+
+
+def synthetic_column(rows: int, names: int, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    styles = ["{} {}", " {}  {} ", "{}-{}", "{}, {}.", "{} {} "]
+    people = [styles[i % len(styles)].format(FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)])
+              + (f" {i}" if i >= len(FIRST_NAMES) * len(LAST_NAMES) else "") for i in range(names)]
+    column = pd.Series(np.asarray(people, dtype=object)[rng.integers(0, names, rows)])
+    column[rng.random(rows) < 0.01] = None
+    return column
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--names", type=int, default=2000, help="distinct names in the column")
+    args = parser.parse_args()
+
+    column = synthetic_column(args.rows, args.names)
+    print(f"{len(column)} rows, {column.nunique()} distinct names")
+    for label, before, after in [("normalize_name", before_normalize_name, normalize_name),
+                                 ("clean_name", before_clean_name, clean_name)]:
+        after.cache_clear()
+        start = time.perf_counter()
+        new = normalize_column(column, after)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        normalize_column(column, after)
+        warm = time.perf_counter() - start
+        start = time.perf_counter()
+        old = column.apply(before)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>14}: before {elapsed:7.2f}s, after {cold:6.2f}s ({warm:.2f}s cached), same: {old.equals(new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Time every stage of the extract, clean, merge, group and write path on synthetic ZKAccess data.
+
+For each size the synthetic tables (benchmarks.synthetic) are written to a SQLite stand-in
+for Access.mdb, then load_data (through an AccessSource), the clean_* functions, merge_data,
+group_by_year_month_1 and the CSV and Parquet writers run in order, each on the output of the
+one before. Every stage reports its time, rows in and out, throughput and tracemalloc peak.
+The report is JSON with the commit and parameters, so runs on two commits can be compared
+with --compare.
+
+    python -m benchmarks.bench_pipeline --rows 10000 1000000 10000000 --output before.json
+    python -m benchmarks.bench_pipeline --rows 10000 1000000 10000000 --compare before.json
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_tables, write_sqlite
+from door_access.exports import export_csv, export_parquet
+from door_access.sources import AccessSource
+from door_access.transform import (
+    CHECKIN_COLUMNS, DEPARTMENT_COLUMNS, EVENTLOG_COLUMNS, USER_COLUMNS, clean_checkin_data,
+    clean_department_data, clean_eventlog_data, clean_user_data, group_by_year_month_1, merge_data
+)
+
+# Same tables, columns and years as door_access.pipeline, which needs pyodbc to import
+TABLE_MAPPING = {'checkin': 'CHECKINOUT', 'user': 'USERINFO', 'eventlog': 'acc_monitor_log', 'departments': 'DEPARTMENTS'}
+TABLE_COLUMNS = {'CHECKINOUT': CHECKIN_COLUMNS, 'USERINFO': USER_COLUMNS, 'acc_monitor_log': EVENTLOG_COLUMNS, 'DEPARTMENTS': DEPARTMENT_COLUMNS}
+YEAR_RANGE = (2024, None)
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+
+def count_rows(value) -> int:
+    """Rows in a frame, a dict of frames or a (dict of frames, watermarks) pair."""
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, dict):
+        return sum(count_rows(v) for v in value.values())
+    return len(value)
+
+
+def measure(results: List[dict], size: int, stage: str, func: Callable, rows_in: int):
+    """Run func once, append its timings to results and return what it returned."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows_out = count_rows(value) if not isinstance(value, int) else rows_in
+    results.append({
+        'rows': size,
+        'stage': stage,
+        'seconds': round(seconds, 4),
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'rows_per_second': round(rows_in / seconds) if seconds else None,
+        'peak_mib': round(peak / 2**20, 1),
+    })
+    print(f"{size:>10} {stage:>24} {seconds:>9.3f}s {rows_in:>10} -> {rows_out:<10} {peak / 2**20:>9.1f} MiB", file=sys.stderr)
+    return value
+
+
+def write_months(groups: Dict[str, pd.DataFrame], directory: str, write: Callable, suffix: str) -> int:
+    """Write every month with write(df, path) and return the bytes written."""
+    written = 0
+    for name, group in groups.items():
+        path = os.path.join(directory, f"attendance_{name}.{suffix}")
+        write(group, path)
+        written += os.path.getsize(path)
+    return written
+
+
+def run_size(size: int, args, workdir: str) -> List[dict]:
+    results = []
+    tables = generate_tables(size, users=args.users, devices=args.devices, doors=args.doors, days=args.days,
+                             duplicate_rate=args.duplicate_rate, skew_rate=args.skew_rate, seed=args.seed)
+    db_path = os.path.join(workdir, f"standin_{size}.db")
+    write_sqlite(tables, db_path)
+    total = sum(len(df) for df in tables.values())
+    del tables
+
+    source = AccessSource(lambda: closing(sqlite3.connect(db_path)))
+    dfs, _ = measure(results, size, 'load_data', lambda: source.load(TABLE_MAPPING, None, TABLE_COLUMNS, YEAR_RANGE), total)
+    checkin = measure(results, size, 'clean_checkin_data', lambda: clean_checkin_data(dfs['checkin'], YEAR_RANGE), len(dfs['checkin']))
+    user = measure(results, size, 'clean_user_data', lambda: clean_user_data(dfs['user']), len(dfs['user']))
+    eventlog = measure(results, size, 'clean_eventlog_data', lambda: clean_eventlog_data(dfs['eventlog'], YEAR_RANGE), len(dfs['eventlog']))
+    departments = measure(results, size, 'clean_department_data', lambda: clean_department_data(dfs['departments']), len(dfs['departments']))
+    del dfs
+    merged = measure(results, size, 'merge_data', lambda: merge_data(user, checkin, eventlog, departments), len(eventlog))
+    groups = measure(results, size, 'group_by_year_month_1', lambda: group_by_year_month_1(merged, "2024-01"), len(merged))
+    del merged
+
+    for stage, write, suffix in [('export_csv', export_csv, 'csv'), ('export_parquet', export_parquet, 'parquet')]:
+        directory = os.path.join(workdir, f"{size}_{suffix}")
+        os.makedirs(directory, exist_ok=True)
+        written = measure(results, size, stage, lambda: write_months(groups, directory, write, suffix), count_rows(groups))
+        results[-1]['bytes_written'] = written
+    os.remove(db_path)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """Print the time and peak memory of every stage against the baseline report."""
+    base = {(r['rows'], r['stage']): r for r in baseline['results']}
+    print(f"{report['commit']} against {baseline['commit']}")
+    print(f"{'rows':>10} {'stage':>24} {'seconds':>20} {'peak MiB':>22}")
+    for r in report['results']:
+        b = base.get((r['rows'], r['stage']))
+        if b is None:
+            continue
+        speedup = b['seconds'] / r['seconds'] if r['seconds'] else float('nan')
+        print(f"{r['rows']:>10} {r['stage']:>24} {b['seconds']:>8.3f} -> {r['seconds']:<8.3f} x{speedup:<5.2f}"
+              f"{b['peak_mib']:>9.1f} -> {r['peak_mib']:<9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SIZES, help="event log sizes")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--doors", type=int, default=4, help="per device")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--skew-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'benchmark': 'pipeline',
+        'commit': git_commit(),
+        'created': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'results': [],
+    }
+    print(f"{'rows':>10} {'stage':>24} {'time':>10} {'rows in -> out':>21} {'peak':>13}", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.rows:
+            report['results'].extend(run_size(size, args, workdir))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Time RemoteDayProcessor's bitmask compute_remote_days against the per-name loop it replaced.
+
+The (day, name) entries come from a synthetic seating workbook (benchmarks.synthetic).
+"before" is the original loop, re-filtering the presence frame for every name; "after" is
+compute_remote_days. Both outputs are written the way save_to_csv writes them and compared.
+
+    python -m benchmarks.bench_remote_days --pairs 50000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_seating
+from RemoteDayProcessor.scripts.process_remote_days import WEEKDAYS, compute_remote_days
+
+
+def before(data):
+    """The original compute_remote_days."""
+    df_presence = pd.DataFrame(data, columns=["day", "name"])
+    final_data = []
+    for name in df_presence["name"].unique():
+        present_days = df_presence[df_presence["name"] == name]["day"].unique().tolist()
+        remote_days = [day for day in WEEKDAYS if day not in present_days]
+        final_data.append({
+            "name": name,
+            "remote_day_one": remote_days[0] if len(remote_days) > 0 else "",
+            "remote_day_two": remote_days[1] if len(remote_days) > 1 else ""
+        })
+    return final_data
+
+
+def to_csv(final_data) -> str:
+    """The CSV save_to_csv writes."""
+    columns = ["name", "remote_day_one", "remote_day_two"]
+    return pd.DataFrame(final_data, columns=columns).sort_values(by=columns).to_csv(index=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=50_000, help="(day, name) entries in the seating sheets")
+    parser.add_argument("--people", type=int, default=12_000)
+    args = parser.parse_args()
+
+    _, entries = generate_seating(args.pairs, people=args.people)
+    print(f"{len(entries)} (day, name) entries")
+
+    start = time.perf_counter()
+    new = compute_remote_days(entries, WEEKDAYS, 2)
+    elapsed = time.perf_counter() - start
+    print(f" after: {elapsed:7.3f}s, {len(new)} names")
+
+    start = time.perf_counter()
+    old = before(entries)
+    elapsed = time.perf_counter() - start
+    print(f"before: {elapsed:7.3f}s, same CSV: {to_csv(old) == to_csv(new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Time the streaming read-only parse of a seating workbook against the pandas parse it replaced.
+
+A synthetic multi-floor leave_data.xlsx (benchmarks.synthetic) is written to a temporary
+file. "before" reads every sheet into a DataFrame with pd.read_excel and scans its rows,
+"after" is extract_day_name_pairs, streaming the sheets with openpyxl in read-only mode
+across a process pool. Both give the same (day, name) pairs, which is checked. Peak memory
+is the tracemalloc peak of this process, so it leaves out the worker processes; --workers 1
+parses in process for a like-for-like figure.
+
+    python -m benchmarks.bench_seating_parse --pairs 500000 --floors 16
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_seating, write_seating_workbook
+from RemoteDayProcessor.scripts.process_remote_days import EXCLUDED_NAMES, WORKING_DAYS, extract_day_name_pairs
+
+
+def before(file_path):
+    """The original extract_day_name_pairs."""
+    xlsx = pd.ExcelFile(file_path)
+    results = []
+    for sheet_name in xlsx.sheet_names:
+        df = pd.read_excel(xlsx, sheet_name=sheet_name, header=None)
+        data = df.values.tolist()
+        for i, row in enumerate(data):
+            if isinstance(row[0], str) and row[0].strip().lower() == "day":
+                for day_idx, day_row in enumerate(data[i + 1:i + 1 + len(WORKING_DAYS)]):
+                    day_name = WORKING_DAYS[day_idx]
+                    for col_idx in range(1, len(day_row)):
+                        name = day_row[col_idx]
+                        if (
+                            pd.notna(name)
+                            and isinstance(name, str)
+                            and name.strip()
+                            and name.strip().lower() not in EXCLUDED_NAMES
+                        ):
+                            results.append((day_name, name.strip()))
+    return results
+
+
+def measure(label: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>6}: {elapsed:7.2f}s, peak {peak / 2**20:7.1f} MiB, {len(value)} pairs")
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=500_000, help="(day, name) entries in the seating sheets")
+    parser.add_argument("--floors", type=int, default=16, help="sheets of the workbook")
+    parser.add_argument("--seats", type=int, default=40, help="seats per block")
+    parser.add_argument("--workers", type=int, default=0, help="processes parsing sheets, 0 for one per sheet up to the CPUs")
+    args = parser.parse_args()
+
+    sheets, _ = generate_seating(args.pairs, people=args.pairs // 4, floors=args.floors, seats=args.seats)
+    with tempfile.TemporaryDirectory() as workdir:
+        file_path = os.path.join(workdir, "leave_data.xlsx")
+        write_seating_workbook(sheets, file_path)
+        del sheets
+        print(f"{args.floors} sheets, {os.path.getsize(file_path) / 2**20:.1f} MiB workbook")
+
+        new = measure("after", lambda: extract_day_name_pairs(file_path, workers=args.workers))
+        old = measure("before", lambda: before(file_path))
+        print(f"same pairs: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
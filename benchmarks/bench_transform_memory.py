@@ -0,0 +1,86 @@
+"""Compare peak memory of the clean/merge/group/write path before and after the copy-minimised transform.
+
+"before" replays the original site-script functions (copy + rename per table, constant
+columns and year_month materialised on the whole frame), "after" runs door_access.transform
+and writes each month through door_access.exports. Peaks are measured with tracemalloc.
+
+    python -m benchmarks.bench_transform_memory --rows 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_tables
+from door_access.exports import export_csv
+from door_access.transform import (
+    clean_checkin_data, clean_department_data, clean_eventlog_data, clean_user_data,
+    group_by_year_month_1, merge_data
+)
+
+
+def before(user, checkin, eventlog, departments) -> int:
+    """The original pipeline, kept verbatim apart from writing to memory."""
+    checkin_df = checkin[['USERID', 'CHECKTIME', 'LOGID']].copy()
+    checkin_df.rename(columns={'USERID': 'userid', 'CHECKTIME': 'logtime', 'LOGID': 'logid'}, inplace=True)
+    checkin_df['logtime'] = pd.to_datetime(checkin_df['logtime'])
+    checkin_df['logtime_year'] = checkin_df['logtime'].dt.year
+    checkin_df = checkin_df[checkin_df['logtime_year'] >= 2024]
+    user_df = user[['USERID', 'name', 'lastname', 'email', 'DEFAULTDEPTID', 'CardNo']].copy()
+    user_df.rename(columns={'USERID': 'userid', 'name': 'firstname', 'email': 'Email',
+                            'DEFAULTDEPTID': 'deptid', 'CardNo': 'card number'}, inplace=True)
+    eventlog_df = eventlog[['id', 'time', 'device_name', 'state', 'event_type', 'event_point_name']].copy()
+    eventlog_df.rename(columns={'id': 'logid', 'time': 'logtime', 'device_name': 'device name'}, inplace=True)
+    eventlog_df['logtime'] = pd.to_datetime(eventlog_df['logtime'])
+    eventlog_df['logtime_year'] = eventlog_df['logtime'].dt.year
+    eventlog_df = eventlog_df[eventlog_df['logtime_year'] >= 2024]
+    department_df = departments[['DEPTID', 'DEPTNAME', 'SUPDEPTID']].copy()
+    department_df.rename(columns={'DEPTID': 'deptid', 'DEPTNAME': 'deptname', 'SUPDEPTID': 'supdeptid'}, inplace=True)
+
+    employee_df = user_df.merge(department_df, on='deptid', how='left')
+    log_events_df = eventlog_df.merge(checkin_df, on='logtime', how='left', suffixes=('_eventlog', '_checkin'))
+    merged_df = pd.merge(employee_df, log_events_df, on='userid', how='inner')
+    for col in ['verify type', 'in/out status', 'event description', 'remarks']:
+        merged_df[col] = ''
+    merged_df.rename(columns={'userid': 'personnel id', 'logtime': 'date and time', 'event_point_name': 'event point',
+                              'firstname': 'first name', 'lastname': 'last name'}, inplace=True)
+    merged_df = merged_df[['date and time', 'personnel id', 'first name', 'last name', 'card number', 'device name',
+                           'event point', 'verify type', 'in/out status', 'event description', 'remarks']]
+
+    merged_df['year_month'] = merged_df['date and time'].dt.to_period('M').astype(str)
+    groups = {name: group.drop(columns='year_month') for name, group in merged_df.groupby('year_month')}
+    return sum(len(group.to_csv(index=False)) for group in groups.values())
+
+
+def after(user, checkin, eventlog, departments) -> int:
+    df = merge_data(clean_user_data(user), clean_checkin_data(checkin), clean_eventlog_data(eventlog),
+                    clean_department_data(departments))
+    groups = group_by_year_month_1(df, "2024-01")
+    return sum(len(export_csv(group)) for group in groups.values())
+
+
+def measure(label, func, tables) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = func(*tables)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>7}: peak {peak / 2**20:8.1f} MiB, {elapsed:6.2f}s, {written / 2**20:.1f} MiB of CSV")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raw = generate_tables(args.rows)
+    tables = (raw['USERINFO'], raw['CHECKINOUT'], raw['acc_monitor_log'], raw['DEPARTMENTS'])
+    print(f"{args.rows} punches")
+    measure("before", before, tables)
+    measure("after", after, tables)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Synthetic ZKAccess tables and seating workbooks for the benchmarks.
+
+generate_tables returns raw USERINFO, CHECKINOUT, acc_monitor_log and DEPARTMENTS frames
+in the Access layout, extra columns included, so they go through the same projection,
+cleaning and merge as the real database. generate_seating returns the sheets of a
+leave_data.xlsx seating workbook for RemoteDayProcessor. The same arguments and seed
+always give the same data, so results can be compared between commits.
+
+    python -m benchmarks.synthetic --rows 100000 --sqlite standin.db
+"""
+import argparse
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = ["Kwame", "Ama", "Kofi", "Akosua", "Yaw", "Abena", "Kojo", "Efua", "Kwabena", "Adwoa",
+               "Nana", "Esi", "Kweku", "Yaa", "Fiifi", "Afua", "Kwesi", "Akua", "Ekow", "Araba"]
+LAST_NAMES = ["Mensah", "Owusu", "Boateng", "Asante", "Osei", "Agyeman", "Darko", "Appiah", "Addo", "Amoah",
+              "Ofori", "Badu", "Sarpong", "Frimpong", "Gyamfi", "Acheampong", "Danso", "Opoku", "Antwi", "Quaye"]
+
+
+def generate_tables(
+    rows: int,
+    users: int = 2000,
+    devices: int = 4,
+    doors: int = 4,
+    days: int = 365,
+    departments: int = 12,
+    duplicate_rate: float = 0.1,
+    skew_rate: float = 0.05,
+    max_skew: int = 1,
+    unmatched_rate: float = 0.05,
+    start: str = "2024-01-01",
+    seed: int = 0
+) -> Dict[str, pd.DataFrame]:
+    """Raw ZKAccess tables with rows event log entries.
+
+        users, devices, doors (per device), days and departments size the site.
+        Punches cluster around 08:00 and 17:00 on each day and are numbered in time order.
+        duplicate_rate: share of punches in the same second as the one before (several people at a door).
+        skew_rate: share of check-ins stamped up to max_skew seconds off their event (device clock skew).
+        unmatched_rate: share of events without a check-in (door alarms, unknown cards).
+    """
+    rng = np.random.default_rng(seed)
+
+    dept_ids = np.arange(1, departments + 1)
+    department_df = pd.DataFrame({
+        'DEPTID': dept_ids,
+        'DEPTNAME': [f"Department {i}" for i in dept_ids],
+        'SUPDEPTID': np.where(dept_ids == 1, 0, 1),
+    })
+
+    user_ids = np.arange(1, users + 1)
+    card_numbers = pd.Series(3_000_000 + user_ids).astype(str)
+    card_numbers[rng.random(users) < 0.1] = None
+    user_df = pd.DataFrame({
+        'USERID': user_ids,
+        'Badgenumber': (1000 + user_ids).astype(str),
+        'SSN': None,
+        'name': np.asarray(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), users)],
+        'lastname': np.asarray(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), users)],
+        'Gender': rng.choice(['M', 'F'], users),
+        'email': [f"user{i}@example.org" for i in user_ids],
+        'DEFAULTDEPTID': rng.choice(dept_ids, users),
+        'CardNo': card_numbers,
+        'ATT': 1,
+    })
+
+    # Punch times: a day, then a time around the start or end of the working day, in time order
+    day = np.sort(rng.integers(0, days, rows))
+    seconds = np.where(rng.random(rows) < 0.5, rng.normal(8 * 3600, 2400, rows), rng.normal(17 * 3600, 2400, rows))
+    seconds = np.clip(seconds, 0, 86399).astype(np.int64)
+    order = np.lexsort((seconds, day))
+    offsets = day[order] * 86400 + seconds[order]
+    duplicates = np.flatnonzero(rng.random(rows) < duplicate_rate)
+    duplicates = duplicates[duplicates > 0]
+    offsets[duplicates] = offsets[duplicates - 1]
+    offsets = np.maximum.accumulate(offsets)
+    times = pd.Timestamp(start) + pd.to_timedelta(offsets, unit='s')
+
+    pins = rng.integers(1, users + 1, rows)
+    device = rng.integers(0, devices, rows)
+    door = rng.integers(1, doors + 1, rows)
+    device_names = np.asarray([f"Device {i + 1}" for i in range(devices)], dtype=object)[device]
+    eventlog_df = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'time': times,
+        'pin': (1000 + pins).astype(str),
+        'card_no': (3_000_000 + pins).astype(str),
+        'device_name': device_names,
+        'state': rng.integers(0, 2, rows),
+        'event_type': np.where(rng.random(rows) < 0.95, 0, 27),
+        'event_point_name': device_names + "-" + door.astype(str),
+        'description': None,
+    })
+
+    matched = rng.random(rows) >= unmatched_rate
+    skew = np.where(rng.random(rows) < skew_rate, rng.integers(-max_skew, max_skew + 1, rows), 0)
+    n_checkins = int(matched.sum())
+    checkin_df = pd.DataFrame({
+        'LOGID': np.arange(1, n_checkins + 1),
+        'USERID': pins[matched],
+        'CHECKTIME': (times + pd.to_timedelta(skew, unit='s'))[matched],
+        'CHECKTYPE': 'I',
+        'VERIFYCODE': 1,
+        'SENSORID': (device[matched] + 1).astype(str),
+    })
+
+    return {'USERINFO': user_df, 'CHECKINOUT': checkin_df, 'acc_monitor_log': eventlog_df, 'DEPARTMENTS': department_df}
+
+
+def write_sqlite(tables: Dict[str, pd.DataFrame], path: str, chunksize: int = 500_000) -> None:
+    """Write the tables to a SQLite file standing in for Access.mdb, with the Access primary keys indexed."""
+    with sqlite3.connect(path) as conn:
+        for table, df in tables.items():
+            df.to_sql(table, conn, if_exists='replace', index=False, chunksize=chunksize)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS [CHECKINOUT_LOGID] ON [CHECKINOUT] ([LOGID])")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS [acc_monitor_log_id] ON [acc_monitor_log] ([id])")
+    conn.close()
+
+
+SEATING_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SEATING_PLACEHOLDERS = ["Book before use", "N/A", "Focus room / Meeting room"]
+
+
+def generate_seating(
+    pairs: int,
+    people: int = 5000,
+    floors: int = 8,
+    seats: int = 20,
+    occupancy: float = 0.8,
+    seed: int = 0
+) -> Tuple[Dict[str, List[list]], List[Tuple[str, str]]]:
+    """Sheets of a seating workbook holding about pairs (day, name) entries, and those entries.
+
+        Every floor is a sheet of blocks: a row with "Day" and the seat labels, then one row per
+        weekday with the name at each seat, empty for a free seat. A few seats hold placeholders
+        such as "Book before use", which are not people, and a few notes sit between blocks.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.asarray([f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]} {i}"
+                        for i in range(people)], dtype=object)
+    blocks = max(1, round(pairs / (len(SEATING_DAYS) * seats * occupancy)))
+    sheets: Dict[str, List[list]] = {f"Floor {i + 1}": [] for i in range(floors)}
+    entries: List[Tuple[str, str]] = []
+    for block in range(blocks):
+        rows = sheets[f"Floor {block % floors + 1}"]
+        rows.append([f"Zone {block}"] + [None] * seats)
+        rows.append(["Day"] + [f"Seat {seat + 1}" for seat in range(seats)])
+        occupants = names[rng.integers(0, people, seats)]
+        for day in SEATING_DAYS:
+            row: List[Optional[str]] = [day]
+            for seat in range(seats):
+                draw = rng.random()
+                if draw < 0.02:
+                    row.append(SEATING_PLACEHOLDERS[seat % len(SEATING_PLACEHOLDERS)])
+                elif draw < occupancy:
+                    name = occupants[seat] if rng.random() < 0.9 else names[rng.integers(0, people)]
+                    row.append(name)
+                    entries.append((day, name))
+                else:
+                    row.append(None)
+            rows.append(row)
+        rows.append([None] * (seats + 1))
+    return sheets, entries
+
+
+def write_seating_workbook(sheets: Dict[str, List[list]], path: str) -> None:
+    """Write the sheets of generate_seating to an .xlsx file laid out like Excel's, with shared strings and dimensions."""
+    from openpyxl import Workbook
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sqlite", help="write the tables to this SQLite file")
+    args = parser.parse_args()
+
+    tables = generate_tables(args.rows, users=args.users, seed=args.seed)
+    for table, df in tables.items():
+        print(f"{table}: {len(df)} rows, {list(df.columns)}")
+    if args.sqlite:
+        write_sqlite(tables, args.sqlite)
+        print(f"written to {args.sqlite}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Shared building blocks for the door access site pipelines."""
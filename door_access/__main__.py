@@ -0,0 +1,16 @@
+"""Run the door access pipeline of the given sites, or of every configured site."""
+import argparse
+import sys
+
+from door_access.pipeline import SITE_WORKERS, run_sites, watch_sites
+
+parser = argparse.ArgumentParser(prog="python -m door_access", description=__doc__)
+parser.add_argument("sites", nargs="*", help="sites to run, defaults to DOOR_ACCESS_SITES or every site")
+parser.add_argument("--workers", type=int, help="sites run at once, 0 for one process per site, defaults to SITE_WORKERS")
+parser.add_argument("--watch", action="store_true", help="keep running and export new punches as they come in")
+args = parser.parse_args()
+
+if args.watch:
+    watch_sites(args.sites)
+else:
+    sys.exit(run_sites(args.sites, SITE_WORKERS if args.workers is None else args.workers))
@@ -0,0 +1,78 @@
+"""Append-only delta files of newly extracted rows, compacted into the monthly CSV exports.
+
+An incremental run writes the rows past the watermarks of each month to a delta file,
+then saves the new watermarks together with the list of pending deltas in one atomic
+state save, and only then appends the deltas to the monthly files. Each pending delta
+records the size of its monthly file at commit time, so compacting again after a crash
+first cuts the file back to that size: every row lands in the monthly file exactly once.
+"""
+import logging
+import os
+import shutil
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from door_access.exports import export_csv
+from door_access.state import SiteState, atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def delta_path(monthly_path: str, after_id: int) -> str:
+    """Delta file of a monthly export for the rows past event log id after_id.
+
+        Named after the watermark it starts from, so re-running an uncommitted extraction
+        overwrites its own delta instead of adding a second one.
+    """
+    directory, filename = os.path.split(monthly_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'deltas', f"{stem}.after_{after_id}.csv")
+
+
+def write_deltas(dfs: Dict[str, pd.DataFrame], path_for: Callable[[str], str], after_id: int) -> List[dict]:
+    """Write the new rows of every month to its delta file, returning the pending entries to commit."""
+    pending = []
+    for name, df in dfs.items():
+        if df.empty:
+            continue
+        target = path_for(name)
+        delta = delta_path(target, after_id)
+        atomic_write(delta, lambda tmp_path: export_csv(df, tmp_path))
+        logger.info(f"Wrote {len(df)} new rows of {name} to {delta}")
+        pending.append({
+            'month': name,
+            'delta': delta,
+            'target': target,
+            'offset': os.path.getsize(target) if os.path.exists(target) else 0
+        })
+    return pending
+
+
+def append_delta(delta: str, target: str, offset: int) -> None:
+    """Append the rows of a delta file to its monthly file as it was at offset bytes, header only when it is new."""
+    if os.path.exists(target) and os.path.getsize(target) > offset:
+        os.truncate(target, offset)
+    with open(delta, 'rb') as src, open(target, 'ab') as dst:
+        header = src.readline()
+        if dst.tell() == 0:
+            dst.write(header)
+        shutil.copyfileobj(src, dst)
+
+
+def compact(state: SiteState) -> List[str]:
+    """Append every pending delta of the site to its monthly file, then clear them from the state.
+
+        returns the months that were compacted.
+    """
+    if not state.pending:
+        return []
+    for item in state.pending:
+        logger.info(f"Compacting {item['delta']} into {item['target']}")
+        append_delta(item['delta'], item['target'], item['offset'])
+    compacted = state.pending
+    state.pending = []
+    state.save()
+    for item in compacted:
+        os.remove(item['delta'])
+    return [item['month'] for item in compacted]
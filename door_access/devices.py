@@ -0,0 +1,130 @@
+"""Pulling the transaction logs straight from the ZKTeco access controllers.
+
+A controller keeps its punches in a "transaction" table, read as text with one header line:
+
+    Cardno,Pin,Verified,DoorID,EventType,InOutState,Time_second
+    3591872,1107,1,1,0,0,792846300
+
+Time_second is the controller's packed local time (see decode_c3_time). A DeviceClient
+returns that text, from the controller through ZKTeco's PullSDK, from a file exported by
+the controller or ZKAccess, or from a SimulatedDevice in tests.
+"""
+import ctypes
+import datetime as dt
+import glob
+import logging
+import os
+import random
+from io import StringIO
+from typing import List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_COLUMNS = ['Cardno', 'Pin', 'Verified', 'DoorID', 'EventType', 'InOutState', 'Time_second']
+# bytes reserved for the transaction table returned by the PullSDK
+PULLSDK_BUFFER_SIZE = int(os.getenv("PULLSDK_BUFFER_SIZE", str(64 * 1024 * 1024)))
+
+
+def decode_c3_time(value: int) -> dt.datetime:
+    """Datetime of a controller Time_second, packed as ((((year-2000)*12 + month-1)*31 + day-1)*24 + hour)*60 + minute)*60 + second."""
+    value, second = divmod(int(value), 60)
+    value, minute = divmod(value, 60)
+    value, hour = divmod(value, 24)
+    value, day = divmod(value, 31)
+    year, month = divmod(value, 12)
+    return dt.datetime(2000 + year, month + 1, day + 1, hour, minute, second)
+
+
+def encode_c3_time(when: dt.datetime) -> int:
+    """Controller Time_second of a datetime, the inverse of decode_c3_time."""
+    days = ((when.year - 2000) * 12 + when.month - 1) * 31 + when.day - 1
+    return ((days * 24 + when.hour) * 60 + when.minute) * 60 + when.second
+
+
+def parse_transactions(text: str, device: str) -> pd.DataFrame:
+    """Parse a transaction table into rows with the device name and the decoded time."""
+    df = pd.read_csv(StringIO(text), dtype={'Cardno': str, 'Pin': str}, keep_default_na=False)
+    if df.empty:
+        df = pd.DataFrame(columns=TRANSACTION_COLUMNS)
+    df['device'] = device
+    df['time'] = pd.to_datetime([decode_c3_time(value) for value in df['Time_second']])
+    return df
+
+
+class DeviceClient:
+    """A controller, or anything standing in for one, that returns its transaction table."""
+    name: str
+
+    def get_transactions(self) -> str:
+        raise NotImplementedError
+
+    def pull(self) -> pd.DataFrame:
+        logger.info(f"Pulling transactions from {self.name}")
+        df = parse_transactions(self.get_transactions(), self.name)
+        logger.info(f"Pulled {len(df)} transactions from {self.name}")
+        return df
+
+
+class PullSDKClient(DeviceClient):
+    """A controller on the network, read through ZKTeco's PullSDK (plcommpro.dll, Windows only)."""
+
+    def __init__(self, name: str, ip: str, port: int = 4370, password: str = "", timeout_ms: int = 4000):
+        self.name = name
+        self.params = f"protocol=TCP,ipaddress={ip},port={port},timeout={timeout_ms},passwd={password}".encode()
+
+    def get_transactions(self) -> str:
+        sdk = ctypes.windll.LoadLibrary("plcommpro.dll")
+        sdk.Connect.restype = ctypes.c_void_p
+        handle = sdk.Connect(self.params)
+        if not handle:
+            raise ConnectionError(f"Could not connect to {self.name} (PullSDK error {sdk.PullLastError()})")
+        try:
+            buffer = ctypes.create_string_buffer(PULLSDK_BUFFER_SIZE)
+            count = sdk.GetDeviceData(ctypes.c_void_p(handle), buffer, PULLSDK_BUFFER_SIZE, b"transaction", b"*", b"", b"")
+            if count < 0:
+                raise IOError(f"Reading the transactions of {self.name} failed (PullSDK error {count})")
+            return buffer.value.decode('ascii', errors='replace')
+        finally:
+            sdk.Disconnect(ctypes.c_void_p(handle))
+
+
+class ExportedFileClient(DeviceClient):
+    """The transaction files exported for a controller, <directory>/<name>*.csv, read in name order."""
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = directory
+
+    def get_transactions(self) -> str:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(self.directory, f"{self.name}*.csv"))):
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+            texts.extend(lines if not texts else lines[1:])
+        return "\r\n".join(texts or [",".join(TRANSACTION_COLUMNS)])
+
+
+class SimulatedDevice(DeviceClient):
+    """An in-memory controller for tests: punches go in with punch() and come back in the controller format."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: List[tuple] = []
+
+    def punch(self, pin: str, when: dt.datetime, card: str = "0", door: int = 1, event_type: int = 0, state: int = 0) -> None:
+        self.rows.append((card, pin, 1, door, event_type, state, encode_c3_time(when)))
+
+    def simulate(self, pins: List[str], start: dt.datetime, count: int, seed: Optional[int] = None) -> None:
+        """Add count punches of random pins, a few seconds to an hour apart, some in the same second."""
+        rnd = random.Random(seed)
+        when = start
+        for _ in range(count):
+            when += dt.timedelta(seconds=rnd.choice([0, 1, 5, 30, 600, 3600]))
+            pin = rnd.choice(pins)
+            self.punch(pin, when, card=str(1000 + int(pin)) if pin.isdigit() else "0", door=rnd.randint(1, 4))
+
+    def get_transactions(self) -> str:
+        lines = [",".join(TRANSACTION_COLUMNS)] + [",".join(str(value) for value in row) for row in self.rows]
+        return "\r\n".join(lines)
@@ -0,0 +1,109 @@
+"""Helpers for the monthly attendance exports."""
+import logging
+import os
+from io import BytesIO
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Column layout of the attendance exports
+DATA_COLUMNS = [
+    'date and time',
+    'personnel id',
+    'first name',
+    'last name',
+    'card number',
+    'device name',
+    'event point'
+]
+# Always empty, kept for the layout downstream consumers expect, only materialised when a month is written
+CONSTANT_COLUMNS = {
+    'verify type': '',
+    'in/out status': '',
+    'event description': '',
+    'remarks': ''
+}
+FINAL_COLUMNS = DATA_COLUMNS + list(CONSTANT_COLUMNS)
+
+
+def to_export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a month of attendance rows in the export column order, with the constant columns filled in."""
+    return pd.DataFrame({**{col: df[col] for col in DATA_COLUMNS}, **CONSTANT_COLUMNS}, index=df.index)
+
+
+def export_csv(df: pd.DataFrame, path: Optional[str] = None) -> Optional[str]:
+    """Write a month of attendance rows as CSV to path, or return the CSV text when no path is given."""
+    return to_export_frame(df).to_csv(path, index=False)
+
+
+# Fixed Parquet schema of the attendance exports, same columns as the CSV (Parquet has no second timestamps, so ms)
+PARQUET_SCHEMA = pa.schema([
+    ('date and time', pa.timestamp('ms')),
+    ('personnel id', pa.int32()),
+    ('first name', pa.string()),
+    ('last name', pa.string()),
+    ('card number', pa.string()),
+    ('device name', pa.string()),
+    ('event point', pa.string()),
+    ('verify type', pa.string()),
+    ('in/out status', pa.string()),
+    ('event description', pa.string()),
+    ('remarks', pa.string()),
+])
+PARQUET_ROW_GROUP_SIZE = 128_000
+
+
+def parquet_key(site: str, name: str) -> str:
+    """Hive-style relative path of a year-month group, e.g. site=kumasi/year=2025/month=09/kumasi_attendance_2025_09.parquet."""
+    year, month = name.replace('_', '-').split('-')
+    return f"site={site}/year={year}/month={month}/{site}_attendance_{year}_{month}.parquet"
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a month of attendance rows to an Arrow table with PARQUET_SCHEMA.
+
+        Also accepts months read back from CSV as text, so every column is coerced to its
+        schema type; empty strings in the data columns become nulls.
+    """
+    df = to_export_frame(df)
+    arrays = []
+    for field in PARQUET_SCHEMA:
+        col = df[field.name]
+        if pa.types.is_timestamp(field.type):
+            col = pd.to_datetime(col).astype('datetime64[s]')
+        elif pa.types.is_integer(field.type):
+            col = pd.to_numeric(col).astype('Int32')
+        else:
+            col = col.astype('string')
+            if field.name in DATA_COLUMNS:
+                col = col.replace('', pd.NA)
+        arrays.append(pa.array(col, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=PARQUET_SCHEMA)
+
+
+def export_parquet(df: pd.DataFrame, path: Optional[str] = None, compression: str = 'snappy') -> Optional[bytes]:
+    """Write a month of attendance rows as Parquet with row-group statistics to path, or return the bytes when no path is given."""
+    table = to_arrow_table(df)
+    if path is not None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        pq.write_table(table, path, compression=compression, row_group_size=PARQUET_ROW_GROUP_SIZE, write_statistics=True)
+        return None
+    buffer = BytesIO()
+    pq.write_table(table, buffer, compression=compression, row_group_size=PARQUET_ROW_GROUP_SIZE, write_statistics=True)
+    return buffer.getvalue()
+
+
+def read_local_csv(path: str) -> pd.DataFrame:
+    """Read back an exported month, keeping the exported text as is so ids and card numbers are not re-typed to floats."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df['date and time'] = pd.to_datetime(df['date and time'])
+    return df
+
+
+def read_local_months(names: Iterable[str], path_for: Callable[[str], str]) -> Dict[str, pd.DataFrame]:
+    """Read back the exported CSV of each month, e.g. once new rows were appended to it."""
+    return {name: read_local_csv(path_for(name)) for name in names}
@@ -0,0 +1,135 @@
+"""Extraction helpers for the ZKAccess Access database."""
+import datetime as dt
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Append-only log tables and the (id, time) columns used as their high-watermark.
+# The id is what gets pushed down to the driver: a device that was offline can
+# hand over punches with an old CHECKTIME, but they always get a new LOGID.
+# A watermark may also hold "pending", the ids at or below it still waiting for their
+# partner row in the other log table, and "since", the time of the oldest of them.
+WATERMARK_COLUMNS = {
+    'CHECKINOUT': ('LOGID', 'CHECKTIME'),
+    'acc_monitor_log': ('id', 'time'),
+}
+
+
+def build_query(
+    table: str,
+    columns: Optional[List[str]] = None,
+    watermark: Optional[dict] = None,
+    year_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Tuple[str, list]:
+    """Build the SELECT for a table, pushing the projection and row filters down to the driver.
+
+        columns: only these columns are selected, all of them when None.
+        watermark: only rows with an id past the saved watermark are selected, and the rows
+        from its "since" time on when it has pending ids, see drop_settled.
+        year_range: (first, last) years of the time column, last may be None for no upper bound.
+        The two filters only apply to the log tables in WATERMARK_COLUMNS.
+    """
+    projection = ", ".join(f"[{col}]" for col in columns) if columns else "*"
+    sql = f"SELECT {projection} FROM [{table}]"
+    predicates = []
+    params = []
+    if table in WATERMARK_COLUMNS:
+        id_col, time_col = WATERMARK_COLUMNS[table]
+        if watermark and watermark.get('pending'):
+            predicates.append(f"([{id_col}] > ? OR [{time_col}] >= ?)")
+            params += [int(watermark[id_col]), pd.Timestamp(watermark['since']).to_pydatetime()]
+        elif watermark:
+            predicates.append(f"[{id_col}] > ?")
+            params.append(int(watermark[id_col]))
+        if year_range:
+            first_year, last_year = year_range
+            predicates.append(f"[{time_col}] >= ?")
+            params.append(dt.datetime(first_year, 1, 1))
+            if last_year is not None:
+                predicates.append(f"[{time_col}] < ?")
+                params.append(dt.datetime(last_year + 1, 1, 1))
+    if predicates:
+        sql += " WHERE " + " AND ".join(predicates)
+    return sql, params
+
+
+def drop_settled(table: str, df: pd.DataFrame, watermark: Optional[dict] = None) -> pd.DataFrame:
+    """Drop the rows re-read from the time lookback of a watermark that are not pending."""
+    if table not in WATERMARK_COLUMNS or not watermark or not watermark.get('pending'):
+        return df
+    id_col = WATERMARK_COLUMNS[table][0]
+    ids = df[id_col]
+    keep = (ids > int(watermark[id_col])) | ids.isin(watermark['pending'])
+    return df if keep.all() else df[keep.to_numpy()].reset_index(drop=True)
+
+
+def with_pending(table: str, watermark: dict, df: pd.DataFrame) -> dict:
+    """Return the watermark holding back the rows of df, the ones still waiting for a partner row."""
+    watermark = {key: value for key, value in watermark.items() if key not in ('pending', 'since')}
+    if not df.empty:
+        id_col, time_col = WATERMARK_COLUMNS[table]
+        watermark['pending'] = sorted(int(i) for i in df[id_col])
+        watermark['since'] = pd.to_datetime(df[time_col]).min().isoformat()
+    return watermark
+
+
+def next_watermark(table: str, df: pd.DataFrame, watermark: Optional[dict] = None) -> Optional[dict]:
+    """Return the watermark of a table after loading df, never moving back from the previous one."""
+    if table not in WATERMARK_COLUMNS:
+        return None
+    if df.empty:
+        return watermark
+    id_col, time_col = WATERMARK_COLUMNS[table]
+    max_id = int(df[id_col].max())
+    max_time = pd.to_datetime(df[time_col]).max()
+    if watermark:
+        max_id = max(max_id, int(watermark[id_col]))
+        max_time = max(max_time, pd.Timestamp(watermark[time_col]))
+    return {id_col: max_id, time_col: max_time.isoformat()}
+
+
+def load_tables(
+    conn,
+    tables_to_load: Dict[str, str],
+    watermarks: Optional[Dict[str, dict]] = None,
+    table_columns: Optional[Dict[str, List[str]]] = None,
+    year_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, dict]]:
+    """Load tables through an open DB-API connection, only reading the needed columns and rows.
+
+        returns the loaded dataframes and the new watermarks keyed by table name.
+        Tables without a watermark (or watermarks=None) are read in full, tables missing
+        from table_columns are read with every column.
+    """
+    watermarks = watermarks or {}
+    table_columns = table_columns or {}
+    dfs = {}
+    new_watermarks = {}
+    for name, table in tables_to_load.items():
+        watermark = watermarks.get(table)
+        sql, params = build_query(table, table_columns.get(table), watermark, year_range)
+        logger.info(f"Loading table: {table} ({sql})")
+        dfs[name] = drop_settled(table, pd.read_sql(sql, conn, params=params or None), watermark)
+        table_watermark = next_watermark(table, dfs[name], watermark)
+        if table_watermark:
+            new_watermarks[table] = table_watermark
+    return dfs, new_watermarks
+
+
+def iter_table_chunks(
+    conn,
+    table: str,
+    chunksize: int,
+    columns: Optional[List[str]] = None,
+    watermark: Optional[dict] = None,
+    year_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Iterator[pd.DataFrame]:
+    """Stream a table in batches of chunksize rows, fetched from the cursor with fetchmany."""
+    sql, params = build_query(table, columns, watermark, year_range)
+    logger.info(f"Streaming table: {table} in chunks of {chunksize} rows ({sql})")
+    for chunk in pd.read_sql(sql, conn, params=params or None, chunksize=chunksize):
+        yield drop_settled(table, chunk, watermark)
+
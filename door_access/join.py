@@ -0,0 +1,120 @@
+"""Tolerance-bounded as-of join between the event log and the check-in records."""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _prepare(df: pd.DataFrame, on: str, by: List[str], skip: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Number the rows and the repeats of each timestamp, then sort by time once."""
+    keys = pd.DataFrame({on: df[on].to_numpy(), '_pos': np.arange(len(df))})
+    for col in by:
+        keys[col] = df[col].to_numpy()
+    keep = keys[on].notna().to_numpy()
+    if skip is not None:
+        keep &= ~skip
+    keys = keys[keep].copy()
+    keys['_occ'] = keys.groupby([on] + by, sort=False).cumcount()
+    if not keys[on].is_monotonic_increasing:
+        keys = keys.sort_values(on, kind='stable')
+    return keys
+
+
+def _closest_pairs(left_keys: pd.DataFrame, right_keys: pd.DataFrame, on: str, by: List[str], tolerance: pd.Timedelta) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair time-sorted left and right rows within tolerance, closest first, each row used at most once.
+
+        returns the _pos of the paired left rows and of their right rows. Ties in distance go to
+        the earlier left row, then to the earlier right row.
+    """
+    left_times = left_keys[on].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    right_times = right_keys[on].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    lo = np.searchsorted(right_times, left_times - tolerance.value, side='left')
+    hi = np.searchsorted(right_times, left_times + tolerance.value, side='right')
+    counts = hi - lo
+    li = np.repeat(np.arange(len(left_times)), counts)
+    ri = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+    for col in by:
+        agree = left_keys[col].to_numpy()[li] == right_keys[col].to_numpy()[ri]
+        li, ri = li[agree], ri[agree]
+    order = np.lexsort((ri, li, np.abs(left_times[li] - right_times[ri])))
+    li, ri = li[order], ri[order]
+
+    # a pair whose rows have no other candidate needs no arbitration, the rest go closest first
+    take = (np.bincount(li, minlength=len(left_times))[li] == 1) & (np.bincount(ri, minlength=len(right_times))[ri] == 1)
+    left_used, right_used = set(), set()
+    for k, l, r in zip(np.flatnonzero(~take).tolist(), li[~take].tolist(), ri[~take].tolist()):
+        if l not in left_used and r not in right_used:
+            left_used.add(l)
+            right_used.add(r)
+            take[k] = True
+    return left_keys['_pos'].to_numpy()[li[take]], right_keys['_pos'].to_numpy()[ri[take]]
+
+
+def asof_join(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    on: str = 'logtime',
+    by: Optional[List[str]] = None,
+    tolerance: pd.Timedelta = pd.Timedelta(seconds=1),
+    suffixes: Tuple[str, str] = ('_x', '_y'),
+    consumed: Optional[np.ndarray] = None
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Left join right onto left on the nearest timestamp within tolerance, one right row per left row.
+
+        returns the joined frame, in the row order of left, and match counts:
+        exact: the n-th left row of a timestamp paired with the n-th right row of that same timestamp,
+        so two punches in the same second no longer fan out into every combination.
+        fuzzy: left rows without an exact partner matched to an unused right row within tolerance,
+        closest pairs first, so every right row is used at most once.
+        unmatched: left rows with nothing in range, their right columns are left empty.
+        by: optional columns both sides share (device, user) that a match must agree on.
+        consumed: optional boolean mask over the rows of right, for joining left in batches
+        against the same right. Rows matched by earlier batches are skipped and the mask is
+        updated in place, so repeats of a timestamp keep pairing up across batches.
+    """
+    by = by or []
+    left_keys = _prepare(left, on, by)
+    right_keys = _prepare(right, on, by, consumed)
+
+    match = np.full(len(left), -1, dtype=np.int64)
+
+    # Exact pass: same timestamp and same repeat number
+    exact = pd.merge_asof(
+        left_keys, right_keys[[on, '_occ', '_pos'] + by].rename(columns={'_pos': '_rpos'}),
+        on=on, by=['_occ'] + by, tolerance=pd.Timedelta(0), direction='backward'
+    )
+    found = exact['_rpos'].notna().to_numpy()
+    match[exact['_pos'].to_numpy()[found]] = exact['_rpos'].to_numpy()[found].astype(np.int64)
+    n_exact = int(found.sum())
+
+    # Fuzzy pass: what is left on both sides, nearest within tolerance
+    n_fuzzy = 0
+    if tolerance > pd.Timedelta(0):
+        used = np.zeros(len(right), dtype=bool) if consumed is None else consumed.copy()
+        used[match[match >= 0]] = True
+        left_rest = left_keys[match[left_keys['_pos'].to_numpy()] < 0]
+        right_rest = right_keys[~used[right_keys['_pos'].to_numpy()]]
+        if len(left_rest) and len(right_rest):
+            left_pos, right_pos = _closest_pairs(left_rest, right_rest, on, by, tolerance)
+            match[left_pos] = right_pos
+            n_fuzzy = len(left_pos)
+
+    if consumed is not None:
+        consumed[match[match >= 0]] = True
+
+    # Assemble in the original left order, renaming overlapping columns like DataFrame.merge
+    overlap = (set(left.columns) & set(right.columns)) - {on} - set(by)
+    result = left.reset_index(drop=True).rename(columns={col: col + suffixes[0] for col in overlap})
+    right_part = (
+        right.drop(columns=[on] + by).reset_index(drop=True)
+        .reindex(match)
+        .rename(columns={col: col + suffixes[1] for col in overlap})
+    )
+    right_part.index = result.index
+    result = pd.concat([result, right_part], axis=1)
+
+    stats = {'exact': n_exact, 'fuzzy': n_fuzzy, 'unmatched': len(left) - n_exact - n_fuzzy}
+    return result, stats
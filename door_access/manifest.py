@@ -0,0 +1,62 @@
+"""Manifest of the content written to each export destination, to skip months that did not change."""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict
+
+import pandas as pd
+
+from door_access.exports import to_export_frame
+
+logger = logging.getLogger(__name__)
+
+
+def partition_fingerprint(df: pd.DataFrame) -> Dict[str, object]:
+    """Content hash and row count of a month in the export layout.
+
+        Hashes the vectorised per-row hashes of the export columns, so it is much cheaper
+        than rendering the month, and changes whenever a row is added, removed, edited or moved.
+    """
+    frame = to_export_frame(df)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return {'hash': digest.hexdigest(), 'rows': len(frame)}
+
+
+class PartitionManifest:
+    """Fingerprints of the months last written to each destination (local path or s3://bucket/key).
+
+        A destination is current when the month about to be written has the same fingerprint
+        as the one recorded for it (and, for local paths, the file is still there).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._fingerprints: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def fingerprint(self, name: str, df: pd.DataFrame) -> dict:
+        """Fingerprint of the year-month group name, computed once per run."""
+        if name not in self._fingerprints:
+            self._fingerprints[name] = partition_fingerprint(df)
+        return self._fingerprints[name]
+
+    def is_current(self, destination: str, name: str, df: pd.DataFrame) -> bool:
+        """True when destination already holds exactly this month."""
+        entry = self.entries.get(destination)
+        if entry is None or entry != self.fingerprint(name, df):
+            return False
+        return destination.startswith("s3://") or os.path.exists(destination)
+
+    def record(self, destination: str, name: str, df: pd.DataFrame) -> None:
+        """Remember that destination now holds this month."""
+        self.entries[destination] = self.fingerprint(name, df)
+
+    def save(self) -> None:
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
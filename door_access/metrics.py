@@ -0,0 +1,179 @@
+"""Per-run metrics of a site: stage timings, rows in and out, bytes written, memory and S3 latency.
+
+Every closed stage and every upload is one JSON line, logged (so it lands in the site log
+and door_access_pipeline.log) and appended to a JSON lines file. The run ends with a
+summary line and, when a directory is given, a Prometheus textfile for node_exporter's
+textfile collector.
+
+    {"event": "stage", "site": "kumasi", "stage": "merge", "seconds": 41.2, "rows_in": 5120334, "rows_out": 4987001, ...}
+"""
+import ctypes
+import datetime as dt
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from door_access.state import atomic_write
+
+logger = logging.getLogger(__name__)
+
+STAGE_FIELDS = ['seconds', 'rows_in', 'rows_out', 'bytes_written']
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water mark of the resident memory of this process, None when it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_working_set()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _windows_peak_working_set() -> Optional[int]:
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong)] + [
+            (name, ctypes.c_size_t) for name in [
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage']
+        ]
+
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class Stage:
+    """Counters of a running stage, filled in by the code it times."""
+
+    def __init__(self, rows_in: Optional[int] = None):
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self.bytes_written: Optional[int] = None
+
+
+class RunMetrics:
+    """Metrics of one pipeline run of a site, used as a context manager around the run.
+
+        jsonl_path: file the JSON lines are appended to, none when empty.
+        textfile_dir: directory of the Prometheus textfile, door_access_<site>.prom, none when empty.
+        The peak memory is the process high-water mark, so it covers the whole run when the
+        site has its own worker process, and every site run before it otherwise.
+    """
+
+    def __init__(self, site: str, jsonl_path: Optional[str] = None, textfile_dir: Optional[str] = None):
+        self.site = site
+        self.jsonl_path = jsonl_path
+        self.textfile_dir = textfile_dir
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.uploads: List[dict] = []
+        self.started = time.time()
+        self._start = time.perf_counter()
+
+    def __enter__(self) -> "RunMetrics":
+        self.emit({'event': 'run_start'})
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish(success=exc_type is None)
+
+    def emit(self, record: dict) -> None:
+        """Log a JSON line and append it to the JSON lines file."""
+        record = {'ts': dt.datetime.now().isoformat(timespec='milliseconds'), 'site': self.site, 'run_id': self.run_id, **record}
+        line = json.dumps(record)
+        logger.info(f"metrics {line}")
+        if self.jsonl_path:
+            os.makedirs(os.path.dirname(self.jsonl_path) or '.', exist_ok=True)
+            with open(self.jsonl_path, 'a') as f:
+                f.write(line + "\n")
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """Time a stage, the block sets rows_out and bytes_written on the Stage it gets.
+
+            A stage run several times (e.g. once per streamed batch) adds up in the totals.
+        """
+        stage = Stage(rows_in)
+        start = time.perf_counter()
+        yield stage
+        seconds = time.perf_counter() - start
+        record = {'event': 'stage', 'stage': name, 'seconds': round(seconds, 3), 'rows_in': stage.rows_in,
+                  'rows_out': stage.rows_out, 'bytes_written': stage.bytes_written, 'peak_rss_bytes': peak_rss_bytes()}
+        self.emit(record)
+        totals = self.stages.setdefault(name, {field: 0 for field in STAGE_FIELDS})
+        for field in STAGE_FIELDS:
+            totals[field] += record[field] or 0
+
+    def upload(self, bucket: str, key: str, size: int, seconds: float) -> None:
+        """Record one object uploaded to S3."""
+        self.uploads.append({'bucket': bucket, 'seconds': seconds, 'bytes': size})
+        self.emit({'event': 's3_upload', 'bucket': bucket, 'key': key, 'bytes': size, 'seconds': round(seconds, 3)})
+
+    def finish(self, success: bool = True) -> None:
+        """Emit the summary line of the run and write the Prometheus textfile."""
+        seconds = time.perf_counter() - self._start
+        self.emit({
+            'event': 'run',
+            'success': success,
+            'seconds': round(seconds, 3),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': {name: {field: round(value, 3) for field, value in totals.items()} for name, totals in self.stages.items()},
+            'uploads': len(self.uploads),
+            'upload_seconds': round(sum(u['seconds'] for u in self.uploads), 3),
+            'upload_bytes': sum(u['bytes'] for u in self.uploads),
+        })
+        if self.textfile_dir:
+            path = os.path.join(self.textfile_dir, f"door_access_{self.site}.prom")
+            text = self.prometheus_text(success, seconds)
+
+            def write(tmp_path: str) -> None:
+                with open(tmp_path, 'w') as f:
+                    f.write(text)
+
+            atomic_write(path, write)
+
+    def prometheus_text(self, success: bool, seconds: float) -> str:
+        """The run's metrics in the Prometheus text exposition format, as gauges of the last run."""
+        site = f'site="{self.site}"'
+        metrics = [
+            ('door_access_last_run_timestamp_seconds', 'Unix time the last run started.', [(site, self.started)]),
+            ('door_access_last_run_success', '1 when the last run succeeded, 0 when it failed.', [(site, int(success))]),
+            ('door_access_last_run_seconds', 'Duration of the last run.', [(site, seconds)]),
+            ('door_access_peak_rss_bytes', 'Memory high-water mark of the process running the site.', [(site, peak_rss_bytes() or 0)]),
+        ]
+        for field, help_text in [('seconds', 'Seconds spent in each stage of the last run.'),
+                                 ('rows_in', 'Rows going into each stage of the last run.'),
+                                 ('rows_out', 'Rows coming out of each stage of the last run.'),
+                                 ('bytes_written', 'Bytes written by each stage of the last run.')]:
+            samples = [(f'{site},stage="{name}"', totals[field]) for name, totals in self.stages.items()]
+            metrics.append((f'door_access_stage_{field}', help_text, samples))
+        buckets = sorted({u['bucket'] for u in self.uploads})
+        for suffix, help_text, value in [
+            ('count', 'S3 uploads of the last run.', lambda us: len(us)),
+            ('seconds_sum', 'Total seconds spent uploading to S3 in the last run.', lambda us: sum(u['seconds'] for u in us)),
+            ('seconds_max', 'Slowest S3 upload of the last run.', lambda us: max(u['seconds'] for u in us)),
+            ('bytes_sum', 'Bytes uploaded to S3 in the last run.', lambda us: sum(u['bytes'] for u in us)),
+        ]:
+            samples = [(f'{site},bucket="{bucket}"', value([u for u in self.uploads if u['bucket'] == bucket])) for bucket in buckets]
+            metrics.append((f'door_access_s3_upload_{suffix}', help_text, samples))
+
+        lines = []
+        for name, help_text, samples in metrics:
+            if not samples:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{{{labels}}} {round(value, 3)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
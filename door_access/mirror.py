@@ -0,0 +1,113 @@
+"""Local SQLite mirror of the Access tables, kept in sync incrementally.
+
+The log tables are append-only, so a sync only copies the rows past the largest id
+already in the mirror, each table in one transaction. The small user and department
+tables are replaced whole. Reading the mirror needs no Access driver, so re-exports,
+backfills and ad-hoc queries run anywhere, Linux CI included.
+"""
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from door_access.extract import WATERMARK_COLUMNS
+from door_access.sources import AccessSource, Source
+
+logger = logging.getLogger(__name__)
+
+# rows copied from the upstream source per batch
+MIRROR_CHUNK_SIZE = int(os.getenv("MIRROR_CHUNK_SIZE", "200000"))
+
+
+def _sql_rows(df: pd.DataFrame) -> List[tuple]:
+    """Rows of df as SQLite values: times as text in the layout pandas writes, missing values as NULL."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+class MirrorSource(AccessSource):
+    """Reads the tables from a SQLite mirror at path, synced from upstream before the first read.
+
+        Without upstream the mirror is read as it is, e.g. a copy taken on CI.
+    """
+
+    def __init__(self, path: str, upstream: Optional[Source] = None, tables: Optional[List[str]] = None):
+        super().__init__(lambda: closing(sqlite3.connect(path)))
+        self.path = path
+        self.upstream = upstream
+        self.tables = tables or ['USERINFO', 'DEPARTMENTS', 'CHECKINOUT', 'acc_monitor_log']
+        self.synced = upstream is None
+
+    def list_tables(self) -> List[str]:
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def query(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        """Run an ad-hoc query on the mirror."""
+        self.sync_once()
+        with self.connect() as conn:
+            return pd.read_sql(sql, conn, params=params)
+
+    def _append(self, conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> None:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if not exists:
+            conn.execute(pd.io.sql.get_schema(df, table))
+        if df.empty:
+            return
+        placeholders = ", ".join("?" for _ in df.columns)
+        columns = ", ".join(f"[{col}]" for col in df.columns)
+        conn.executemany(f"INSERT INTO [{table}] ({columns}) VALUES ({placeholders})", _sql_rows(df))
+
+    def sync(self) -> Dict[str, int]:
+        """Copy the new log rows and the current user and department tables from upstream.
+
+            returns the number of rows copied per table.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        copied = {}
+        with closing(sqlite3.connect(self.path, isolation_level=None)) as conn:
+            existing = set(self.list_tables())
+            for table in self.tables:
+                conn.execute("BEGIN")
+                try:
+                    if table in WATERMARK_COLUMNS:
+                        id_col, time_col = WATERMARK_COLUMNS[table]
+                        max_id = conn.execute(f"SELECT MAX([{id_col}]) FROM [{table}]").fetchone()[0] if table in existing else None
+                        watermark = {id_col: max_id, time_col: None} if max_id is not None else None
+                        copied[table] = 0
+                        for chunk in self.upstream.iter_chunks(table, MIRROR_CHUNK_SIZE, watermark=watermark):
+                            self._append(conn, table, chunk)
+                            copied[table] += len(chunk)
+                        if copied[table]:
+                            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS [{table}_{id_col}] ON [{table}] ([{id_col}])")
+                            conn.execute(f"CREATE INDEX IF NOT EXISTS [{table}_{time_col}] ON [{table}] ([{time_col}])")
+                    else:
+                        dfs, _ = self.upstream.load({table: table})
+                        conn.execute(f"DROP TABLE IF EXISTS [{table}]")
+                        self._append(conn, table, dfs[table])
+                        copied[table] = len(dfs[table])
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        logger.info(f"Synced the mirror {self.path}: {copied}")
+        return copied
+
+    def sync_once(self) -> None:
+        if not self.synced:
+            self.sync()
+            self.synced = True
+
+    def load(self, tables_to_load, watermarks=None, table_columns=None, year_range=None):
+        self.sync_once()
+        return super().load(tables_to_load, watermarks, table_columns, year_range)
+
+    def iter_chunks(self, table, chunksize, columns=None, watermark=None, year_range=None):
+        self.sync_once()
+        yield from super().iter_chunks(table, chunksize, columns, watermark, year_range)
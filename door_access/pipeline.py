@@ -0,0 +1,534 @@
+"""Door access pipeline: extract, clean, merge and export the attendance of every configured site.
+
+Each site (see door_access.sites) is run in its own worker process, so the sites are
+extracted, cleaned and written at the same time. Every site logs to its own file and
+keeps its own state file.
+
+    python -m door_access                 # every site in DOOR_ACCESS_SITES
+    python -m door_access kumasi accra    # just these
+    python -m door_access --watch         # keep running, export new punches as they come in
+"""
+# ========== IMPORTS ==========
+import datetime as dt
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from door_access.deltas import compact, write_deltas
+from door_access.devices import DeviceClient, ExportedFileClient, PullSDKClient
+from door_access.exports import export_csv, export_parquet, parquet_key, read_local_months
+from door_access.extract import WATERMARK_COLUMNS, next_watermark, with_pending
+from door_access.manifest import PartitionManifest
+from door_access.metrics import RunMetrics
+from door_access.mirror import MirrorSource
+from door_access.sites import SiteConfig, select_sites
+from door_access.sources import AccessSource, DeviceSource, Source
+from door_access.spool import PartitionSpool
+from door_access.state import DEFAULT_MONTH, SiteState
+from door_access.transform import (
+    CHECKIN_COLUMNS, DEPARTMENT_COLUMNS, EVENTLOG_COLUMNS, FIRST_YEAR, USER_COLUMNS,
+    clean_checkin_data, clean_department_data, clean_eventlog_data, clean_user_data,
+    group_by_year_month_1, merge_data
+)
+from door_access.upload import load_s3_targets, upload_partitions
+from door_access.watch import SiteWatcher, file_signature, max_log_ids, watch, watermark_ids
+
+load_dotenv()
+
+# ========== CONFIGURATION ==========
+s3_parquet_prefix = "raw/door-access-data/parquet"
+# one versioned state file per site, <site>.json, and the shared state file of earlier versions they start from
+STATE_DIR = os.getenv("STATE_DIR", "state")
+json_state_file = "state_file.json"
+# one log file per site, door_access_<site>.log
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+# node_exporter textfile collector directory the run metrics are written to, door_access_<site>.prom, off when empty
+METRICS_TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR", "")
+# sites run at once, defaults to one process per site
+SITE_WORKERS = int(os.getenv("SITE_WORKERS", "0"))
+
+# "full" reloads every table on each run, "incremental" only reads log rows past the saved watermarks
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "full")
+# rows per event log batch in streaming mode, 0 loads the whole event log at once
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "0"))
+# comma separated export formats, "csv" (default), "parquet" or "csv,parquet"
+OUTPUT_FORMATS = [fmt.strip() for fmt in os.getenv("OUTPUT_FORMATS", "csv").split(",")]
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "snappy")
+# gzip the uploaded CSVs (stored as .csv.gz), and how many uploads run at once
+S3_GZIP = os.getenv("S3_GZIP", "false").lower() == "true"
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", "4"))
+# local SQLite mirrors of the sites using the "mirror" source, <site>.sqlite, synced from Access before each run
+MIRROR_DIR = os.getenv("MIRROR_DIR", "mirror")
+MIRROR_SYNC = os.getenv("MIRROR_SYNC", "true").lower() == "true"
+# how far apart an event log entry and a check-in record may be and still be matched
+MATCH_TOLERANCE = pd.Timedelta(seconds=int(os.getenv("MATCH_TOLERANCE_SECONDS", "1")))
+# how far back from a watermark the controllers' transactions are re-read, for punches in the same second
+# or from a controller whose clock lags the others, "devices" and "files" sources only
+DEVICE_LOOKBACK = pd.Timedelta(seconds=int(os.getenv("DEVICE_LOOKBACK_SECONDS", "3600")))
+# how far back from a watermark the unmatched log rows are re-read, for a partner row written after the run
+MATCH_LOOKBACK = pd.Timedelta(seconds=int(os.getenv("MATCH_LOOKBACK_SECONDS", "3600")))
+
+TABLE_MAPPING = {
+    'checkin': 'CHECKINOUT',
+    'user': 'USERINFO',
+    'eventlog': 'acc_monitor_log',
+    'departments': 'DEPARTMENTS'
+}
+
+# Columns and years selected in the SQL sent to the driver, the cleaning functions only keep these anyway
+TABLE_COLUMNS = {
+    'CHECKINOUT': CHECKIN_COLUMNS,
+    'USERINFO': USER_COLUMNS,
+    'acc_monitor_log': EVENTLOG_COLUMNS,
+    'DEPARTMENTS': DEPARTMENT_COLUMNS
+}
+
+
+# ========== SETUP LOGGING ==========
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(site)s] %(message)s"
+
+
+class SiteFilter(logging.Filter):
+    """Tag every record with the site being processed, for LOG_FORMAT."""
+
+    def __init__(self, site: str):
+        super().__init__()
+        self.site = site
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.site = self.site
+        return True
+
+
+def configure_logging() -> None:
+    """Log to stderr, also called in every worker process."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(SiteFilter("main"))
+    logging.basicConfig(level=logging.INFO, handlers=[handler], force=True)
+
+
+@contextmanager
+def site_logging(site: str):
+    """Tag the records with the site and copy them, and the error the site fails with, to the site's own log file."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    root = logging.getLogger()
+    file_handler = logging.FileHandler(os.path.join(LOG_DIR, f"door_access_{site}.log"))
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(file_handler)
+    site_filter = SiteFilter(site)
+    for handler in root.handlers:
+        handler.addFilter(site_filter)
+    try:
+        yield
+    except Exception:
+        logger.exception(f"Pipeline failed for {site}")
+        raise
+    finally:
+        for handler in root.handlers:
+            handler.removeFilter(site_filter)
+        root.removeHandler(file_handler)
+        file_handler.close()
+
+
+logger = logging.getLogger(__name__)
+
+
+# ========== DATABASE CONNECTIONS ==========
+def get_connection(site: SiteConfig):
+    """Create a connection to the site's database.
+
+        pyodbc is imported here, only the sites read through the Access ODBC driver need it.
+    """
+    import pyodbc
+    return pyodbc.connect(site.connection_string)
+
+def list_tables(source: Source) -> List[str]:
+    """List all table names from the site's source."""
+    tables = source.list_tables()
+    logger.info(f"Tables in the database: {tables}")
+    return tables
+
+def device_clients(site: SiteConfig) -> List[DeviceClient]:
+    """Clients of the site's controllers, "name@ip[:port]" each, read from the network or from exported files."""
+    clients = []
+    for spec in site.device_specs:
+        name, _, address = spec.rpartition('@') if '@' in spec else (spec, '', spec)
+        if site.source_kind == "files":
+            clients.append(ExportedFileClient(name, site.device_log_path))
+        else:
+            ip, _, port = address.partition(':')
+            clients.append(PullSDKClient(name, ip, int(port or 4370), os.getenv(f"{site.name.upper()}_DEVICE_PASSWORD", "")))
+    return clients
+
+def get_source(site: SiteConfig) -> Source:
+    """Source of the site's tables: the Access database, its local mirror, or the controllers with the Access database for the users."""
+    access = AccessSource(lambda: get_connection(site))
+    if site.source_kind == "access":
+        return access
+    if site.source_kind == "mirror":
+        return MirrorSource(os.path.join(MIRROR_DIR, f"{site.name}.sqlite"), access if MIRROR_SYNC else None)
+    if site.source_kind in ("devices", "files"):
+        # the seen keys also cover the rows hold_back keeps pending for MATCH_LOOKBACK
+        return DeviceSource(device_clients(site), reference=access, lookback=max(DEVICE_LOOKBACK, MATCH_LOOKBACK))
+    raise ValueError(f"Unknown source for {site.name}: {site.source_kind}")
+
+def year_range() -> Tuple[int, int]:
+    """Years of punches kept, up to the current one: punches stamped in a future year by a device with a wrong clock are dropped.
+
+        Read on every run rather than at import, so a long-running watcher keeps exporting past New Year.
+    """
+    return (FIRST_YEAR, dt.datetime.now().year)
+
+def load_data(site: SiteConfig, tables_to_load: Dict[str, str], watermarks: Dict[str, dict] = None, source: Source = None, years: Tuple[int, int] = None) -> Tuple[Dict[str, pd.DataFrame], Dict[str, dict]]:
+    """Load specified tables into pandas DataFrames.
+
+        returns the dataframes and the new per-table watermarks.
+        only the columns in TABLE_COLUMNS are selected, and log rows outside the kept years
+        or before the watermarks are filtered out by the source. years defaults to year_range().
+    """
+    source = source or get_source(site)
+    return source.load(tables_to_load, watermarks, TABLE_COLUMNS, years or year_range())
+
+def hold_back(watermarks: Dict[str, dict], waiting: Dict[str, pd.DataFrame]) -> Dict[str, dict]:
+    """Return the watermarks with the waiting rows of the cleaned log tables, keyed by table, pending.
+
+        A row is held while it is within MATCH_LOOKBACK of the older of the two watermark times,
+        so an event log entry and its check-in still meet when one of them is written after a
+        run, even when one table is behind the other. The next incremental run re-reads the
+        pending rows (see door_access.extract.drop_settled).
+    """
+    times = [pd.Timestamp(watermarks[table][WATERMARK_COLUMNS[table][1]]) for table in waiting if table in watermarks]
+    if not times:
+        return watermarks
+    cutoff = min(times) - MATCH_LOOKBACK
+    watermarks = dict(watermarks)
+    for table, rows in waiting.items():
+        if table in watermarks:
+            id_col, time_col = WATERMARK_COLUMNS[table]
+            rows = rows[(rows['logtime'] >= cutoff).to_numpy()]
+            watermarks[table] = with_pending(table, watermarks[table], pd.DataFrame({id_col: rows['logid'].to_numpy(), time_col: rows['logtime'].to_numpy()}))
+    return watermarks
+
+def stream_data(site: SiteConfig, year_month: str, watermarks: Dict[str, dict] = None, source: Source = None, metrics: RunMetrics = None) -> Tuple[PartitionSpool, Dict[str, dict]]:
+    """Stream the event log in CHUNK_SIZE batches, cleaning, merging and grouping each batch on the fly.
+
+        returns the year-month groups spilled to disk and the new per-table watermarks.
+        Only the event log is streamed, the narrow user, department and check-in tables are
+        loaded once, so peak memory follows the chunk size instead of the event log size.
+        Months are stably re-sorted by user, which gives the same row order as merge_data
+        on the whole event log, and check-ins already matched are carried from batch to
+        batch, so the exported files are identical to the non-streaming run. The one exception is
+        a fuzzy match near a batch boundary whose check-in is exactly matched by a later batch.
+        The caller removes the spool with cleanup() once the months are written.
+    """
+    source = source or get_source(site)
+    metrics = metrics or RunMetrics(site.name)
+    watermarks = watermarks or {}
+    other_tables = {name: table for name, table in TABLE_MAPPING.items() if name != 'eventlog'}
+    eventlog_table = TABLE_MAPPING['eventlog']
+    years = year_range()
+    with metrics.stage('load') as stage:
+        dfs, new_watermarks = source.load(other_tables, watermarks, TABLE_COLUMNS, years)
+        stage.rows_out = sum(len(df) for df in dfs.values())
+    with metrics.stage('clean', stage.rows_out) as stage:
+        clean_checkin_df = clean_checkin_data(dfs['checkin'], years)
+        clean_user_df = clean_user_data(dfs['user'])
+        clean_department_df = clean_department_data(dfs['departments'])
+        stage.rows_out = len(clean_checkin_df) + len(clean_user_df) + len(clean_department_df)
+
+    user_order = pd.Index(clean_user_df['userid']).drop_duplicates()
+    df_groups = PartitionSpool(order=lambda df: user_order.get_indexer(df['personnel id']))
+    consumed_checkins = np.zeros(len(clean_checkin_df), dtype=bool)
+    unmatched_events = []
+    eventlog_watermark = watermarks.get(eventlog_table)
+    chunks = source.iter_chunks(eventlog_table, CHUNK_SIZE, TABLE_COLUMNS[eventlog_table], eventlog_watermark, years)
+    try:
+        while True:
+            with metrics.stage('load') as stage:
+                chunk = next(chunks, None)
+                stage.rows_out = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                break
+            eventlog_watermark = next_watermark(eventlog_table, chunk, eventlog_watermark)
+            with metrics.stage('clean', len(chunk)) as stage:
+                clean_eventlog_df = clean_eventlog_data(chunk, years)
+                stage.rows_out = len(clean_eventlog_df)
+            with metrics.stage('merge', len(clean_eventlog_df)) as stage:
+                matched_events = np.zeros(len(clean_eventlog_df), dtype=bool)
+                df = merge_data(clean_user_df, clean_checkin_df, clean_eventlog_df, clean_department_df, MATCH_TOLERANCE, consumed_checkins, matched_events)
+                unmatched_events.append(clean_eventlog_df.loc[~matched_events, ['logid', 'logtime']])
+                stage.rows_out = len(df)
+            with metrics.stage('group', len(df)) as stage:
+                groups = group_by_year_month_1(df, year_month)
+                df_groups.extend(groups)
+                stage.rows_out = sum(len(group) for group in groups.values())
+    except BaseException:
+        df_groups.cleanup()
+        raise
+    if eventlog_watermark:
+        new_watermarks[eventlog_table] = eventlog_watermark
+    unmatched_events = pd.concat(unmatched_events, ignore_index=True) if unmatched_events else pd.DataFrame(columns=['logid', 'logtime'])
+    new_watermarks = hold_back(new_watermarks, {TABLE_MAPPING['checkin']: clean_checkin_df[~consumed_checkins], eventlog_table: unmatched_events})
+    return df_groups, new_watermarks
+
+
+# ========== EXPORTS ==========
+def s3_key(site: SiteConfig, name: str, fmt: str) -> str:
+    """S3 object key of a year-month group of the site in the given output format."""
+    name = name.replace("-", "_")
+    if fmt == "parquet":
+        return f"{s3_parquet_prefix}/{parquet_key(site.name, name)}"
+    year = name[:4]
+    return f"{site.s3_prefix}/year={year}/{site.file_prefix}_{name}.csv"
+
+def upload_to_s3(site: SiteConfig, dfs: Dict[str, pd.DataFrame], manifest: PartitionManifest = None, metrics: RunMetrics = None) -> None:
+    """Upload the DataFrame to every S3 bucket configured for the site as CSV and/or Parquet files, depending on OUTPUT_FORMATS."""
+    targets = load_s3_targets(prefix=site.env_prefix)
+    upload_partitions(dfs, targets, lambda name, fmt: s3_key(site, name, fmt), OUTPUT_FORMATS, S3_GZIP, PARQUET_COMPRESSION, S3_UPLOAD_WORKERS, manifest, metrics)
+
+def local_csv_path(site: SiteConfig, name: str) -> str:
+    """Local export path of a year-month group of the site."""
+    return f"./data_exports/{site.file_prefix}_{name.replace('-', '_')}.csv"
+
+def local_parquet_path(site: SiteConfig, name: str) -> str:
+    """Local Hive-style Parquet path of a year-month group of the site."""
+    return f"./data_exports/parquet/{parquet_key(site.name, name)}"
+
+def manifest_path(site: SiteConfig) -> str:
+    """Manifest of the content hashes of the months already written for the site."""
+    return f"export_manifest_{site.name}.json"
+
+def metrics_path(site: SiteConfig) -> str:
+    """JSON lines file of the run metrics of the site (see door_access.metrics)."""
+    return os.path.join(LOG_DIR, f"metrics_{site.name}.jsonl")
+
+def save_locally(dfs: Dict[str, pd.DataFrame], path_for, write, manifest: PartitionManifest = None) -> int:
+    """Write every year-month group with write(df, path), skipping the months the manifest shows as unchanged.
+
+        returns the number of bytes written.
+    """
+    written = 0
+    for name, df in dfs.items():
+        if not df.empty:
+            path = path_for(name)
+            if manifest is not None and manifest.is_current(path, name, df):
+                logger.info(f"{name} is unchanged in {path}. Skipping save.")
+                continue
+            logger.info(f"Saving {name} to local path {path}")
+            write(df, path)
+            written += os.path.getsize(path)
+            if manifest is not None:
+                manifest.record(path, name, df)
+        else:
+            logger.warning(f"DataFrame for {name} is empty. Skipping save.")
+    return written
+
+
+# ========== SITE PIPELINE ==========
+def group_rows(df_groups: Dict[str, pd.DataFrame]) -> int:
+    """Rows in the year-month groups, counted by the spool when they are spilled to disk."""
+    if isinstance(df_groups, PartitionSpool):
+        return df_groups.rows()
+    return sum(len(df) for df in df_groups.values())
+
+def state_path(site: SiteConfig) -> str:
+    """Versioned state file of the site (see door_access.state)."""
+    return os.path.join(STATE_DIR, f"{site.name}.json")
+
+def extract_groups(site: SiteConfig, source: Source, year_month: str, watermarks: Dict[str, dict] = None, metrics: RunMetrics = None) -> Tuple[Dict[str, pd.DataFrame], Dict[str, dict]]:
+    """Extract, clean and merge the site's tables, grouped into the months at or after year_month.
+
+        returns the year-month groups and the new per-table watermarks.
+    """
+    metrics = metrics or RunMetrics(site.name)
+    mode = "incremental" if watermarks else "full"
+    if CHUNK_SIZE:
+        logger.info(f"Streaming required tables ({mode} mode, {CHUNK_SIZE} rows per chunk)...")
+        return stream_data(site, year_month, watermarks, source, metrics)
+
+    logger.info(f"Loading required tables ({mode} mode)...")
+    years = year_range()
+    with metrics.stage('load') as stage:
+        dfs, new_watermarks = load_data(site, TABLE_MAPPING, watermarks, source, years)
+        stage.rows_out = sum(len(df) for df in dfs.values())
+
+    logger.info("Cleaning datasets...")
+    with metrics.stage('clean', stage.rows_out) as stage:
+        clean_checkin_df = clean_checkin_data(dfs['checkin'], years)
+        clean_user_df = clean_user_data(dfs['user'])
+        clean_eventlog_df = clean_eventlog_data(dfs['eventlog'], years)
+        clean_department_df = clean_department_data(dfs['departments'])
+        stage.rows_out = len(clean_checkin_df) + len(clean_user_df) + len(clean_eventlog_df) + len(clean_department_df)
+    del dfs
+
+    logger.info("Merging datasets...")
+    with metrics.stage('merge', len(clean_eventlog_df)) as stage:
+        consumed_checkins = np.zeros(len(clean_checkin_df), dtype=bool)
+        matched_events = np.zeros(len(clean_eventlog_df), dtype=bool)
+        df = merge_data(clean_user_df, clean_checkin_df, clean_eventlog_df, clean_department_df, MATCH_TOLERANCE, consumed_checkins, matched_events)
+        stage.rows_out = len(df)
+    new_watermarks = hold_back(new_watermarks, {TABLE_MAPPING['checkin']: clean_checkin_df[~consumed_checkins],
+                                                TABLE_MAPPING['eventlog']: clean_eventlog_df[~matched_events]})
+
+    with metrics.stage('group', len(df)) as stage:
+        df_groups = group_by_year_month_1(df, year_month)
+        stage.rows_out = sum(len(group) for group in df_groups.values())
+    return df_groups, new_watermarks
+
+def append_new_rows(site: SiteConfig, state: SiteState, df_groups: Dict[str, pd.DataFrame], new_watermarks: Dict[str, dict], recovered: List[str] = (), metrics: RunMetrics = None) -> Dict[str, pd.DataFrame]:
+    """Append the newly extracted rows to the monthly CSV files through delta files, exactly once.
+
+        returns the updated months, and the recovered months of an interrupted run, read back
+        from disk when Parquet files or S3 uploads need them whole. The monthly CSVs are
+        otherwise never read or rewritten.
+    """
+    metrics = metrics or RunMetrics(site.name)
+    eventlog_table = TABLE_MAPPING['eventlog']
+    id_col = WATERMARK_COLUMNS[eventlog_table][0]
+    after_id = state.watermarks.get(eventlog_table, {}).get(id_col, 0)
+    with metrics.stage('append_csv', group_rows(df_groups)) as stage:
+        state.pending = write_deltas(df_groups, lambda name: local_csv_path(site, name), after_id)
+        stage.rows_out = stage.rows_in
+        stage.bytes_written = sum(os.path.getsize(entry['delta']) for entry in state.pending)
+        state.watermarks = {**state.watermarks, **new_watermarks}
+        logger.info("committing the new watermarks and deltas to the state file...")
+        state.save()
+        months = sorted(set(recovered) | set(compact(state)))
+
+    if "parquet" in OUTPUT_FORMATS or load_s3_targets(prefix=site.env_prefix):
+        return read_local_months(months, lambda name: local_csv_path(site, name))
+    return {}
+
+def run_site(site: SiteConfig, mode: str = EXTRACT_MODE) -> dict:
+    """Orchestrate the data extraction, cleaning, merging and export of one site.
+
+        mode: "full" re-exports the months from the last processed one on, "incremental" only
+        reads the rows past the saved watermarks and appends them to the monthly files.
+        returns the site's new state entry.
+    """
+    with site_logging(site.name), RunMetrics(site.name, metrics_path(site), METRICS_TEXTFILE_DIR) as metrics, ExitStack() as cleanup:
+        current_time = dt.datetime.now().strftime("%Y_%m_%d_%H_%S")
+        logger.info(f"Starting data ingestion pipeline for {site.name}...")
+        logger.info(f"Current timestamp: {current_time}")
+
+        source = get_source(site)
+        logger.info("Listing tables in the database...")
+        list_tables(source)
+
+        state = SiteState(state_path(site), site.name, json_state_file)
+        recovered = []
+        if state.pending:
+            logger.info("compacting the deltas of an interrupted run...")
+            recovered = compact(state)
+
+        manifest = PartitionManifest(manifest_path(site))
+        # the first incremental run of a site has nothing to append to yet, it exports like a full run
+        if mode == "incremental" and state.watermarks:
+            # new rows go to their own month, however old, so only the year range applies
+            df_groups, new_watermarks = extract_groups(site, source, DEFAULT_MONTH, state.watermarks, metrics)
+            if isinstance(df_groups, PartitionSpool):
+                cleanup.callback(df_groups.cleanup)
+            logger.info(f"Grouped data has {len(df_groups)} groups")
+            new_months = recovered + list(df_groups)
+            df_groups = append_new_rows(site, state, df_groups, new_watermarks, recovered, metrics)
+            for name, df in df_groups.items():
+                manifest.record(local_csv_path(site, name), name, df)
+        else:
+            df_groups, new_watermarks = extract_groups(site, source, state.df_current_month, metrics=metrics)
+            if isinstance(df_groups, PartitionSpool):
+                cleanup.callback(df_groups.cleanup)
+            logger.info(f"Grouped data has {len(df_groups)} groups")
+            new_months = list(df_groups)
+            state.watermarks = new_watermarks
+            if "csv" in OUTPUT_FORMATS:
+                logger.info("saving the grouped data as CSV files...")
+                with metrics.stage('write_csv', group_rows(df_groups)) as stage:
+                    stage.bytes_written = save_locally(df_groups, lambda name: local_csv_path(site, name), export_csv, manifest)
+
+        if "parquet" in OUTPUT_FORMATS:
+            logger.info("saving the grouped data as Parquet files...")
+            with metrics.stage('write_parquet', group_rows(df_groups)) as stage:
+                stage.bytes_written = save_locally(df_groups, lambda name: local_parquet_path(site, name),
+                                                   lambda df, path: export_parquet(df, path, PARQUET_COMPRESSION), manifest)
+
+        logger.info("uploading grouped data to S3...")
+        with metrics.stage('upload', group_rows(df_groups)) as stage:
+            uploaded = len(metrics.uploads)
+            upload_to_s3(site, df_groups, manifest, metrics)
+            stage.bytes_written = sum(upload['bytes'] for upload in metrics.uploads[uploaded:])
+
+        logger.info("saving metadata to state and manifest files...")
+        manifest.save()
+        # keep the previous month when nothing was processed
+        if new_months:
+            state.df_current_month = max(state.df_current_month, max(new_months))
+        state.df_process_timestamp = current_time
+        state.save()
+        logger.info(f"last processed year month is {state.df_current_month}")
+
+        if new_months:
+            logger.info("Data ingestion pipeline completed successfully.")
+        else:
+            logger.warning("Data ingestion pipeline completed with no data.")
+
+        return state.to_dict()
+
+
+# ========== MAIN PIPELINE ==========
+def run_sites(names: Optional[List[str]] = None, max_workers: int = SITE_WORKERS) -> int:
+    """Run the pipeline of every selected site in parallel, one process per site.
+
+        A failing site is logged and does not stop the others.
+        returns 1 when any site failed, 0 otherwise.
+    """
+    configure_logging()
+    sites = select_sites(names)
+    max_workers = max_workers or len(sites)
+    failed: List[str] = []
+
+    if max_workers == 1:
+        for site in sites:
+            try:
+                run_site(site)
+            except Exception:
+                failed.append(site.name)
+    else:
+        logger.info(f"Running {', '.join(site.name for site in sites)} in {max_workers} processes...")
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=configure_logging) as executor:
+            futures = {executor.submit(run_site, site): site.name for site in sites}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    logger.info(f"Pipeline finished for {name}")
+                except Exception as e:
+                    logger.error(f"Pipeline failed for {name}: {e}")
+                    failed.append(name)
+
+    return 1 if failed else 0
+
+
+# ========== DAEMON MODE ==========
+def site_watcher(site: SiteConfig) -> SiteWatcher:
+    """Watcher of the site's Access database that runs the site's incremental pipeline."""
+    def max_ids() -> Dict[str, int]:
+        with get_connection(site) as conn:
+            return max_log_ids(conn)
+
+    def saved_ids() -> Dict[str, int]:
+        return watermark_ids(SiteState(state_path(site), site.name, json_state_file).watermarks)
+
+    return SiteWatcher(site.name, lambda: file_signature(site.mdb_path), max_ids, saved_ids,
+                       lambda: run_site(site, "incremental"))
+
+def watch_sites(names: Optional[List[str]] = None, polls: Optional[int] = None) -> None:
+    """Watch every selected site and run its incremental pipeline whenever new punches appear (see door_access.watch)."""
+    configure_logging()
+    watch([site_watcher(site) for site in select_sites(names)], polls=polls)
@@ -0,0 +1,84 @@
+"""Per-site configuration of the door access pipeline."""
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class SiteConfig(NamedTuple):
+    """Where a site's ZKAccess database lives and where its exports go.
+
+        name: site name, used as the file prefix, the Parquet site= partition and the state entry.
+        mdb_file: path of the site's Access.mdb, <NAME>_MDB_FILE in the environment overrides it.
+        Empty when the path differs from machine to machine, <NAME>_MDB_FILE is then required.
+        s3_prefix: prefix of the site's monthly CSV objects.
+        env_prefix: prefix of the site's bucket variables, e.g. ACCRA_ reads ACCRA_BUCKET_NAME_1.
+        source: where the punches are read from, "access" (the Access database), "mirror" (a local
+        SQLite copy of it, see door_access.mirror), "devices" (pulled from the controllers) or "files"
+        (transaction files exported by the controllers), <NAME>_SOURCE overrides it.
+        Users and departments come from the Access database, or its mirror.
+        devices: the controllers, "name@ip[:port]" (only the name for files), <NAME>_DEVICES overrides it
+        as a comma separated list.
+        device_log_dir: where the exported transaction files are, <NAME>_DEVICE_LOG_DIR overrides it.
+    """
+    name: str
+    mdb_file: str
+    s3_prefix: str
+    env_prefix: str = ""
+    source: str = "access"
+    devices: Tuple[str, ...] = ()
+    device_log_dir: str = "device_logs"
+
+    @property
+    def file_prefix(self) -> str:
+        return f"{self.name}_attendance"
+
+    @property
+    def mdb_path(self) -> str:
+        path = os.getenv(f"{self.name.upper()}_MDB_FILE", self.mdb_file)
+        if not path:
+            raise ValueError(f"No Access database configured for {self.name}, set {self.name.upper()}_MDB_FILE")
+        return path
+
+    @property
+    def source_kind(self) -> str:
+        return os.getenv(f"{self.name.upper()}_SOURCE", self.source)
+
+    @property
+    def device_specs(self) -> List[str]:
+        devices = os.getenv(f"{self.name.upper()}_DEVICES")
+        return [spec.strip() for spec in devices.split(",") if spec.strip()] if devices else list(self.devices)
+
+    @property
+    def device_log_path(self) -> str:
+        return os.getenv(f"{self.name.upper()}_DEVICE_LOG_DIR", self.device_log_dir)
+
+    @property
+    def connection_string(self) -> str:
+        return (
+            r'Driver={Microsoft Access Driver (*.mdb, *.accdb)};'
+            rf'DBQ={self.mdb_path};'
+        )
+
+
+SITES: Dict[str, SiteConfig] = {
+    'kumasi': SiteConfig(
+        name='kumasi',
+        mdb_file=r'C:\ZKTeco\ZKAccess3.5\Access.mdb',
+        s3_prefix="raw/door-access-data/Kumasi"
+    ),
+    'accra': SiteConfig(
+        name='accra',
+        mdb_file='',
+        s3_prefix="raw/door-access-data",
+        env_prefix="ACCRA_"
+    ),
+}
+
+
+def select_sites(names: Optional[List[str]] = None) -> List[SiteConfig]:
+    """The configs of the named sites, or of the sites in DOOR_ACCESS_SITES (all sites by default)."""
+    if not names:
+        names = [name.strip() for name in os.getenv("DOOR_ACCESS_SITES", ",".join(SITES)).split(",") if name.strip()]
+    unknown = [name for name in names if name not in SITES]
+    if unknown:
+        raise ValueError(f"Unknown site(s): {', '.join(unknown)}. Configured sites: {', '.join(SITES)}")
+    return [SITES[name] for name in names]
@@ -0,0 +1,207 @@
+"""Sources the pipeline reads the ZKAccess tables from.
+
+A source returns the raw tables in the ZKAccess layout (USERINFO, CHECKINOUT,
+acc_monitor_log, DEPARTMENTS), so whichever one is used feeds the same cleaning stage.
+"""
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from door_access.devices import DeviceClient
+from door_access.extract import WATERMARK_COLUMNS, iter_table_chunks, load_tables, next_watermark
+
+logger = logging.getLogger(__name__)
+
+
+class Source:
+    """Loads ZKAccess tables, only the given columns, the log rows in the years and past the watermarks."""
+
+    def list_tables(self) -> List[str]:
+        """Names of the tables the source holds."""
+        return []
+
+    def load(
+        self,
+        tables_to_load: Dict[str, str],
+        watermarks: Optional[Dict[str, dict]] = None,
+        table_columns: Optional[Dict[str, List[str]]] = None,
+        year_range: Optional[Tuple[int, Optional[int]]] = None
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, dict]]:
+        """returns the loaded dataframes and the new watermarks keyed by table name, like load_tables."""
+        raise NotImplementedError
+
+    def iter_chunks(
+        self,
+        table: str,
+        chunksize: int,
+        columns: Optional[List[str]] = None,
+        watermark: Optional[dict] = None,
+        year_range: Optional[Tuple[int, Optional[int]]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream a table in batches of chunksize rows, in one batch unless the source can do better."""
+        dfs, _ = self.load({table: table}, {table: watermark} if watermark else None, {table: columns} if columns else None, year_range)
+        yield dfs[table]
+
+
+class AccessSource(Source):
+    """The Access database, or any DB-API stand-in for it (e.g. SQLite), through connect()."""
+
+    def __init__(self, connect: Callable[[], object]):
+        self.connect = connect
+
+    def list_tables(self) -> List[str]:
+        with self.connect() as conn:
+            return [table.table_name for table in conn.cursor().tables(tableType='TABLE')]
+
+    def load(self, tables_to_load, watermarks=None, table_columns=None, year_range=None):
+        with self.connect() as conn:
+            return load_tables(conn, tables_to_load, watermarks, table_columns, year_range)
+
+    def iter_chunks(self, table, chunksize, columns=None, watermark=None, year_range=None):
+        with self.connect() as conn:
+            yield from iter_table_chunks(conn, table, chunksize, columns, watermark, year_range)
+
+
+class DeviceSource(Source):
+    """Log tables built from the transactions pulled from the controllers, the other tables from reference.
+
+        Every transaction becomes an acc_monitor_log row, and a CHECKINOUT row when its pin is
+        the Badgenumber of a user in the reference USERINFO. Controllers have no log ids, so ids
+        continue from the saved watermark ids. The rows past a watermark are the transactions
+        from lookback before its time on that are not in its "seen" keys, (device, pin,
+        Time_second, repeat), so a punch in the same second as the watermark, or from a
+        controller whose clock lags the others, is still read, and only once. The seen keys map
+        to the ids their rows were given, so the rows a watermark holds "pending" are read again
+        under the same ids (see door_access.extract.drop_settled). Transactions are pulled once
+        per source, so every table sees the same pull.
+    """
+
+    def __init__(self, devices: List[DeviceClient], reference: Source, lookback: pd.Timedelta = pd.Timedelta(hours=1)):
+        self.devices = devices
+        self.reference = reference
+        self.lookback = lookback
+        self._transactions: Optional[pd.DataFrame] = None
+        self._keys: Optional[pd.Series] = None
+        self._user_ids: Optional[pd.Series] = None
+        self._watermark_times: Dict[str, pd.Timestamp] = {}
+
+    def list_tables(self) -> List[str]:
+        return self.reference.list_tables()
+
+    def transactions(self) -> pd.DataFrame:
+        if self._transactions is None:
+            pulled = [device.pull() for device in self.devices]
+            df = pd.concat(pulled, ignore_index=True) if pulled else pd.DataFrame(columns=['device', 'time'])
+            self._transactions = df.sort_values('time', kind='stable', ignore_index=True)
+        return self._transactions
+
+    def transaction_keys(self) -> pd.Series:
+        """Key of every transaction, "device|pin|Time_second|n" for the n-th repeat of a punch in a pull."""
+        if self._keys is None:
+            tx = self.transactions()
+            repeat = tx.groupby(['device', 'Pin', 'Time_second'], sort=False).cumcount()
+            self._keys = tx['device'].astype(str) + '|' + tx['Pin'].astype(str) + '|' + tx['Time_second'].astype(str) + '|' + repeat.astype(str)
+        return self._keys
+
+    def seen_keys(self, watermark: Optional[dict], df: pd.DataFrame, keys: pd.Series, id_col: str, time_col: str) -> Dict[str, Optional[int]]:
+        """Id by key of the pulled transactions the next pull re-reads, None for the ones without a row in the table.
+
+            These are the transactions within lookback of the oldest log watermark time of the pull,
+            the one the pending rows are held back from, and the pending rows read again.
+        """
+        start = min(self._watermark_times.values()) - self.lookback
+        previous = seen_ids(watermark)
+        recent = (self.transactions()['time'] >= start).to_numpy()
+        seen = {key: previous.get(key) for key in self.transaction_keys()[recent]}
+        held = (df[time_col] >= start) | df[id_col].isin(watermark.get('pending', []) if watermark else [])
+        seen.update(zip(keys[held.to_numpy()], (int(i) for i in df.loc[held, id_col])))
+        return dict(sorted(seen.items()))
+
+    def user_ids(self) -> pd.Series:
+        """USERID of every pin, from the Badgenumber of the reference USERINFO."""
+        if self._user_ids is None:
+            dfs, _ = self.reference.load({'user': 'USERINFO'}, table_columns={'USERINFO': ['USERID', 'Badgenumber']})
+            users = dfs['user'].dropna(subset=['Badgenumber'])
+            self._user_ids = pd.Series(users['USERID'].to_numpy(), index=users['Badgenumber'].astype(str).str.strip()).groupby(level=0).first()
+        return self._user_ids
+
+    def log_table(self, table: str, watermark: Optional[dict], year_range) -> Tuple[pd.DataFrame, pd.Series]:
+        """Rows of a log table past the watermark, and the transaction key of every row."""
+        id_col, time_col = WATERMARK_COLUMNS[table]
+        tx = self.transactions()
+        keys = self.transaction_keys()
+        # the ids of the pending rows read again, NaN for the rows read for the first time
+        ids = pd.Series(np.nan, index=tx.index)
+        keep = np.ones(len(tx), dtype=bool)
+        if watermark and 'seen' in watermark:
+            seen = seen_ids(watermark)
+            keep &= (tx['time'] >= pd.Timestamp(watermark[time_col]) - self.lookback).to_numpy()
+            keep &= ~keys.isin(list(seen)).to_numpy()
+            if watermark.get('pending'):
+                ids = keys.map(seen).astype('float64')
+                keep |= ids.isin(watermark['pending']).to_numpy()
+        elif watermark:
+            # saved before the seen keys were kept
+            keep &= (tx['time'] > pd.Timestamp(watermark[time_col])).to_numpy()
+        if year_range:
+            first_year, last_year = year_range
+            keep &= (tx['time'].dt.year >= first_year).to_numpy()
+            if last_year is not None:
+                keep &= (tx['time'].dt.year <= last_year).to_numpy()
+        tx, keys, ids = tx[keep], keys[keep], ids[keep]
+
+        if table == 'CHECKINOUT':
+            user_ids = tx['Pin'].astype(str).str.strip().map(self.user_ids())
+            known = user_ids.notna().to_numpy()
+            tx, keys, ids, user_ids = tx[known], keys[known], ids[known], user_ids[known]
+            df = pd.DataFrame({'USERID': user_ids.astype('int64').to_numpy(), 'CHECKTIME': tx['time'].to_numpy()})
+        else:
+            df = pd.DataFrame({
+                'time': tx['time'].to_numpy(),
+                'pin': tx['Pin'].to_numpy(),
+                'card_no': tx['Cardno'].to_numpy(),
+                'device_name': tx['device'].to_numpy(),
+                'state': tx['InOutState'].to_numpy(),
+                'event_type': tx['EventType'].to_numpy(),
+                'event_point_name': (tx['device'] + '-' + tx['DoorID'].astype(str)).to_numpy()
+            })
+        first_id = int(watermark[id_col]) + 1 if watermark else 1
+        ids = ids.to_numpy(copy=True)
+        new = np.isnan(ids)
+        ids[new] = np.arange(first_id, first_id + new.sum())
+        df.insert(0, id_col, ids.astype('int64'))
+        return df, keys.reset_index(drop=True)
+
+    def load(self, tables_to_load, watermarks=None, table_columns=None, year_range=None):
+        watermarks = watermarks or {}
+        table_columns = table_columns or {}
+        reference_tables = {name: table for name, table in tables_to_load.items() if table not in WATERMARK_COLUMNS}
+        dfs, new_watermarks = {}, {}
+        if reference_tables:
+            dfs, _ = self.reference.load(reference_tables, None, table_columns, year_range)
+        built = {}
+        for name, table in tables_to_load.items():
+            if table not in WATERMARK_COLUMNS:
+                continue
+            watermark = watermarks.get(table)
+            df, keys = self.log_table(table, watermark, year_range)
+            table_watermark = next_watermark(table, df, watermark)
+            if table_watermark:
+                self._watermark_times[table] = pd.Timestamp(table_watermark[WATERMARK_COLUMNS[table][1]])
+            built[name] = (table, watermark, df, keys, table_watermark)
+        for name, (table, watermark, df, keys, table_watermark) in built.items():
+            if table_watermark:
+                new_watermarks[table] = {**table_watermark, 'seen': self.seen_keys(watermark, df, keys, *WATERMARK_COLUMNS[table])}
+            if table_columns.get(table):
+                df = df[table_columns[table]]
+            logger.info(f"Built {len(df)} {table} rows from the device transactions")
+            dfs[name] = df
+        return dfs, new_watermarks
+
+
+def seen_ids(watermark: Optional[dict]) -> Dict[str, Optional[int]]:
+    """The seen keys of a device watermark and their ids, None for keys saved as a list without ids."""
+    seen = watermark.get('seen', {}) if watermark else {}
+    return dict.fromkeys(seen) if isinstance(seen, list) else seen
@@ -0,0 +1,63 @@
+"""Disk-backed year-month partitions for the streaming extraction mode."""
+import logging
+import os
+import tempfile
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionSpool(Mapping):
+    """Collect year-month groups batch by batch on disk and hand them back one month at a time.
+
+        Behaves like the dict returned by group_by_year_month_1, so the writers can iterate
+        it unchanged, but only the month being read is ever held in memory.
+        order: optional function returning sort keys for a month frame. The parts of a month
+        are concatenated in the order they were appended, then stably sorted by these keys,
+        so a streamed month comes back in the same row order as a month built in one go.
+    """
+
+    def __init__(self, order: Optional[Callable[[pd.DataFrame], np.ndarray]] = None):
+        self._dir = tempfile.TemporaryDirectory(prefix="door_access_spool_")
+        self._parts: Dict[str, List[str]] = {}
+        self._rows: Dict[str, int] = {}
+        self._order = order
+
+    def append(self, name: str, df: pd.DataFrame) -> None:
+        """Spill a batch of rows belonging to the year-month group name."""
+        if df.empty:
+            return
+        parts = self._parts.setdefault(name, [])
+        path = os.path.join(self._dir.name, f"{name}_{len(parts)}.pkl")
+        df.to_pickle(path)
+        parts.append(path)
+        self._rows[name] = self._rows.get(name, 0) + len(df)
+
+    def extend(self, dfs: Dict[str, pd.DataFrame]) -> None:
+        """Spill every group of a batch."""
+        for name, df in dfs.items():
+            self.append(name, df)
+
+    def rows(self, name: Optional[str] = None) -> int:
+        """Rows spilled for the group name, or for every group, counted without reading them back."""
+        return self._rows.get(name, 0) if name is not None else sum(self._rows.values())
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        df = pd.concat([pd.read_pickle(path) for path in self._parts[name]], ignore_index=True)
+        if self._order is not None:
+            df = df.iloc[np.argsort(self._order(df), kind='stable')].reset_index(drop=True)
+        return df
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._parts))
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def cleanup(self) -> None:
+        """Remove the spilled files."""
+        self._dir.cleanup()
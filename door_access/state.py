@@ -0,0 +1,104 @@
+"""Per-site state of the pipeline: last processed month, per-table watermarks and pending deltas.
+
+Every site has its own versioned JSON file, replaced atomically (written to a temporary
+file next to it, then renamed over it) so a crash mid-save never leaves it half written,
+and the site workers never write the same file.
+"""
+import json
+import logging
+import os
+import tempfile
+from typing import Callable, List, Optional
+
+from door_access.transform import FIRST_YEAR
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 2
+# Month processed from when a site has no state yet
+DEFAULT_MONTH = f"{FIRST_YEAR}-01"
+
+
+def atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """Call write(tmp_path) on a temporary file in the directory of path, then rename it over path."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_json(data: dict) -> Callable[[str], None]:
+    def write(tmp_path: str) -> None:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+    return write
+
+
+def _legacy_entry(path: Optional[str], site: str) -> dict:
+    """The state of a site in the shared state_file.json of earlier versions.
+
+        Either a "sites" entry per site, or the single-site entry of the old site
+        scripts: a dict (Kumasi) or a list of dicts (Accra) next to the watermarks.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if site in data.get('sites', {}):
+        return data['sites'][site]
+    pipeline = data.get('door_access_pipeline')
+    if isinstance(pipeline, list):
+        pipeline = {key: value for item in pipeline for key, value in item.items()}
+    if not pipeline:
+        return {}
+    return {**pipeline, 'watermarks': data.get('watermarks', {})}
+
+
+class SiteState:
+    """State of one site, read from its state file (or migrated from the legacy one) and saved atomically.
+
+        df_current_month: last month processed, full runs re-export the months from there on.
+        watermarks: per log table, the largest id and time already read, and the rows still waiting
+        for their partner row in the other table (see door_access.extract).
+        pending: delta files committed with the watermarks but not yet compacted (see door_access.deltas).
+    """
+
+    def __init__(self, path: str, site: str, legacy_path: Optional[str] = None):
+        self.path = path
+        self.site = site
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            if entry.get('version', 1) > STATE_VERSION:
+                raise ValueError(f"{path} was written by a newer version of the pipeline (version {entry['version']})")
+        else:
+            entry = _legacy_entry(legacy_path, site)
+            if entry:
+                logger.info(f"Starting {site} from the state in {legacy_path}")
+        self.df_current_month: str = entry.get('df_current_month') or DEFAULT_MONTH
+        self.df_process_timestamp: Optional[str] = entry.get('df_process_timestamp')
+        self.watermarks: dict = entry.get('watermarks', {})
+        self.pending: List[dict] = entry.get('pending', [])
+
+    def to_dict(self) -> dict:
+        return {
+            'version': STATE_VERSION,
+            'site': self.site,
+            'df_current_month': self.df_current_month,
+            'df_process_timestamp': self.df_process_timestamp,
+            'watermarks': self.watermarks,
+            'pending': self.pending
+        }
+
+    def save(self) -> None:
+        atomic_write(self.path, _write_json(self.to_dict()))
+        logger.info(f"Saved state of {self.site} to {self.path}")
@@ -0,0 +1,91 @@
+"""Waiting for the ZKAccess GUI and its log download, instead of sleeping for a fixed time.
+
+The clock, the sleep and what is polled are all passed in, so the waits can be run
+against a fake clock and a fake database.
+"""
+import logging
+import time
+from typing import Callable, Dict, NamedTuple, Tuple
+
+from door_access.extract import WATERMARK_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class WaitResult(NamedTuple):
+    """How a wait ended: completed is False on timeout, value is the last probed value."""
+    completed: bool
+    reason: str
+    elapsed: float
+    value: object
+
+
+def wait_for(
+    predicate: Callable[[], object],
+    timeout: float,
+    poll_interval: float = 0.5,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep
+) -> bool:
+    """Poll predicate until it returns something truthy, returns False when timeout seconds pass first."""
+    start = clock()
+    while True:
+        if predicate():
+            return True
+        if clock() - start >= timeout:
+            return False
+        sleep(poll_interval)
+
+
+def wait_until_stable(
+    probe: Callable[[], object],
+    settle: float,
+    timeout: float,
+    poll_interval: float = 10,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep
+) -> WaitResult:
+    """Poll probe until its value has changed and then stopped changing.
+
+        Completes once the value changed and then stayed the same for settle seconds. A value
+        that never changes is no sign the work is done, the download may not have started
+        writing yet, so the wait then only ends after timeout seconds, as not completed.
+        A probe that raises (e.g. the database is briefly locked) counts as no change.
+    """
+    start = clock()
+    try:
+        last = probe()
+    except Exception as e:
+        logger.warning(f"Probe failed, retrying: {e}")
+        last = None
+    last_change = None
+    while True:
+        sleep(poll_interval)
+        now = clock()
+        try:
+            value = probe()
+        except Exception as e:
+            logger.warning(f"Probe failed, retrying: {e}")
+            value = last
+        if last is None:
+            # the first probes failed, this is the value the changes are measured from
+            last = value
+        elif value != last:
+            logger.info(f"Still changing after {now - start:.0f}s: {value}")
+            last, last_change = value, now
+        elif last_change is not None and now - last_change >= settle:
+            return WaitResult(True, f"unchanged for {settle:g}s", now - start, last)
+        if now - start >= timeout:
+            reason = f"timed out after {timeout:g}s" if last_change is not None else f"no change in {timeout:g}s"
+            return WaitResult(False, reason, now - start, last)
+
+
+def log_table_stats(conn) -> Dict[str, Tuple[int, int]]:
+    """Row count and largest id of every log table, through an open DB-API connection."""
+    stats = {}
+    cursor = conn.cursor()
+    for table, (id_col, _) in WATERMARK_COLUMNS.items():
+        cursor.execute(f"SELECT COUNT(*), MAX([{id_col}]) FROM [{table}]")
+        count, max_id = cursor.fetchone()
+        stats[table] = (int(count), int(max_id or 0))
+    return stats
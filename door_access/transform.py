@@ -0,0 +1,206 @@
+"""Cleaning, merging and grouping of the ZKAccess tables into the attendance layout.
+
+Every table is projected, renamed and typed once. Selecting and renaming columns
+reuses the loaded arrays instead of copying them, repeated strings become categories
+that the merge carries through, and the constant export columns are only added when
+a month is written (see door_access.exports).
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from door_access.join import asof_join
+
+logger = logging.getLogger(__name__)
+
+FIRST_YEAR = 2024
+
+# Source column -> cleaned column, per table
+CHECKIN_RENAMES = {'USERID': 'userid', 'CHECKTIME': 'logtime', 'LOGID': 'logid'}
+USER_RENAMES = {
+    'USERID': 'userid',
+    'name': 'firstname',
+    'lastname': 'lastname',
+    'email': 'Email',
+    'DEFAULTDEPTID': 'deptid',
+    'CardNo': 'card number'
+}
+EVENTLOG_RENAMES = {
+    'id': 'logid',
+    'time': 'logtime',
+    'device_name': 'device name',
+    'state': 'state',
+    'event_type': 'event_type',
+    'event_point_name': 'event_point_name'
+}
+DEPARTMENT_RENAMES = {'DEPTID': 'deptid', 'DEPTNAME': 'deptname', 'SUPDEPTID': 'supdeptid'}
+
+CHECKIN_COLUMNS = list(CHECKIN_RENAMES)
+USER_COLUMNS = list(USER_RENAMES)
+EVENTLOG_COLUMNS = list(EVENTLOG_RENAMES)
+DEPARTMENT_COLUMNS = list(DEPARTMENT_RENAMES)
+
+# Compact dtypes of the cleaned tables: low-cardinality strings as categories,
+# ids as nullable Int32 (Access Long Integer) and times at second resolution
+CHECKIN_DTYPES = {'userid': 'Int32', 'logtime': 'datetime64[s]', 'logid': 'Int32'}
+USER_DTYPES = {'userid': 'Int32', 'firstname': 'category', 'lastname': 'category', 'deptid': 'Int32'}
+EVENTLOG_DTYPES = {
+    'logid': 'Int32',
+    'logtime': 'datetime64[s]',
+    'device name': 'category',
+    'state': 'category',
+    'event_type': 'category',
+    'event_point_name': 'category'
+}
+DEPARTMENT_DTYPES = {'deptid': 'Int32', 'supdeptid': 'Int32'}
+
+# Merged column -> export column
+OUTPUT_RENAMES = {
+    'userid': 'personnel id',
+    'firstname': 'first name',
+    'lastname': 'last name',
+    'card number': 'card number',
+    'logtime': 'date and time',
+    'device name': 'device name',
+    'event_point_name': 'event point'
+}
+
+
+def select_columns(df: pd.DataFrame, renames: Dict[str, str]) -> pd.DataFrame:
+    """Select and rename columns, sharing the underlying arrays with df instead of copying them."""
+    return pd.DataFrame({new: df[old] for old, new in renames.items()}, copy=False)
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Convert the columns of a cleaned table to their compact dtypes, in place."""
+    for col, dtype in dtypes.items():
+        if dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col]).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def filter_years(df: pd.DataFrame, year_range: Tuple[int, Optional[int]]) -> pd.DataFrame:
+    """Keep the rows whose logtime falls in the (first, last) years, last may be None for no upper bound.
+
+        df is returned as is when nothing is dropped, which is the usual case once the
+        year filter has been pushed down to the database.
+    """
+    first_year, last_year = year_range
+    years = df['logtime'].dt.year
+    keep = years >= first_year
+    if last_year is not None:
+        keep &= years <= last_year
+    return df if keep.all() else df[keep]
+
+
+# ========== CLEANING FUNCTIONS ==========
+def clean_checkin_data(df: pd.DataFrame, year_range: Tuple[int, Optional[int]] = (FIRST_YEAR, None)) -> pd.DataFrame:
+    """Clean and preprocess the check-in/out records."""
+    df = apply_dtypes(select_columns(df, CHECKIN_RENAMES), CHECKIN_DTYPES)
+    return filter_years(df, year_range)
+
+
+def clean_department_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Clean and preprocess the department information."""
+    return apply_dtypes(select_columns(df, DEPARTMENT_RENAMES), DEPARTMENT_DTYPES)
+
+
+def clean_user_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Clean and preprocess the user information."""
+    return apply_dtypes(select_columns(df, USER_RENAMES), USER_DTYPES)
+
+
+def clean_eventlog_data(df: pd.DataFrame, year_range: Tuple[int, Optional[int]] = (FIRST_YEAR, None)) -> pd.DataFrame:
+    """Clean and preprocess the event logs."""
+    df = apply_dtypes(select_columns(df, EVENTLOG_RENAMES), EVENTLOG_DTYPES)
+    return filter_years(df, year_range)
+
+
+# ========== MERGING FUNCTION ==========
+def merge_data(
+    user_df: pd.DataFrame,
+    checkin_df: pd.DataFrame,
+    eventlog_df: pd.DataFrame,
+    department_df: pd.DataFrame,
+    tolerance: pd.Timedelta = pd.Timedelta(seconds=1),
+    consumed_checkins: Optional[np.ndarray] = None,
+    matched_events: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """Merge cleaned user and department to create employee_df, match check-in and event log tables to create log_events_df.
+
+        returns the attendance rows with the export column names, in merge column order.
+        The export column order and the constant columns are applied by the writers.
+
+        employee_df: DataFrame containing user and department information.
+        log_events_df: DataFrame containing check-in and event log information.
+        consumed_checkins: mask of check-in rows already matched, when the event log is merged in batches.
+        matched_events: optional mask over the event log rows, set in place where an entry found its check-in.
+    """
+    # Merge user and department dataframes
+    employee_df = user_df.merge(department_df, on='deptid', how='left')
+
+    # Match each event log entry to at most one check-in record by time (no shared device/user key between the two tables)
+    log_events_df, match_stats = asof_join(
+        select_columns(eventlog_df, {col: col for col in ['logtime', 'device name', 'event_point_name']}),
+        select_columns(checkin_df, {'userid': 'userid', 'logtime': 'logtime'}),
+        on='logtime',
+        tolerance=tolerance,
+        suffixes=('_eventlog', '_checkin'),
+        consumed=consumed_checkins)
+    logger.info(f"Matched event log to check-ins: {match_stats['exact']} exact, {match_stats['fuzzy']} within {tolerance.total_seconds():g}s, {match_stats['unmatched']} unmatched")
+    if matched_events is not None:
+        matched_events[:] = log_events_df['userid'].notna().to_numpy()
+
+    merged_df = pd.merge(
+        select_columns(employee_df, {col: col for col in ['userid', 'firstname', 'lastname', 'card number']}),
+        log_events_df,
+        on='userid',
+        how='inner')
+
+    # Changing column names, in place
+    merged_df.columns = [OUTPUT_RENAMES[col] for col in merged_df.columns]
+
+    logger.info(f"dataframe has {len(merged_df)} rows")
+    return merged_df
+
+
+def month_key(year_month: str) -> int:
+    """Integer month key (year * 12 + month - 1) of a "YYYY-MM" string."""
+    year, month = year_month.split('-')
+    return int(year) * 12 + int(month) - 1
+
+
+def month_name(key: int) -> str:
+    """"YYYY-MM" string of an integer month key."""
+    year, month = divmod(int(key), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def month_keys(times: pd.Series) -> np.ndarray:
+    """Integer month keys of datetime64 values, computed without going through Period or str."""
+    return times.to_numpy().astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+
+# Initial grouping function to change the DataFrame to a dict with year_month as key
+def group_by_year_month_1(df: pd.DataFrame, year_month: str) -> Dict[str, pd.DataFrame]:
+    """Group the DataFrame by year and month, keeping the months at or after year_month.
+
+        Rows are ordered by month once (stable, so each month keeps its row order) and
+        every month is a slice of that ordering.
+    """
+    keys = month_keys(df['date and time'])
+    logger.info(f"skipping dfs greater than or equal to {year_month} since it has already been processed...")
+    rows = np.flatnonzero(keys >= month_key(year_month))
+    if len(rows) == 0:
+        return {}
+    if len(rows) < len(df) or np.any(keys[1:] < keys[:-1]):
+        rows = rows[np.argsort(keys[rows], kind='stable')]
+        df = df.take(rows)
+        keys = keys[rows]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.append(starts[1:], len(keys))
+    return {month_name(keys[start]): df.iloc[start:end] for start, end in zip(starts, ends)}
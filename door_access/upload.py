@@ -0,0 +1,153 @@
+"""Upload of the monthly exports to one or more S3 bucket targets."""
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import boto3
+import pandas as pd
+from boto3.s3.transfer import TransferConfig
+
+from door_access.exports import export_parquet, to_export_frame
+from door_access.manifest import PartitionManifest
+from door_access.metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# Parts of 8 MiB above 8 MiB, so a large month goes up as a parallel multipart upload
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4
+)
+
+CONTENT_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+class S3Target(NamedTuple):
+    """A bucket and the client allowed to write to it."""
+    bucket: str
+    client: object
+
+
+def load_s3_targets(environ: Optional[Dict[str, str]] = None, prefix: str = "") -> List[S3Target]:
+    """Build the upload targets from the environment.
+
+        Targets are numbered: BUCKET_NAME_1 with AWS_ACCESS_KEY_ID_1, AWS_SECRET_ACCESS_KEY_1
+        and AWS_REGION_1, then BUCKET_NAME_2 and so on, until a number has no bucket.
+        An unnumbered BUCKET_NAME with the unnumbered credentials is used when there are none.
+        prefix is put in front of every variable name, so each site can have its own buckets.
+        S3_ENDPOINT_URL points every client at another endpoint, e.g. a local S3 stand-in.
+    """
+    environ = os.environ if environ is None else environ
+    suffixes = []
+    n = 1
+    while environ.get(f"{prefix}BUCKET_NAME_{n}"):
+        suffixes.append(f"_{n}")
+        n += 1
+    if not suffixes and environ.get(f"{prefix}BUCKET_NAME"):
+        suffixes.append("")
+
+    targets = []
+    for suffix in suffixes:
+        client = boto3.client(
+            "s3",
+            aws_access_key_id=environ.get(f"{prefix}AWS_ACCESS_KEY_ID{suffix}"),
+            aws_secret_access_key=environ.get(f"{prefix}AWS_SECRET_ACCESS_KEY{suffix}"),
+            region_name=environ.get(f"{prefix}AWS_REGION{suffix}"),
+            endpoint_url=environ.get("S3_ENDPOINT_URL")
+        )
+        targets.append(S3Target(environ[f"{prefix}BUCKET_NAME{suffix}"], client))
+    return targets
+
+
+def serialize_partition(df: pd.DataFrame, fmt: str, path: str, gzip_csv: bool = False, compression: str = 'snappy') -> None:
+    """Write a month once to a local file in the given format, which every target then uploads from."""
+    if fmt == 'csv':
+        to_export_frame(df).to_csv(path, index=False, compression='gzip' if gzip_csv else None)
+    elif fmt == 'parquet':
+        export_parquet(df, path, compression)
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
+
+
+def _upload_one(target: S3Target, path: str, key: str, extra_args: dict) -> float:
+    start = time.perf_counter()
+    target.client.upload_file(path, target.bucket, key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Uploaded {key} to {target.bucket} in {elapsed:.2f}s")
+    return elapsed
+
+
+def upload_partitions(
+    dfs: Dict[str, pd.DataFrame],
+    targets: List[S3Target],
+    key_for: Callable[[str, str], str],
+    formats: List[str],
+    gzip_csv: bool = False,
+    compression: str = 'snappy',
+    max_workers: int = 4,
+    manifest: Optional[PartitionManifest] = None,
+    metrics: Optional[RunMetrics] = None
+) -> None:
+    """Upload every year-month group to every target, serializing each group only once per format.
+
+        key_for(name, fmt) gives the object key of a group, without the .gz suffix added for gzipped CSV.
+        Each serialized file is uploaded to all targets in parallel from a thread pool, streamed from
+        disk as a multipart upload when large, and removed once every target has it.
+        With a manifest, targets that already hold an identical month are skipped, and a month
+        no target needs is not serialized at all.
+        With metrics, the size and upload time of every object are recorded.
+        When an upload fails, the uploads of the same file to the other targets still finish and
+        are recorded, then the first error is raised.
+    """
+    if not targets:
+        logger.warning("No S3 targets configured. Skipping upload.")
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, df in dfs.items():
+            if df.empty:
+                logger.warning(f"DataFrame for {name} is empty. Skipping upload.")
+                continue
+            for fmt in formats:
+                key = key_for(name, fmt)
+                extra_args = {'ContentType': CONTENT_TYPES[fmt]}
+                if fmt == 'csv' and gzip_csv:
+                    key += '.gz'
+                    extra_args['ContentEncoding'] = 'gzip'
+
+                pending = targets
+                if manifest is not None:
+                    pending = [target for target in targets if not manifest.is_current(f"s3://{target.bucket}/{key}", name, df)]
+                    if not pending:
+                        logger.info(f"{name} is unchanged in every bucket at {key}. Skipping upload.")
+                        continue
+
+                fd, path = tempfile.mkstemp(prefix="door_access_upload_")
+                os.close(fd)
+                futures = []
+                try:
+                    serialize_partition(df, fmt, path, gzip_csv, compression)
+                    size = os.path.getsize(path)
+                    logger.info(f"Uploading {name} ({size} bytes) to {len(pending)} bucket(s) at {key}")
+                    futures = [executor.submit(_upload_one, target, path, key, extra_args) for target in pending]
+                    wait(futures)
+                    errors = []
+                    for target, future in zip(pending, futures):
+                        error = future.exception()
+                        if error is not None:
+                            logger.error(f"Upload of {key} to {target.bucket} failed: {error}")
+                            errors.append(error)
+                            continue
+                        if metrics is not None:
+                            metrics.upload(target.bucket, key, size, future.result())
+                        if manifest is not None:
+                            manifest.record(f"s3://{target.bucket}/{key}", name, df)
+                    if errors:
+                        raise errors[0]
+                finally:
+                    # every upload reads the file, so it is only removed once they have all finished
+                    wait(futures)
+                    os.remove(path)
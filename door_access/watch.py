@@ -0,0 +1,168 @@
+"""Daemon mode: watch each site's Access database and run the incremental pipeline when new punches appear.
+
+Every poll only stats the .mdb file. The database is queried for the largest log ids
+when the file changed and then stayed unchanged for the debounce period (a device sync
+writes in bursts), once a file that keeps changing has waited ID_CHECK_SECONDS, or every
+ID_CHECK_SECONDS in case a change did not move the file time. The pipeline only runs when an id is past the site's saved watermark and past
+the ids seen before its last successful run, and a failing run or probe is retried
+with exponential backoff.
+
+    python -m door_access --watch kumasi
+"""
+import logging
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from door_access.extract import WATERMARK_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# seconds between two polls of the site files
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "15"))
+# how long the file must stay unchanged after a change before the database is queried
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "30"))
+# query the database at least this often, even when the file looks unchanged
+ID_CHECK_SECONDS = float(os.getenv("ID_CHECK_SECONDS", "900"))
+# first retry delay after a failure, doubled on every further failure up to the maximum
+WATCH_BACKOFF_SECONDS = float(os.getenv("WATCH_BACKOFF_SECONDS", "30"))
+WATCH_MAX_BACKOFF_SECONDS = float(os.getenv("WATCH_MAX_BACKOFF_SECONDS", "1800"))
+
+
+class FileSignature(NamedTuple):
+    """Modification time and size of a file, None when the file is missing."""
+    mtime: float
+    size: int
+
+
+def file_signature(path: str) -> Optional[FileSignature]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return FileSignature(stat.st_mtime, stat.st_size)
+
+
+def max_log_ids(conn) -> Dict[str, int]:
+    """Largest id of every log table, one indexed MAX per table through an open DB-API connection."""
+    ids = {}
+    cursor = conn.cursor()
+    for table, (id_col, _) in WATERMARK_COLUMNS.items():
+        cursor.execute(f"SELECT MAX([{id_col}]) FROM [{table}]")
+        ids[table] = int(cursor.fetchone()[0] or 0)
+    return ids
+
+
+def watermark_ids(watermarks: Dict[str, dict]) -> Dict[str, int]:
+    """The id part of the saved per-table watermarks."""
+    return {table: int(watermarks[table][id_col]) for table, (id_col, _) in WATERMARK_COLUMNS.items() if table in watermarks}
+
+
+class SiteWatcher:
+    """Decides, poll after poll, when a site has new punches to run the pipeline for.
+
+        signature(): the current FileSignature of the site's database file.
+        max_ids(): the largest id of every log table in the database.
+        saved_ids(): the ids already exported, from the site's watermarks.
+        run(): the incremental pipeline of the site.
+        The ids seen before a successful run count as done, even when the watermark stays below
+        them, e.g. the largest id is a punch outside the exported years.
+        Everything is passed in, so the watcher runs as well against a SQLite stand-in and a fake clock.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        signature: Callable[[], Optional[FileSignature]],
+        max_ids: Callable[[], Dict[str, int]],
+        saved_ids: Callable[[], Dict[str, int]],
+        run: Callable[[], object],
+        debounce: float = WATCH_DEBOUNCE_SECONDS,
+        id_check_interval: float = ID_CHECK_SECONDS,
+        backoff: float = WATCH_BACKOFF_SECONDS,
+        max_backoff: float = WATCH_MAX_BACKOFF_SECONDS
+    ):
+        self.name = name
+        self.signature = signature
+        self.max_ids = max_ids
+        self.saved_ids = saved_ids
+        self.run = run
+        self.debounce = debounce
+        self.id_check_interval = id_check_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.last_signature: Optional[FileSignature] = None
+        self.changed_at: Optional[float] = None
+        self.first_change_at: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.seen_ids: Dict[str, int] = {}
+        self.retry_at = 0.0
+        self.failures = 0
+
+    def _fail(self, now: float, what: str, error: Exception) -> None:
+        self.failures += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+        self.retry_at = now + delay
+        logger.error(f"{what} failed for {self.name} ({error}), retrying in {delay:g}s")
+
+    def poll(self, now: float) -> bool:
+        """One poll at time now, returns True when the pipeline ran successfully."""
+        signature = self.signature()
+        if self.first_change_at is None and signature != self.last_signature:
+            self.first_change_at = now
+        # a file that changes more often than the debounce period is still checked once it waited id_check_interval
+        waited = self.first_change_at is not None and now - self.first_change_at >= self.id_check_interval
+        if signature != self.last_signature:
+            self.last_signature = signature
+            self.changed_at = now
+            if not waited:
+                return False
+        if now < self.retry_at or signature is None:
+            return False
+
+        settled = self.changed_at is not None and now - self.changed_at >= self.debounce
+        due = self.checked_at is None or now - self.checked_at >= self.id_check_interval
+        if not (settled or waited or due):
+            return False
+
+        try:
+            current = self.max_ids()
+        except Exception as e:
+            self._fail(now, "Checking the log ids", e)
+            return False
+        self.checked_at = now
+        saved = self.saved_ids()
+        done = {table: max(saved.get(table, 0), self.seen_ids.get(table, 0)) for table in current}
+        new_tables = [table for table, max_id in current.items() if max_id > done[table]]
+        if not new_tables:
+            self.changed_at = self.first_change_at = None
+            return False
+
+        logger.info(f"New punches in {', '.join(new_tables)} for {self.name}: {current} past {done}")
+        try:
+            self.run()
+        except Exception as e:
+            self._fail(now, "Pipeline", e)
+            return False
+        self.failures = 0
+        self.changed_at = self.first_change_at = None
+        self.seen_ids = current
+        return True
+
+
+def watch(
+    watchers: List[SiteWatcher],
+    poll_interval: float = WATCH_POLL_SECONDS,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+    polls: Optional[int] = None
+) -> None:
+    """Poll every watcher every poll_interval seconds, forever or for the given number of polls."""
+    logger.info(f"Watching {', '.join(w.name for w in watchers)} every {poll_interval:g}s...")
+    n = 0
+    while polls is None or n < polls:
+        for watcher in watchers:
+            watcher.poll(clock())
+        n += 1
+        sleep(poll_interval)
@@ -4,8 +4,14 @@ import ctypes
 import logging
 import pyautogui
 import pygetwindow as gw
+import pyodbc
+import win32api
+import win32con
 import win32gui
+import win32process
 from dotenv import load_dotenv
+from door_access.sites import SITES
+from door_access.sync_wait import log_table_stats, wait_for, wait_until_stable
 
 
 # Load environment variables (for secure credentials)
@@ -13,6 +19,49 @@ load_dotenv()
 
 # Paths and constants
 ZK_ACCESS_PATH = "C:\\ZKTeco\\ZKAccess3.5\\Access.exe"
+ZK_ACCESS_PROCESS = "Access.exe"
+# site whose Access database ZKAccess downloads the device logs into
+SYNC_SITE = os.getenv("SYNC_SITE", "kumasi")
+# the download is done once the log tables grew and then stopped growing for SYNC_SETTLE_SECONDS;
+# SYNC_TIMEOUT_SECONDS is the old fixed wait, now only an upper bound, also when nothing was downloaded
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "60"))
+SYNC_TIMEOUT_SECONDS = float(os.getenv("SYNC_TIMEOUT_SECONDS", "750"))
+SYNC_POLL_SECONDS = float(os.getenv("SYNC_POLL_SECONDS", "10"))
+# how long to wait for a ZKAccess window to show up
+WINDOW_TIMEOUT_SECONDS = float(os.getenv("WINDOW_TIMEOUT_SECONDS", "60"))
+
+def window_process_name(hwnd):
+    """Executable name of the process owning a window, None when it cannot be read."""
+    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+    try:
+        handle = win32api.OpenProcess(win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ, False, pid)
+    except win32api.error:
+        return None
+    try:
+        return os.path.basename(win32process.GetModuleFileNameEx(handle, 0))
+    except win32api.error:
+        return None
+    finally:
+        win32api.CloseHandle(handle)
+
+
+def get_window_by_partial_class_name(partial_class_name):
+    """Find the HWND of a visible ZKAccess window by partial class name, None if there is none.
+
+    Only the windows of Access.exe are matched, class names such as the "#32770" dialog
+    class are shared by every program.
+    """
+    def enum_handler(hwnd, results):
+        if win32gui.IsWindowVisible(hwnd):
+            current_class_name = win32gui.GetClassName(hwnd)
+            if partial_class_name.lower() in current_class_name.lower():
+                if (window_process_name(hwnd) or "").lower() == ZK_ACCESS_PROCESS.lower():
+                    results.append(hwnd)
+
+    windows = []
+    win32gui.EnumWindows(enum_handler, windows)
+    return windows[0] if windows else None
+
 
 # Check if Caps Lock is ON
 if ctypes.windll.user32.GetKeyState(0x14) & 1:
@@ -22,9 +71,10 @@ if ctypes.windll.user32.GetKeyState(0x14) & 1:
 # Close ZKAccess if it is running 
 os.system('TASKKILL /F /IM Access.exe')
     
-# Start ZKAccess
+# Start ZKAccess and wait for its first window (a dialog or the login window)
 os.startfile(ZK_ACCESS_PATH)
-time.sleep(5)
+if not wait_for(lambda: get_window_by_partial_class_name("#32770") or get_window_by_partial_class_name("WindowsForms10.Window.8.app"), WINDOW_TIMEOUT_SECONDS):
+    raise SystemExit(f"ZKAccess did not open a window within {WINDOW_TIMEOUT_SECONDS:g}s")
 
 # Logging admin
 # ========== SETUP LOGGING ==========
@@ -58,18 +108,6 @@ def resize_and_center_window_by_partial_class(partial_class_name, width, height,
     Returns:
         bool: True if a matching window is found and resized, False otherwise.
     """
-    def get_window_by_partial_class_name(partial_class_name):
-        """Helper function to find the HWND of a window by partial class name."""
-        def enum_handler(hwnd, results):
-            if win32gui.IsWindowVisible(hwnd):
-                current_class_name = win32gui.GetClassName(hwnd)
-                if partial_class_name.lower() in current_class_name.lower():
-                    results.append(hwnd)
-
-        windows = []
-        win32gui.EnumWindows(enum_handler, windows)
-        return windows[0] if windows else None
-
     hwnd = get_window_by_partial_class_name(partial_class_name)
     if not hwnd:
         logger.error(f"No window found with class name containing: {partial_class_name}")
@@ -120,6 +158,22 @@ def maximize_zkaccess_window():
         return False
 
 
+def access_log_stats():
+    """Row count and largest id of the log tables the download writes to."""
+    with pyodbc.connect(SITES[SYNC_SITE].connection_string) as conn:
+        return log_table_stats(conn)
+
+
+def wait_for_log_download():
+    """Wait until the devices are drained: the log tables grew and stopped growing, or SYNC_TIMEOUT_SECONDS pass."""
+    result = wait_until_stable(access_log_stats, SYNC_SETTLE_SECONDS, SYNC_TIMEOUT_SECONDS, SYNC_POLL_SECONDS)
+    if result.completed:
+        logger.info(f"Log download finished after {result.elapsed:.0f}s ({result.reason}): {result.value}")
+    else:
+        logger.warning(f"Log download not finished, {result.reason}: {result.value}")
+    return result
+
+
 # Step 1: Automate ZKAcess Log Sync
 def export_from_zk_access():
     """Open ZKAcess, login, and sync attendance logs to database."""
@@ -141,7 +195,9 @@ def export_from_zk_access():
     # pyautogui.doubleClick(934, 505)  # Password field
     # pyautogui.write(PASSWORD)
     pyautogui.click(952, 599)  # Login button
-    time.sleep(5)  # Wait to log in
+    if not wait_for(lambda: gw.getWindowsWithTitle("ZKAccess3.5 Security System"), WINDOW_TIMEOUT_SECONDS):  # Wait to log in
+        logger.error(f"ZKAccess did not log in within {WINDOW_TIMEOUT_SECONDS:g}s.")
+        return
 
 
 
@@ -156,7 +212,9 @@ def export_from_zk_access():
     time.sleep(3)
 
     pyautogui.click(539, 66)  # Click on get logs
-    time.sleep(3)
+    if not wait_for(lambda: gw.getWindowsWithTitle("Get logs"), WINDOW_TIMEOUT_SECONDS):
+        logger.error(f"Get logs window did not open within {WINDOW_TIMEOUT_SECONDS:g}s.")
+        return
 
     if not resize_and_center_window_by_title("Get logs", 637, 258, 643, 390):
         return  # Exit if the Get logs window is not found
@@ -167,7 +225,7 @@ def export_from_zk_access():
     time.sleep(2)
 
     pyautogui.click(1035, 618)  # Click on get
-    time.sleep(750)
+    wait_for_log_download()
 
     pyautogui.click(1197, 612)  # Click on cancel
     time.sleep(2)
@@ -5,8 +5,9 @@ cd/d "C:\Users\HP\Desktop\door_access"
 :: run get all logs script
 venv\Scripts\python.exe get_all_logs.py >> get_all_logs.log 2>&1
 
-:: Run the python script with virtual env kernel and write logs (stdout and stderr) to a log file
-venv\Scripts\python.exe door_access_kumasi.py>>door_access_pipeline.log 2>&1
+:: Run the Kumasi pipeline, whose logs get_all_logs.py just downloaded, with virtual env kernel and write logs (stdout and stderr) to a log file
+:: the site also logs to logs\door_access_kumasi.log
+venv\Scripts\python.exe -m door_access kumasi>>door_access_pipeline.log 2>&1
 
 :: Exit
 exit
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Name normalisation shared by Data Processing/processing.py and Final_Merger/name_match.py.
+
+A handful of names repeats over every punch row, so a column is normalised per distinct
+value: it is factorised, each unique value goes through the normaliser once (memoised in an
+LRU cache that lasts across calls) and the results are broadcast back by the codes.
+
+    df['normalized_name'] = normalize_column(df['name'], normalize_name)
+"""
+import re
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Distinct names remembered by each normaliser across calls
+NAME_CACHE_SIZE = 1 << 16
+
+NON_LETTERS = re.compile(r'[^a-z\s]')
+WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(name) -> str:
+    """Normalize name for matching: lower case, remove extra spaces, remove special chars."""
+    if pd.isna(name):
+        return ''
+    name = str(name).lower().strip()
+    name = WHITESPACE.sub(' ', name)  # Replace multiple spaces with single
+    name = NON_LETTERS.sub('', name)  # Remove non-letter chars except space
+    return name
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def clean_name(name) -> str:
+    """Lowercase and remove extra spaces and non-letters."""
+    name = str(name).strip().lower()
+    name = NON_LETTERS.sub('', name)
+    name = WHITESPACE.sub(' ', name)
+    return name
+
+
+def normalize_column(values: pd.Series, normalize: Callable[[object], str]) -> pd.Series:
+    """normalize applied to every value of the column, computed once per distinct value.
+
+        Missing values are passed to normalize one by one, as None and NaN can normalise
+        differently (clean_name gives "none" and "nan").
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    # code -1 (missing) picks the trailing placeholder, replaced below
+    normalized = np.asarray([normalize(value) for value in uniques] + [''], dtype=object)[codes]
+    missing = codes < 0
+    if missing.any():
+        normalized[missing] = [normalize(value) for value in values[missing]]
+    return pd.Series(normalized, index=values.index, name=values.name)
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from benchmarks.bench_incremental_extract import LOG_TABLES, create_standin, insert_punches
+from door_access.extract import build_query, drop_settled, load_tables, with_pending
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    create_standin(conn)
+    yield conn
+    conn.close()
+
+
+def test_watermark_load_reads_only_the_delta(conn):
+    insert_punches(conn, 1, 500)
+    _, watermarks = load_tables(conn, LOG_TABLES)
+    insert_punches(conn, 501, 20)
+
+    dfs, new_watermarks = load_tables(conn, LOG_TABLES, watermarks)
+
+    assert sum(len(df) for df in dfs.values()) == 2 * 20
+    assert dfs['checkin']['LOGID'].tolist() == list(range(501, 521))
+    assert new_watermarks['CHECKINOUT']['LOGID'] == 520
+    assert new_watermarks['acc_monitor_log']['id'] == 520
+
+
+def test_empty_delta_keeps_the_watermark(conn):
+    insert_punches(conn, 1, 10)
+    _, watermarks = load_tables(conn, LOG_TABLES)
+    dfs, new_watermarks = load_tables(conn, LOG_TABLES, watermarks)
+    assert all(df.empty for df in dfs.values())
+    assert new_watermarks == watermarks
+
+
+def test_query_pairs_the_id_watermark_with_a_time_lookback():
+    watermark = {'LOGID': 10, 'CHECKTIME': '2024-01-01T08:00:00', 'pending': [7], 'since': '2024-01-01T07:00:00'}
+    sql, params = build_query('CHECKINOUT', ['LOGID'], watermark, (2024, None))
+    assert sql == "SELECT [LOGID] FROM [CHECKINOUT] WHERE ([LOGID] > ? OR [CHECKTIME] >= ?) AND [CHECKTIME] >= ?"
+    assert params[:2] == [10, pd.Timestamp('2024-01-01T07:00:00').to_pydatetime()]
+
+    sql, params = build_query('CHECKINOUT', ['LOGID'], {'LOGID': 10, 'CHECKTIME': '2024-01-01T08:00:00'})
+    assert sql == "SELECT [LOGID] FROM [CHECKINOUT] WHERE [LOGID] > ?"
+
+
+def test_pending_rows_are_re_read_and_settled_ones_are_not(conn):
+    insert_punches(conn, 1, 10)
+    dfs, watermarks = load_tables(conn, LOG_TABLES)
+    checkins = dfs['checkin']
+    watermarks['CHECKINOUT'] = with_pending('CHECKINOUT', watermarks['CHECKINOUT'], checkins[checkins['LOGID'].isin([4, 8])])
+    assert watermarks['CHECKINOUT']['pending'] == [4, 8]
+    assert watermarks['CHECKINOUT']['since'] == pd.Timestamp(checkins['CHECKTIME'][3]).isoformat()
+    insert_punches(conn, 11, 2)
+
+    dfs, new_watermarks = load_tables(conn, LOG_TABLES, watermarks)
+
+    assert dfs['checkin']['LOGID'].tolist() == [4, 8, 11, 12]
+    assert dfs['eventlog']['id'].tolist() == [11, 12]
+    assert new_watermarks['CHECKINOUT'] == {'LOGID': 12, 'CHECKTIME': pd.Timestamp(dfs['checkin']['CHECKTIME'].iloc[-1]).isoformat()}
+
+
+def test_with_pending_clears_rows_no_longer_waiting():
+    watermark = {'id': 5, 'time': '2024-01-01T08:00:00', 'pending': [3], 'since': '2024-01-01T07:00:00'}
+    assert with_pending('acc_monitor_log', watermark, pd.DataFrame({'id': [], 'time': []})) == {'id': 5, 'time': '2024-01-01T08:00:00'}
+
+
+def test_drop_settled_without_pending_is_a_no_op():
+    df = pd.DataFrame({'id': [1, 2]})
+    assert drop_settled('acc_monitor_log', df, {'id': 5, 'time': '2024-01-01T08:00:00'}) is df
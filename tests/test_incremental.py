@@ -0,0 +1,115 @@
+import datetime as dt
+import sqlite3
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_sqlite
+from door_access import pipeline
+from door_access.sites import SiteConfig
+
+SITE = SiteConfig(name='test', mdb_file='', s3_prefix='raw/test', env_prefix='TEST_', source='mirror')
+MONTH_CSV = 'data_exports/test_attendance_2024_02.csv'
+
+
+def base_tables():
+    return {
+        'USERINFO': pd.DataFrame({'USERID': [1, 2], 'Badgenumber': ['1001', '1002'], 'name': ['Ama', 'Kofi'],
+                                  'lastname': ['Owusu', 'Mensah'], 'email': ['a@example.org', 'k@example.org'],
+                                  'DEFAULTDEPTID': [1, 1], 'CardNo': ['3000001', '3000002']}),
+        'DEPARTMENTS': pd.DataFrame({'DEPTID': [1], 'DEPTNAME': ['Finance'], 'SUPDEPTID': [0]}),
+        'CHECKINOUT': pd.DataFrame({'LOGID': [1], 'USERID': [1], 'CHECKTIME': [pd.Timestamp('2024-02-01 08:00:00')]}),
+        'acc_monitor_log': pd.DataFrame({'id': [1], 'time': [pd.Timestamp('2024-02-01 08:00:00')], 'device_name': ['Main'],
+                                         'state': [0], 'event_type': [0], 'event_point_name': ['Main-1']}),
+    }
+
+
+def add_checkin(logid, userid, time):
+    with sqlite3.connect('mirror/test.sqlite') as conn:
+        conn.execute("INSERT INTO [CHECKINOUT] VALUES (?, ?, ?)", (logid, userid, time))
+    conn.close()
+
+
+def add_event(event_id, time):
+    with sqlite3.connect('mirror/test.sqlite') as conn:
+        conn.execute("INSERT INTO [acc_monitor_log] VALUES (?, ?, 'Main', 0, 0, 'Main-1')", (event_id, time))
+    conn.close()
+
+
+def exported_rows(month_csv=MONTH_CSV):
+    df = pd.read_csv(month_csv)
+    return sorted(zip(df['personnel id'], df['date and time']))
+
+
+@pytest.fixture(params=[0, 2], ids=['whole', 'chunked'])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(pipeline, 'CHUNK_SIZE', request.param)
+    return request.param
+
+
+@pytest.fixture
+def site_dir(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, 'MIRROR_SYNC', False)
+    monkeypatch.setattr(pipeline, 'OUTPUT_FORMATS', ['csv'])
+    for name in ('TEST_BUCKET_NAME', 'TEST_BUCKET_NAME_1'):
+        monkeypatch.delenv(name, raising=False)
+    (tmp_path / 'mirror').mkdir()
+    (tmp_path / 'data_exports').mkdir()
+    write_sqlite(base_tables(), 'mirror/test.sqlite')
+    pipeline.run_site(SITE, "incremental")
+    return tmp_path
+
+
+EXPECTED = [(1, '2024-02-01 08:00:00'), (2, '2024-02-01 09:00:00')]
+
+
+def test_event_written_before_its_check_in(site_dir):
+    add_event(2, '2024-02-01 09:00:00')
+    pipeline.run_site(SITE, "incremental")
+    add_checkin(2, 2, '2024-02-01 09:00:01')
+    pipeline.run_site(SITE, "incremental")
+    assert exported_rows() == EXPECTED
+
+
+def test_check_in_written_before_its_event(site_dir):
+    add_checkin(2, 2, '2024-02-01 09:00:01')
+    pipeline.run_site(SITE, "incremental")
+    add_event(2, '2024-02-01 09:00:00')
+    pipeline.run_site(SITE, "incremental")
+    assert exported_rows() == EXPECTED
+
+
+def test_matched_check_ins_are_not_re_used(site_dir):
+    add_checkin(2, 2, '2024-02-01 09:00:01')
+    pipeline.run_site(SITE, "incremental")
+    # within the tolerance of user 1's 08:00:00 check-in, already taken by the first event
+    add_event(2, '2024-02-01 08:00:01')
+    add_event(3, '2024-02-01 09:00:00')
+    pipeline.run_site(SITE, "incremental")
+    assert exported_rows() == EXPECTED
+
+
+def test_incremental_runs_export_what_a_full_run_does(site_dir):
+    add_event(2, '2024-02-01 09:00:00')
+    add_checkin(2, 1, '2024-02-01 10:00:00')
+    pipeline.run_site(SITE, "incremental")
+    add_checkin(3, 2, '2024-02-01 09:00:00')
+    add_event(3, '2024-02-01 10:00:01')
+    pipeline.run_site(SITE, "incremental")
+    incremental = exported_rows()
+
+    pipeline.run_site(SITE, "full")
+    assert exported_rows() == incremental == sorted(EXPECTED + [(1, '2024-02-01 10:00:01')])
+
+
+def test_runs_keep_exporting_past_new_year(site_dir, monkeypatch):
+    clock = SimpleNamespace(now=dt.datetime(2030, 12, 31, 23, 0))
+    monkeypatch.setattr(pipeline, 'dt', SimpleNamespace(datetime=SimpleNamespace(now=lambda: clock.now)))
+    pipeline.run_site(SITE, "incremental")
+    clock.now = dt.datetime(2031, 1, 1, 9, 0)
+    add_event(2, '2031-01-01 08:00:00')
+    add_checkin(2, 2, '2031-01-01 08:00:00')
+    pipeline.run_site(SITE, "incremental")
+    assert exported_rows('data_exports/test_attendance_2031_01.csv') == [(2, '2031-01-01 08:00:00')]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from door_access.join import asof_join
+
+
+def events(*times):
+    return pd.DataFrame({'logtime': pd.to_datetime(list(times), format='ISO8601'), 'event_point_name': [f"door {i}" for i in range(len(times))]})
+
+
+def checkins(*times):
+    return pd.DataFrame({'logtime': pd.to_datetime(list(times), format='ISO8601'), 'userid': list(range(1, len(times) + 1))})
+
+
+def test_same_second_punches_pair_up_one_to_one():
+    joined, stats = asof_join(events("2024-02-01 08:00:00", "2024-02-01 08:00:00"),
+                              checkins("2024-02-01 08:00:00", "2024-02-01 08:00:00"))
+    assert stats == {'exact': 2, 'fuzzy': 0, 'unmatched': 0}
+    assert joined['userid'].tolist() == [1, 2]
+
+
+def test_skewed_check_in_is_used_once():
+    joined, stats = asof_join(events("2024-02-01 08:00:10", "2024-02-01 08:00:12"),
+                              checkins("2024-02-01 08:00:11"))
+    assert stats == {'exact': 0, 'fuzzy': 1, 'unmatched': 1}
+    assert joined['userid'].tolist()[0] == 1
+    assert pd.isna(joined['userid'].iloc[1])
+
+
+def test_skewed_matches_go_closest_first():
+    # merge_asof nearest would give both events the 08:00:11.8 check-in
+    joined, stats = asof_join(events("2024-02-01 08:00:11", "2024-02-01 08:00:12"),
+                              checkins("2024-02-01 08:00:10.5", "2024-02-01 08:00:11.8"))
+    assert stats == {'exact': 0, 'fuzzy': 2, 'unmatched': 0}
+    assert joined['userid'].tolist() == [1, 2]
+
+
+def test_exact_matches_win_over_fuzzy_ones():
+    joined, stats = asof_join(events("2024-02-01 08:00:11", "2024-02-01 08:00:12"),
+                              checkins("2024-02-01 08:00:10.5", "2024-02-01 08:00:12"))
+    assert stats == {'exact': 1, 'fuzzy': 1, 'unmatched': 0}
+    assert joined['userid'].tolist() == [1, 2]
+
+
+def test_out_of_tolerance_stays_unmatched():
+    joined, stats = asof_join(events("2024-02-01 08:00:00"), checkins("2024-02-01 08:00:02"))
+    assert stats == {'exact': 0, 'fuzzy': 0, 'unmatched': 1}
+
+
+def test_by_columns_must_agree():
+    left = events("2024-02-01 08:00:10", "2024-02-01 08:00:10").assign(device=['a', 'b'])
+    right = checkins("2024-02-01 08:00:11", "2024-02-01 08:00:11").assign(device=['b', 'a'])
+    joined, stats = asof_join(left, right, by=['device'])
+    assert stats['fuzzy'] == 2
+    assert joined['userid'].tolist() == [2, 1]
+
+
+def test_consumed_check_ins_are_not_reused_across_batches():
+    right = checkins("2024-02-01 08:00:11")
+    consumed = np.zeros(len(right), dtype=bool)
+    _, first = asof_join(events("2024-02-01 08:00:10"), right, consumed=consumed)
+    _, second = asof_join(events("2024-02-01 08:00:12"), right, consumed=consumed)
+    assert first['fuzzy'] == 1 and consumed.all()
+    assert second == {'exact': 0, 'fuzzy': 0, 'unmatched': 1}
@@ -0,0 +1,18 @@
+import runpy
+import sys
+
+import pytest
+
+from door_access import pipeline
+
+
+@pytest.mark.parametrize('argv, workers', [([], 3), (['--workers', '1'], 1), (['--workers', '0'], 0)])
+def test_workers_default_to_site_workers(monkeypatch, argv, workers):
+    calls = []
+    monkeypatch.setattr(pipeline, 'SITE_WORKERS', 3)
+    monkeypatch.setattr(pipeline, 'run_sites', lambda names, max_workers: calls.append((names, max_workers)) or 0)
+    monkeypatch.setattr(sys, 'argv', ['door_access', 'kumasi'] + argv)
+    with pytest.raises(SystemExit) as exit:
+        runpy.run_module('door_access', run_name='__main__')
+    assert exit.value.code == 0
+    assert calls == [(['kumasi'], workers)]
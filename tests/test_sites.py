@@ -0,0 +1,24 @@
+import pytest
+
+from door_access.sites import SITES, select_sites
+
+
+def test_accra_needs_its_database_path(monkeypatch):
+    monkeypatch.delenv('ACCRA_MDB_FILE', raising=False)
+    with pytest.raises(ValueError, match='ACCRA_MDB_FILE'):
+        SITES['accra'].connection_string
+    monkeypatch.setenv('ACCRA_MDB_FILE', r'D:\ZKAccess\Access.mdb')
+    assert r'DBQ=D:\ZKAccess\Access.mdb;' in SITES['accra'].connection_string
+
+
+def test_kumasi_has_a_default_path(monkeypatch):
+    monkeypatch.delenv('KUMASI_MDB_FILE', raising=False)
+    assert SITES['kumasi'].mdb_path == r'C:\ZKTeco\ZKAccess3.5\Access.mdb'
+
+
+def test_select_sites(monkeypatch):
+    monkeypatch.setenv('DOOR_ACCESS_SITES', 'kumasi')
+    assert [site.name for site in select_sites()] == ['kumasi']
+    assert [site.name for site in select_sites(['accra'])] == ['accra']
+    with pytest.raises(ValueError, match='Unknown site'):
+        select_sites(['tema'])
@@ -0,0 +1,123 @@
+import datetime as dt
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+from door_access.devices import SimulatedDevice, encode_c3_time
+from door_access.pipeline import hold_back
+from door_access.sources import AccessSource, DeviceSource
+
+LOG_TABLES = {'checkin': 'CHECKINOUT', 'eventlog': 'acc_monitor_log'}
+T0 = dt.datetime(2024, 2, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def reference(tmp_path):
+    path = str(tmp_path / 'reference.sqlite')
+    with closing(sqlite3.connect(path)) as conn:
+        pd.DataFrame({'USERID': [1, 2, 3], 'Badgenumber': ['1001', '1002', '1003']}).to_sql('USERINFO', conn, index=False)
+    return AccessSource(lambda: closing(sqlite3.connect(path)))
+
+
+@pytest.fixture
+def devices():
+    return [SimulatedDevice('Main'), SimulatedDevice('Back')]
+
+
+def pull(devices, reference, watermarks=None):
+    return DeviceSource(devices, reference).load(LOG_TABLES, watermarks)
+
+
+def test_first_pull_reads_every_punch(devices, reference):
+    main, back = devices
+    main.punch('1001', T0)
+    back.punch('1002', T0 + dt.timedelta(seconds=5))
+    back.punch('9999', T0 + dt.timedelta(seconds=6))    # unknown pin, no check-in
+    dfs, watermarks = pull(devices, reference)
+    assert dfs['checkin']['USERID'].tolist() == [1, 2]
+    assert dfs['eventlog']['id'].tolist() == [1, 2, 3]
+    assert watermarks['acc_monitor_log']['time'] == '2024-02-01T08:00:06'
+
+
+def test_same_second_and_lagging_clock_punches_are_read_once(devices, reference):
+    main, back = devices
+    main.punch('1001', T0)
+    main.punch('1002', T0 + dt.timedelta(seconds=10))
+    _, watermarks = pull(devices, reference)
+
+    main.punch('1003', T0 + dt.timedelta(seconds=10))    # same second as the watermark
+    back.punch('1001', T0 - dt.timedelta(minutes=5))     # controller clock five minutes behind
+    main.punch('1002', T0 + dt.timedelta(seconds=10))    # the same pin again in that second
+    dfs, watermarks = pull(devices, reference, watermarks)
+
+    assert sorted(dfs['checkin']['USERID']) == [1, 2, 3]
+    assert dfs['checkin']['LOGID'].tolist() == [3, 4, 5]
+    assert dfs['eventlog']['id'].tolist() == [3, 4, 5]
+
+    dfs, _ = pull(devices, reference, watermarks)
+    assert dfs['checkin'].empty and dfs['eventlog'].empty
+
+
+def test_punches_older_than_the_lookback_are_not_re_read(devices, reference):
+    main, back = devices
+    main.punch('1001', T0)
+    _, watermarks = pull(devices, reference)
+    back.punch('1002', T0 - dt.timedelta(hours=2))
+    dfs, _ = pull(devices, reference, watermarks)
+    assert dfs['eventlog'].empty
+
+
+def held(df, id_col, time_col):
+    return pd.DataFrame({'logid': df[id_col].to_numpy(), 'logtime': df[time_col].to_numpy()})
+
+
+def test_held_back_punches_are_read_again_under_their_ids(devices, reference):
+    main, back = devices
+    main.punch('1001', T0)
+    main.punch('1002', T0 + dt.timedelta(seconds=10))
+    dfs, watermarks = pull(devices, reference)
+
+    # the check-in of 1001 came in before its event log entry, the pipeline holds it back
+    waiting = dfs['checkin'][dfs['checkin']['USERID'] == 1]
+    no_events = held(dfs['eventlog'].iloc[:0], 'id', 'time')
+    watermarks = hold_back(watermarks, {'CHECKINOUT': held(waiting, 'LOGID', 'CHECKTIME'), 'acc_monitor_log': no_events})
+    back.punch('1003', T0 + dt.timedelta(seconds=20))
+    dfs, watermarks = pull(devices, reference, watermarks)
+    assert dfs['checkin'][['LOGID', 'USERID']].values.tolist() == [[1, 1], [3, 3]]
+    assert dfs['eventlog']['id'].tolist() == [3]
+
+    # matched now, it is not read again
+    watermarks = hold_back(watermarks, {'CHECKINOUT': held(dfs['checkin'].iloc[:0], 'LOGID', 'CHECKTIME'), 'acc_monitor_log': no_events})
+    dfs, _ = pull(devices, reference, watermarks)
+    assert dfs['checkin'].empty and dfs['eventlog'].empty
+
+
+def test_watermark_without_seen_keys_reads_past_its_time(devices, reference):
+    main, _ = devices
+    main.punch('1001', T0)
+    main.punch('1002', T0 + dt.timedelta(seconds=1))
+    watermarks = {'CHECKINOUT': {'LOGID': 1, 'CHECKTIME': T0.isoformat()}, 'acc_monitor_log': {'id': 1, 'time': T0.isoformat()}}
+    dfs, _ = pull(devices, reference, watermarks)
+    assert dfs['checkin']['USERID'].tolist() == [2]
+    assert dfs['eventlog']['id'].tolist() == [2]
+
+
+def test_simulated_history_in_two_pulls_equals_one_pull(devices, reference):
+    main, back = devices
+    main.simulate(['1001', '1002', '1003'], T0, 200, seed=1)
+    back.simulate(['1001', '1002', '1003'], T0, 200, seed=2)
+    whole, _ = pull(devices, reference)
+
+    # the first pull stops at the same moment on both controllers
+    cut = encode_c3_time(T0 + dt.timedelta(days=1))
+    first = [SimulatedDevice('Main'), SimulatedDevice('Back')]
+    for device, full in zip(first, devices):
+        device.rows = [row for row in full.rows if row[-1] <= cut]
+    part, watermarks = pull(first, reference)
+    rest, _ = pull(devices, reference, watermarks)
+
+    columns = ['time', 'pin', 'device_name', 'event_point_name']
+    both = pd.concat([part['eventlog'], rest['eventlog']])[columns]
+    assert sorted(map(tuple, both.to_numpy())) == sorted(map(tuple, whole['eventlog'][columns].to_numpy()))
@@ -0,0 +1,53 @@
+import os
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_tables, write_sqlite
+from door_access import pipeline
+from door_access.sites import SiteConfig
+from door_access.spool import PartitionSpool
+
+
+def test_parts_come_back_concatenated_and_ordered():
+    spool = PartitionSpool(order=lambda df: df['user'].to_numpy())
+    spool.append('2024-02', pd.DataFrame({'user': [2, 1], 'n': [0, 1]}))
+    spool.extend({'2024-02': pd.DataFrame({'user': [1], 'n': [2]}), '2024-01': pd.DataFrame({'user': [3], 'n': [3]})})
+    spool.append('2024-03', pd.DataFrame({'user': [], 'n': []}))
+
+    assert list(spool) == ['2024-01', '2024-02']
+    assert spool['2024-02']['n'].tolist() == [1, 2, 0]
+    assert spool.rows('2024-02') == 3
+    assert spool.rows('2024-03') == 0
+    assert spool.rows() == 4
+    spool.cleanup()
+
+
+def test_streamed_run_reads_each_month_once_per_writer_and_removes_the_spool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('mirror')
+    os.makedirs('data_exports')
+    write_sqlite(generate_tables(2000, users=50, days=60), 'mirror/spool.sqlite')
+    monkeypatch.setattr(pipeline, 'MIRROR_SYNC', False)
+    monkeypatch.setattr(pipeline, 'CHUNK_SIZE', 500)
+    monkeypatch.setattr(pipeline, 'OUTPUT_FORMATS', ['csv', 'parquet'])
+    monkeypatch.delenv('SPOOL_BUCKET_NAME', raising=False)
+    monkeypatch.delenv('SPOOL_BUCKET_NAME_1', raising=False)
+
+    spools, reads = [], []
+
+    class RecordedSpool(PartitionSpool):
+        def __init__(self, order=None):
+            super().__init__(order)
+            spools.append(self)
+
+    monkeypatch.setattr(pipeline, 'PartitionSpool', RecordedSpool)
+    read_pickle = pd.read_pickle
+    monkeypatch.setattr(pd, 'read_pickle', lambda path: reads.append(path) or read_pickle(path))
+
+    pipeline.run_site(SiteConfig(name='spool', mdb_file='', s3_prefix='raw/spool', env_prefix='SPOOL_', source='mirror'), "full")
+
+    (spool,) = spools
+    parts = sum(len(paths) for paths in spool._parts.values())
+    assert parts > len(spool)
+    assert len(reads) == 2 * parts
+    assert not os.path.exists(spool._dir.name)
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.bench_incremental_extract import create_standin, insert_punches
+from door_access.sync_wait import log_table_stats, wait_for, wait_until_stable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeDownload:
+    """A database the device download writes punches into, batch by batch, on the fake clock."""
+
+    def __init__(self, clock, batches):
+        self.clock = clock
+        self.batches = dict(batches)   # time -> punches written then
+        self.conn = sqlite3.connect(":memory:")
+        create_standin(self.conn)
+        self.next_id = 1
+        self.locked_at = set()
+
+    def stats(self):
+        for at in sorted(self.batches):
+            if at <= self.clock():
+                insert_punches(self.conn, self.next_id, self.batches.pop(at))
+                self.next_id += 1000
+        if self.clock() in self.locked_at:
+            raise sqlite3.OperationalError("database is locked")
+        return log_table_stats(self.conn)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def wait(probe, clock, settle=60, timeout=750, poll_interval=10):
+    return wait_until_stable(probe, settle, timeout, poll_interval, clock=clock, sleep=clock.sleep)
+
+
+def test_download_that_starts_late_is_waited_for(clock):
+    # nothing written for the first 200s, longer than the 120s idle wait this replaced
+    download = FakeDownload(clock, {200: 50, 230: 50})
+    result = wait(download.stats, clock)
+    assert result.completed
+    assert result.elapsed == 290
+    assert result.value['CHECKINOUT'] == (100, 1050)
+
+
+def test_download_ends_once_the_tables_settle(clock):
+    download = FakeDownload(clock, {0: 10, 20: 10, 40: 10})
+    result = wait(download.stats, clock)
+    assert result.completed and result.reason == "unchanged for 60s"
+    assert result.elapsed == 100
+
+
+def test_no_growth_is_not_a_finished_download(clock):
+    download = FakeDownload(clock, {0: 10})
+    result = wait(download.stats, clock)
+    assert not result.completed
+    assert result.reason == "no change in 750s"
+    assert result.elapsed == 750
+
+
+def test_endless_growth_times_out(clock):
+    download = FakeDownload(clock, {t: 1 for t in range(0, 1000, 10)})
+    result = wait(download.stats, clock)
+    assert not result.completed and result.reason == "timed out after 750s"
+
+
+def test_locked_database_is_not_growth(clock):
+    download = FakeDownload(clock, {})
+    download.locked_at = {0.0, 10.0}
+    result = wait(download.stats, clock, timeout=200)
+    assert not result.completed
+
+
+def test_wait_for(clock):
+    assert wait_for(lambda: clock() >= 3, timeout=10, poll_interval=1, clock=clock, sleep=clock.sleep)
+    assert clock() == 3
+    assert not wait_for(lambda: False, timeout=10, poll_interval=1, clock=clock, sleep=clock.sleep)
+    assert clock() == 13
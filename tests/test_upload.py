@@ -0,0 +1,81 @@
+import gzip
+import os
+import tempfile
+
+import boto3
+import pandas as pd
+import pytest
+from boto3.exceptions import S3UploadFailedError
+from moto import mock_aws
+
+from door_access.manifest import PartitionManifest
+from door_access.metrics import RunMetrics
+from door_access.upload import S3Target, load_s3_targets, upload_partitions
+
+
+@pytest.fixture(autouse=True)
+def aws(monkeypatch):
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        yield
+
+
+def month():
+    return {'2024-02': pd.DataFrame({
+        'personnel id': [1, 2],
+        'first name': ['Ama', 'Kofi'],
+        'last name': ['Owusu', 'Mensah'],
+        'card number': ['3000001', '3000002'],
+        'date and time': pd.to_datetime(['2024-02-01 08:00:00', '2024-02-01 09:00:00']),
+        'device name': ['Main', 'Main'],
+        'event point': ['Main-1', 'Main-1'],
+    })}
+
+
+def key_for(name, fmt):
+    return f"raw/test_{name}.{fmt}"
+
+
+def upload_files():
+    return [name for name in os.listdir(tempfile.gettempdir()) if name.startswith("door_access_upload_")]
+
+
+def test_every_bucket_gets_the_month():
+    client = boto3.client('s3')
+    for bucket in ('one', 'two'):
+        client.create_bucket(Bucket=bucket)
+    metrics = RunMetrics('test')
+
+    upload_partitions(month(), [S3Target('one', client), S3Target('two', client)], key_for, ['csv'], gzip_csv=True, metrics=metrics)
+
+    for bucket in ('one', 'two'):
+        body = client.get_object(Bucket=bucket, Key='raw/test_2024-02.csv.gz')['Body'].read()
+        assert gzip.decompress(body).decode().count('\n') == 3
+    assert [upload['bucket'] for upload in metrics.uploads] == ['one', 'two']
+
+
+def test_failed_bucket_does_not_lose_the_other_uploads(tmp_path):
+    client = boto3.client('s3')
+    client.create_bucket(Bucket='good')
+    manifest = PartitionManifest(str(tmp_path / 'manifest.json'))
+    metrics = RunMetrics('test')
+    before = upload_files()
+
+    with pytest.raises(S3UploadFailedError):
+        # the missing bucket fails first, the good one still gets the month
+        upload_partitions(month(), [S3Target('missing', client), S3Target('good', client)], key_for, ['csv'],
+                          manifest=manifest, metrics=metrics)
+
+    client.head_object(Bucket='good', Key='raw/test_2024-02.csv')
+    assert [upload['bucket'] for upload in metrics.uploads] == ['good']
+    assert manifest.is_current('s3://good/raw/test_2024-02.csv', '2024-02', month()['2024-02'])
+    assert not manifest.is_current('s3://missing/raw/test_2024-02.csv', '2024-02', month()['2024-02'])
+    assert upload_files() == before
+
+
+def test_targets_from_the_environment():
+    environ = {'ACCRA_BUCKET_NAME_1': 'a', 'ACCRA_BUCKET_NAME_2': 'b', 'BUCKET_NAME': 'kumasi'}
+    assert [target.bucket for target in load_s3_targets(environ, 'ACCRA_')] == ['a', 'b']
+    assert [target.bucket for target in load_s3_targets(environ)] == ['kumasi']
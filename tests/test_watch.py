@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+
+from door_access.watch import FileSignature, SiteWatcher, max_log_ids, watch, watermark_ids
+
+
+class FakeSite:
+    """A site database as the watcher sees it: a file signature, the largest log ids and the saved watermarks."""
+
+    def __init__(self):
+        self.signature = FileSignature(1.0, 100)
+        self.ids = {'CHECKINOUT': 10, 'acc_monitor_log': 10}
+        self.saved = dict(self.ids)
+        self.runs = 0
+        self.failing = 0
+
+    def write(self, mtime, new_id):
+        self.signature = FileSignature(mtime, 100 + new_id)
+        self.ids = {table: new_id for table in self.ids}
+
+    def run(self):
+        self.runs += 1
+        if self.failing:
+            self.failing -= 1
+            raise RuntimeError("database is locked")
+        self.saved = dict(self.ids)
+
+    def watcher(self, **kwargs):
+        kwargs = {'debounce': 30, 'id_check_interval': 900, 'backoff': 30, 'max_backoff': 120, **kwargs}
+        return SiteWatcher('test', lambda: self.signature, lambda: dict(self.ids), lambda: dict(self.saved), self.run, **kwargs)
+
+
+@pytest.fixture
+def site():
+    return FakeSite()
+
+
+def test_catch_up_run_on_start(site):
+    site.ids = {table: 15 for table in site.ids}
+    watcher = site.watcher()
+    assert not watcher.poll(0)     # first sight of the file
+    assert watcher.poll(15)        # punches written while the daemon was down
+    assert site.runs == 1
+
+
+def test_nothing_new_does_not_run(site):
+    watcher = site.watcher()
+    watcher.poll(0)
+    assert not watcher.poll(15)
+    assert not watcher.poll(30)
+    assert site.runs == 0
+
+
+def test_changes_are_debounced(site):
+    watcher = site.watcher()
+    watcher.poll(0)
+    watcher.poll(15)
+    site.write(20, 11)
+    assert not watcher.poll(30)    # file changed
+    site.write(40, 12)
+    assert not watcher.poll(45)    # still being written
+    assert not watcher.poll(60)    # unchanged for 15s
+    assert watcher.poll(75)        # unchanged for 30s
+    assert site.runs == 1 and site.saved['CHECKINOUT'] == 12
+
+
+def test_file_that_keeps_changing_still_runs(site):
+    watcher = site.watcher()
+    watcher.poll(0)
+    watcher.poll(15)
+    runs = []
+    for n in range(2, 402):        # a new punch on every 15s poll, 100 minutes
+        site.write(n * 15, 10 + n)
+        if watcher.poll(n * 15):
+            runs.append(n * 15)
+    assert runs == [930, 1845, 2760, 3675, 4590, 5505]
+    assert site.saved['CHECKINOUT'] == 10 + 367
+
+
+def test_unchanged_file_is_still_checked_every_interval(site):
+    watcher = site.watcher()
+    watcher.poll(0)
+    watcher.poll(15)
+    site.ids = {table: 11 for table in site.ids}   # written without moving the file time
+    assert not watcher.poll(30)
+    assert watcher.poll(915)
+
+
+def test_failures_back_off_exponentially(site):
+    site.failing = 3
+    site.ids = {table: 11 for table in site.ids}
+    watcher = site.watcher()
+    watcher.poll(0)
+    assert not watcher.poll(10)     # fails, retry at 40
+    assert not watcher.poll(39)
+    assert not watcher.poll(40)     # fails, retry at 100
+    assert not watcher.poll(99)
+    assert not watcher.poll(100)    # fails, retry at 220
+    assert not watcher.poll(219)
+    assert watcher.poll(220)
+    assert site.runs == 4 and watcher.failures == 0
+
+
+def test_backoff_is_capped(site):
+    site.failing = 10
+    site.ids = {table: 11 for table in site.ids}
+    watcher = site.watcher()
+    watcher.poll(0)
+    now, delays = 10, []
+    for _ in range(5):
+        watcher.poll(now)
+        delays.append(watcher.retry_at - now)
+        now = watcher.retry_at
+    assert delays == [30, 60, 120, 120, 120]
+
+
+def test_ids_the_watermark_never_covers_do_not_rerun(site):
+    # the largest id is a punch outside the exported years, the watermark stays below it
+    site.ids = {table: 15 for table in site.ids}
+    site.run = lambda: setattr(site, 'runs', site.runs + 1)
+    watcher = site.watcher()
+    watcher.poll(0)
+    assert watcher.poll(15)
+    assert not watcher.poll(915)
+    assert not watcher.poll(1815)
+    assert site.runs == 1
+    site.write(2000, 16)
+    watcher.poll(2000)
+    assert watcher.poll(2030)
+
+
+def test_watch_polls_every_watcher(site):
+    polled = []
+    watcher = site.watcher()
+    watcher.poll = polled.append
+    times = iter(range(100))
+    watch([watcher], poll_interval=15, clock=lambda: next(times), sleep=lambda s: None, polls=3)
+    assert polled == [0, 1, 2]
+
+
+def test_max_log_ids_and_watermark_ids():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE [CHECKINOUT] (LOGID INTEGER)")
+    conn.execute("CREATE TABLE [acc_monitor_log] (id INTEGER)")
+    conn.executemany("INSERT INTO [CHECKINOUT] VALUES (?)", [(3,), (7,)])
+    assert max_log_ids(conn) == {'CHECKINOUT': 7, 'acc_monitor_log': 0}
+    assert watermark_ids({'CHECKINOUT': {'LOGID': 7, 'CHECKTIME': '2024-01-01T00:00:00', 'pending': [5]}}) == {'CHECKINOUT': 7}